@@ -0,0 +1,200 @@
+import json
+import os
+
+# index of the block tree reported by peers (k_block_hashes_and_timestamps / k_block_hashes), shared by the watchdog and make_report.
+#
+# block hashes are interned to small ints, parent and children links are kept in lists indexed by them. the index is kept across
+# cycles (in memory by the watchdog, in a json file by make_report): every cycle new chains are inserted incrementally and blocks
+# which no peer reported for `max_age` cycles (they fell out of k blocks of every peer) are pruned, their ids are reused.
+# all queries walk the tree iteratively, so there is no recursion limit on deep chains
+
+class BlockIndex:
+  def __init__(self, max_age=3):
+    self.max_age = max_age
+    self.ids = {}
+    self.hashes = []
+    self.parents = []
+    self.children = []
+    # cycle in which block was last reported and number of peers which reported it in the current cycle
+    self.last_seen = []
+    self.peers = []
+    self.free = []
+    self.cycle = 0
+
+  def __len__(self):
+    return len(self.ids)
+
+  def intern(self, block_hash):
+    block = self.ids.get(block_hash)
+    if block is not None:
+      return block
+    if self.free:
+      block = self.free.pop()
+      self.hashes[block] = block_hash
+      self.parents[block] = None
+      self.children[block] = set()
+      self.last_seen[block] = self.cycle
+      self.peers[block] = 0
+    else:
+      block = len(self.hashes)
+      self.hashes.append(block_hash)
+      self.parents.append(None)
+      self.children.append(set())
+      self.last_seen.append(self.cycle)
+      self.peers.append(0)
+    self.ids[block_hash] = block
+    return block
+
+  # starts new cycle, peer counts are reset
+  def begin_cycle(self):
+    self.cycle += 1
+    for block in self.ids.values():
+      self.peers[block] = 0
+
+  # adds chain of block hashes reported by one peer, most recent last
+  def add_chain(self, block_hashes):
+    previous = None
+    for block_hash in block_hashes:
+      block = self.intern(block_hash)
+      self.last_seen[block] = self.cycle
+      self.peers[block] += 1
+      if previous is not None and self.parents[block] != previous:
+        if self.parents[block] is not None:
+          self.children[self.parents[block]].discard(block)
+        self.parents[block] = previous
+        self.children[previous].add(block)
+      previous = block
+
+  def seen(self, block):
+    return self.last_seen[block] == self.cycle and self.peers[block] > 0
+
+  def prune(self):
+    stale = [ block for block in self.ids.values() if self.cycle - self.last_seen[block] >= self.max_age ]
+    for block in stale:
+      parent = self.parents[block]
+      if parent is not None:
+        self.children[parent].discard(block)
+      for child in self.children[block]:
+        self.parents[child] = None
+      del self.ids[self.hashes[block]]
+      self.hashes[block] = None
+      self.parents[block] = None
+      self.children[block] = set()
+      self.free.append(block)
+    return len(stale)
+
+  def parent(self, block_hash):
+    parent = self.parents[self.ids[block_hash]]
+    return None if parent is None else self.hashes[parent]
+
+  # last n ancestors of block, starting with the block itself
+  def ancestors(self, block_hash, n):
+    block = self.ids.get(block_hash)
+    result = []
+    while block is not None and len(result) <= n:
+      result.append(self.hashes[block])
+      block = self.parents[block]
+    return result
+
+  # blocks reported in the current cycle whose parent wasn't
+  def roots(self):
+    return [ self.hashes[block] for block in self.ids.values()
+             if self.seen(block) and (self.parents[block] is None or not self.seen(self.parents[block])) ]
+
+  def seen_children(self, block):
+    return [ child for child in self.children[block] if self.seen(child) ]
+
+  # deepest descendant (reported in the current cycle) of block and its distance from the block
+  def deepest_child(self, block_hash):
+    start = self.ids[block_hash]
+    deepest, deepest_depth = start, 0
+    stack = [ (start, 0) ]
+    while stack:
+      block, depth = stack.pop()
+      if depth > deepest_depth:
+        deepest, deepest_depth = block, depth
+      stack.extend((child, depth + 1) for child in self.seen_children(block))
+    return self.hashes[deepest], deepest_depth
+
+  def deepest_tip(self):
+    tips = [ self.deepest_child(root) for root in self.roots() ]
+    if not tips:
+      return None
+    return max(tips, key=lambda tip: tip[1])[0]
+
+  def common_ancestor(self, a, b):
+    ancestors = set()
+    block = self.ids.get(a)
+    while block is not None and block not in ancestors:
+      ancestors.add(block)
+      block = self.parents[block]
+    block = self.ids.get(b)
+    while block is not None:
+      if block in ancestors:
+        return self.hashes[block]
+      block = self.parents[block]
+    return None
+
+  # tree of blocks reported in the current cycle with runs of blocks which have a single child reported by the same
+  # peers collapsed: block hash -> { 'children': set of hashes, 'peers': count, 'intermediate_nodes': collapsed count }
+  def summarize(self):
+    summarized = {}
+    stack = [ self.ids[root] for root in self.roots() ]
+    while stack:
+      block = stack.pop()
+      peers = self.peers[block]
+      children = self.seen_children(block)
+      intermediate_nodes = 0
+      while len(children) == 1 and self.peers[children[0]] == peers:
+        grandchildren = self.seen_children(children[0])
+        if len(grandchildren) > 0:
+          children = grandchildren
+          intermediate_nodes += 1
+        else:
+          break
+      summarized[self.hashes[block]] = { 'children': set(self.hashes[c] for c in children), 'peers': peers, 'intermediate_nodes': intermediate_nodes }
+      stack.extend(children)
+    return summarized
+
+  def to_dict(self):
+    blocks = sorted(self.ids.values())
+    position = { block: i for i, block in enumerate(blocks) }
+    return {
+      'cycle': self.cycle,
+      'max_age': self.max_age,
+      'hashes': [ self.hashes[block] for block in blocks ],
+      'parents': [ None if self.parents[block] is None else position[self.parents[block]] for block in blocks ],
+      'last_seen': [ self.last_seen[block] for block in blocks ],
+    }
+
+  @staticmethod
+  def from_dict(data):
+    index = BlockIndex(data['max_age'])
+    index.cycle = data['cycle']
+    index.hashes = list(data['hashes'])
+    index.parents = list(data['parents'])
+    index.last_seen = list(data['last_seen'])
+    index.peers = [ 0 ] * len(index.hashes)
+    index.children = [ set() for _ in index.hashes ]
+    index.ids = { block_hash: block for block, block_hash in enumerate(index.hashes) }
+    for block, parent in enumerate(index.parents):
+      if parent is not None:
+        index.children[parent].add(block)
+    return index
+
+  def save(self, fname):
+    tmp = fname + '.tmp'
+    with open(tmp, 'w') as f:
+      json.dump(self.to_dict(), f)
+    os.replace(tmp, fname)
+
+  @staticmethod
+  def load(fname, max_age=3):
+    if not os.path.exists(fname):
+      return BlockIndex(max_age)
+    try:
+      with open(fname, 'r') as f:
+        return BlockIndex.from_dict(json.load(f))
+    except (ValueError, KeyError) as e:
+      print('could not load block index from', fname, ':', e)
+      return BlockIndex(max_age)
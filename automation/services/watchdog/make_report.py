@@ -12,24 +12,24 @@ import time
 import random
 import itertools
 import numpy as np
-import math
-import ast
 import json
 import csv
 import util
-from os import listdir
-from os.path import isfile, join
+import node_status_parser
+from block_index import BlockIndex
+from peer_history import PeerHistory
+from pod_inventory import PodInventory
 from graphviz import Digraph
 from datetime import datetime
-import uuid
 from collections import Counter
 
-from kubernetes import client, config, stream
+from kubernetes import client, config
 from discord_webhook import DiscordWebhook
 
 namespace = ''
 discord_webhook_url = None
 discord_char_limit = 2000
+block_index_file = 'block_index.json'
 
 def peer_to_multiaddr(peer):
   return '/ip4/{}/tcp/{}/p2p/{}'.format(
@@ -48,6 +48,8 @@ def main():
     parser.add_argument("-a", "--accounts", help="community accounts csv", required=False, type=str, dest="accounts_csv")
     parser.add_argument("-l", "--local", help="run with a local node", required=False, type=bool, default=False)
     parser.add_argument("-b", "--bin", help="local mina binary", required=False, type=str, default="mina", dest="binary")
+    parser.add_argument("--history_dir", help="directory of responding peers history (one sqlite segment per day)", required=False, type=str, default="peer_history", dest="history_dir")
+    parser.add_argument("--history_retention_days", help="days of responding peers history kept", required=False, type=int, default=8, dest="history_retention_days")
 
     # ==========================================
 
@@ -75,19 +77,14 @@ def main():
     # ==========================================
     # Crawl network
 
-    pods = v1.list_namespaced_pod(args.namespace, watch=False)
+    # single snapshot of pods is enough for one report, no need to watch
+    inventory = PodInventory(v1, args.namespace)
+    inventory.refresh()
 
-    pod_names = [ p['metadata']['name'] for p in pods.to_dict()['items'] if p['status']['phase'] == 'Running' ]
-
-    seeds = [ p for p in pod_names if 'seed' in p ]
+    seeds = inventory.seeds()
 
     seed = seeds[-1]
 
-    seed_pod = [ p for p in pods.to_dict()['items'] if p['metadata']['name'] == seed ][0]
-    seed_daemon_container = [ c for c in seed_pod['spec']['containers'] if c['args'][0] == 'daemon' ][0]
-    seed_vars_dict = [ v for v in seed_daemon_container['env'] ]
-    seed_daemon_port = [ v['value'] for v in seed_vars_dict if v['name'] == 'DAEMON_CLIENT_PORT'][0]
-
     print('seed', seed)
 
     request_timeout_seconds = 600
@@ -100,7 +97,7 @@ def main():
       res = subprocess.stdout.read()
       print('result', len(res))
 
-      return res
+      return res.splitlines(keepends=True)
 
       #import IPython; IPython.embed()
 
@@ -109,46 +106,7 @@ def main():
       #pass
 
     def exec_on_seed(command):
-
-      def exec_cmd(command, timeout):
-        exec_command = [
-          '/bin/bash',
-          '-c',
-          command,
-        ]
-        result = stream.stream(v1.connect_get_namespaced_pod_exec, seed, args.namespace, command=exec_command, container='mina', stderr=True, stdout=True, stdin=False, tty=False, _request_timeout=timeout)
-        return result
-
-      print('running command:', command)
-
-      tmp_file = '/tmp/cns_command.' + str(uuid.uuid4()) + '.out'
-
-      start = time.time()
-      result = exec_cmd(command + ' &> ' + tmp_file, request_timeout_seconds)
-      end = time.time()
-
-      print('done running command')
-      print('\tseconds to run:', end - start)
-
-      file_len = int(exec_cmd('stat --printf="%s" ' + tmp_file, 10))
-      print('\tfile length:', str(file_len/(1024*1024)) + 'MB')
-
-
-      read_segment = lambda start, size: exec_cmd('cat ' + tmp_file + ' | head -c ' + str(start + size) + ' | tail -c ' + str(size), 240)
-      chunk_size = int(20e6)
-      read_chunk = lambda i: read_segment(i*chunk_size, min((i+1)*chunk_size, file_len) - i*chunk_size)
-      num_chunks = math.ceil(file_len/chunk_size)
-
-      start = time.time()
-      chunks = list(map(read_chunk, range(num_chunks)))
-      result = ''.join(chunks)
-      end = time.time()
-
-      print('\tseconds to get result:', end - start)
-
-      exec_cmd('rm ' + tmp_file, 10)
-
-      return result
+      return list(util.exec_on_pod_lines(v1, args.namespace, seed, 'mina', command, request_timeout_seconds))
 
     if args.local:
       exec_command = exec_locally
@@ -183,9 +141,11 @@ def main():
     def no_error(resp):
       return (not (contains_error(resp)))
 
-    def add_resp(resp):
-      # we use ast instead of json to handle properties with single quotes instead of double quotes (which the response seems to often contain)
-      resps = [ ast.literal_eval(s) for s in resp.split('\n') if s != '' ]
+    def add_resp(lines):
+      # responses often contain properties with single quotes instead of double quotes, see node_status_parser
+      parsed = node_status_parser.parse_lines(lines)
+      parsed.report()
+      resps = parsed.values
 
       print ('Received %s node_status responses'%(str(len(resps))))
 
@@ -280,10 +240,10 @@ def main():
     print ('Gathering node_status from daemon peers')
 
     seed_status = exec_command("mina client status")
-    if seed_status == '':
+    if len(seed_status) == 0:
       raise Exception("unable to connect to seed node within " + str(request_timeout_seconds) + " seconds" )
 
-    get_status_value = lambda key: [ s for s in seed_status.split('\n') if key in s ][0].split(':')[1].strip()
+    get_status_value = lambda key: [ s for s in seed_status if key in s ][0].split(':')[1].strip()
 
     blocks = int(get_status_value('Max observed block height'))
     slot_time = get_status_value('Consensus time now')
@@ -292,15 +252,12 @@ def main():
     global_slot = epoch*slots_per_epoch + slot
 
     for seed in seeds:
-      seed_pod = [ p for p in pods.to_dict()['items'] if p['metadata']['name'] == seed ][0]
-      seed_daemon_container = [ c for c in seed_pod['spec']['containers'] if c['args'][0] == 'daemon' ][0]
-      seed_vars_dict = [ v for v in seed_daemon_container['env'] ]
-      seed_daemon_port = [ v['value'] for v in seed_vars_dict if v['name'] == 'DAEMON_CLIENT_PORT'][0]
+      seed_daemon_port = inventory.seed_daemon_port(seed)
 
       cmd = "mina advanced node-status -daemon-port " + seed_daemon_port + " -daemon-peers" + " -show-errors"
-      resp = util.exec_on_pod(v1, namespace, seed, 'mina', cmd)
+      lines = util.exec_on_pod_lines(v1, namespace, seed, 'mina', cmd)
 
-      add_resp(resp)
+      add_resp(lines)
 
     peer_numbers = [ len(node['peers']) for node in peer_table.values() ]
     peer_percentiles = [ 0, 5, 25, 50, 95, 100 ]
@@ -317,41 +274,19 @@ def main():
     else:
       peer_to_k_block_hashes = { p: [ a[0] for a in pv['k_block_hashes_and_timestamps'] ] for p,pv in  peer_table.items() }
 
-    fork_tree = {}
-
+    # block tree is kept between reports, only chains reported in this run are added to it
+    block_index = BlockIndex.load(block_index_file)
+    block_index.begin_cycle()
     for block_hashes in peer_to_k_block_hashes.values():
-      parents = block_hashes
-      children_or_none = [ [ c ] for c in block_hashes[1:] ] + [ [] ]
-      for parent, child_or_none in zip(parents, children_or_none):
-        fork_tree.setdefault(parent, { 'children': set(), 'peers': 0 })
-        fork_tree[parent]['children'].update(child_or_none)
-        fork_tree[parent]['peers'] += 1
-
-    children = list(itertools.chain(*[ v['children'] for v in fork_tree.values() ]))
-    roots = set(fork_tree.keys()).difference(children)
-
-    summarized_fork_tree = {}
-
-    def add_to_summarized_tree(parent):
-      peers = fork_tree[parent]['peers']
-      children = fork_tree[parent]['children']
-      intermediate_nodes = 0
-      while len(children) == 1 and fork_tree[list(children)[0]]['peers'] == peers:
-        children_or_none = fork_tree[list(children)[0]]['children']
-        if len(children_or_none) > 0:
-          children = fork_tree[list(children)[0]]['children']
-          intermediate_nodes += 1
-        else:
-          break
-      summarized_fork_tree[parent] = { 'children': children, 'peers': peers, 'intermediate_nodes': intermediate_nodes }
-      for child in children:
-        add_to_summarized_tree(child)
+      block_index.add_chain(block_hashes)
+    block_index.prune()
+    block_index.save(block_index_file)
 
-    for root in roots:
-      add_to_summarized_tree(root)
+    roots = block_index.roots()
+    summarized_fork_tree = block_index.summarize()
 
     def has_forks():
-      roots_with_children = [ root for root in roots if len(fork_tree[root]['children']) > 0 ]
+      roots_with_children = [ root for root in roots if len(summarized_fork_tree[root]['children']) > 0 ]
       # can be multiple roots because of nodes syncing from genesis; however there shouldn't be multiple roots with children, that would indicate a fork longer than k
       if len(roots_with_children) > 1:
         return True
@@ -411,45 +346,18 @@ def main():
                                'protocol_state_hash': v['protocol_state_hash'],
                                'discord(s)': value_to_discords(v)  } for k,v in peer_table.items() }
 
-    new_fname = 'peer_table.' + str(time.time()) + '.txt'
-    with open(new_fname, 'w') as wfile:
-      wfile.write(json.dumps(peer_table_dict))
-
-    files = [f for f in listdir('.') if isfile(join('.', f))]
-
-    windows_in_hours = [ 1, 3, 6, 12, 24, 72, 24*7 ]
-
-    responding_peers_by_window = {}
-    responding_ips_by_window = {}
-    responding_discords_by_window = {}
-
-    oldest_report = time.time()
     now = time.time()
 
-    for fname in files:
-      if 'peer_table' not in fname or fname.startswith('.') or not fname.endswith('txt'):
-        continue
-      with open(fname, 'r') as f:
-        contents = f.read()
-        peers = ast.literal_eval(contents)
+    history = PeerHistory(args.history_dir, args.history_retention_days)
+    history.import_legacy('.')
+    history.append(now, { k: value_to_discords(v) for k,v in peer_table.items() })
+    history.apply_retention(now)
 
-        file_timestamp = float('.'.join(fname.split('.')[1:-1]))
-
-        oldest_report = min(oldest_report, file_timestamp)
-
-        ip_peer_ids = set(peers.keys())
-        ips = set(map(lambda x: ast.literal_eval(x)[0], ip_peer_ids))
-        discords = set(itertools.chain(*map(lambda x: x['discord(s)'], peers.values())))
+    windows_in_hours = [ 1, 3, 6, 12, 24, 72, 24*7 ]
 
-        for w in windows_in_hours:
-          responding_peers_by_window.setdefault(w, set())
-          responding_ips_by_window.setdefault(w, set())
-          responding_discords_by_window.setdefault(w, set())
+    responding_peers_by_window, responding_ips_by_window, responding_discords_by_window = history.windows(windows_in_hours, now)
 
-          if (now - file_timestamp) <= w*3600:
-            responding_peers_by_window[w].update(ip_peer_ids)
-            responding_ips_by_window[w].update(ips)
-            responding_discords_by_window[w].update(discords)
+    oldest_report = history.oldest_report() or now
 
 
     # ==========================================
@@ -12,28 +12,28 @@ import time
 import json
 import urllib.request
 import ast
+import concurrent.futures
 
 from google.cloud import storage
 
 # ========================================================================
 
-def collect_cluster_crashes(v1, namespace, cluster_crashes):
+def collect_cluster_crashes(v1, namespace, inventory, cluster_crashes):
   print('collecting cluster crashes / restarts')
-  pods = v1.list_namespaced_pod(namespace, watch=False)
 
-  containers = list(itertools.chain(*[ pod.to_dict()['status']['container_statuses'] for pod in pods.items if pod.status.phase == 'Running' ]))
-  mina_containers = list(filter(lambda c: c['name'] in [ 'coda', 'seed', 'coordinator', 'archive' ], containers))
+  containers = list(itertools.chain(*[ inventory.container_statuses(name) for name in inventory.running_pod_names() ]))
+  mina_containers = list(filter(lambda c: c.name in [ 'coda', 'seed', 'coordinator', 'archive' ], containers))
 
   def restarted_recently(c):
 
-    if c['restart_count'] == 0:
+    if c.restart_count == 0:
       return False
 
-    terminated = c['last_state']['terminated']
+    terminated = c.last_state.terminated if c.last_state is not None else None
     if terminated is None:
       return False
 
-    restart_time = terminated['started_at']
+    restart_time = terminated.started_at
     retart_age_seconds = (datetime.datetime.now(datetime.timezone.utc) - restart_time).total_seconds()
 
     # restarted less than 30 minutes ago
@@ -48,30 +48,64 @@ def collect_cluster_crashes(v1, namespace, cluster_crashes):
 
 # ========================================================================
 
-def pods_with_no_new_logs(v1, namespace, nodes_with_no_new_logs):
+# age in seconds of the last log line of the container, or None if it logged nothing in the last `since_seconds`.
+# only the last line (with its timestamp) is transferred, not the whole window of logs
+def last_log_age(v1, namespace, name, container, since_seconds, request_timeout_seconds=60):
+  last_line = v1.read_namespaced_pod_log(name=name, namespace=namespace, container=container, since_seconds=since_seconds,
+                                         tail_lines=1, timestamps=True, _request_timeout=request_timeout_seconds)
+  if len(last_line.strip()) == 0:
+    return None
+  # timestamps are RFC3339 with nanoseconds (2021-01-01T00:00:00.123456789Z), seconds are precise enough
+  timestamp = datetime.datetime.strptime(last_line.split(' ', 1)[0][:19], '%Y-%m-%dT%H:%M:%S').replace(tzinfo=datetime.timezone.utc)
+  return max(0.0, (datetime.datetime.now(datetime.timezone.utc) - timestamp).total_seconds())
+
+def pods_with_no_new_logs(v1, namespace, inventory, nodes_with_no_new_logs, pod_last_log_age=None, pod_last_log_age_histogram=None, log_check_workers=int(os.environ.get('LOG_CHECK_WORKERS', 8))):
   print('counting pods with no new logs')
-  pods = v1.list_namespaced_pod(namespace, watch=False)
 
   one_hour = 60 * 60
 
-  count = 0
+  checks = {}
   total_running_pods = 0
-  for pod in pods.items:
+  for pod in inventory.all_pods():
     if pod.status.phase == 'Running':
       total_running_pods += 1
-      containers = pod.status.container_statuses
+      containers = pod.status.container_statuses or []
       mina_containers = list(filter(lambda c: c.name in [ 'coda', 'seed', 'coordinator' ], containers))
       if len(mina_containers) != 0:
-        name = pod.metadata.name
-        recent_logs = v1.read_namespaced_pod_log(name=name, namespace=namespace, since_seconds=one_hour, container=mina_containers[0].name)
-        if len(recent_logs) == 0:
-          print("Pod {} has no logs for the last hour".format(name))
-          count += 1
+        checks[pod.metadata.name] = mina_containers[0].name
     else:
       print("Pod {} is not running. Phase: {}, reason: {}".format(pod.metadata.name,pod.status.phase, pod.status.reason))
 
-  fraction_no_new_logs = float(count) / float(total_running_pods)
-  print(count, 'of', total_running_pods, 'pods have no logs in the last 10 minutes')
+  ages = {}
+  with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(len(checks), log_check_workers)), thread_name_prefix='logs') as executor:
+    futures = { executor.submit(last_log_age, v1, namespace, name, container, one_hour): name for name, container in checks.items() }
+    for future in concurrent.futures.as_completed(futures):
+      name = futures[future]
+      try:
+        ages[name] = future.result()
+      except Exception as e:
+        print("Could not read logs of pod {}: {}".format(name, e))
+
+  count = 0
+  for name, age in ages.items():
+    if age is None:
+      print("Pod {} has no logs for the last hour".format(name))
+      count += 1
+      # pods silent for the whole window are reported just past it
+      age = one_hour + 1
+    if pod_last_log_age is not None:
+      pod_last_log_age.labels(pod=name).set(age)
+    if pod_last_log_age_histogram is not None:
+      pod_last_log_age_histogram.observe(age)
+
+  # drop series of pods which are gone (or whose logs couldn't be read) so they don't linger with their last age
+  if pod_last_log_age is not None:
+    reported = set(sample.labels['pod'] for metric in pod_last_log_age.collect() for sample in metric.samples)
+    for name in reported - set(ages):
+      pod_last_log_age.remove(name)
+
+  fraction_no_new_logs = float(count) / float(total_running_pods) if total_running_pods > 0 else 0.0
+  print(count, 'of', total_running_pods, 'pods have no logs in the last hour')
 
   nodes_with_no_new_logs.set(fraction_no_new_logs)
 
@@ -102,24 +136,20 @@ def check_google_storage_bucket(v1, namespace, recent_google_bucket_blocks):
 
 # ========================================================================
 
-def daemon_containers(v1, namespace):
-  pods = v1.list_namespaced_pod(namespace, watch=False)
-
-  for pod in pods.items:
-    if pod.status.phase == 'Running':
-      containers = pod.status.container_statuses
-      for c in containers:
-        if c.name in [ 'coda', 'mina', 'seed']:
-          yield (pod.metadata.name, c.name)
+def daemon_containers(inventory):
+  for name in inventory.running_pod_names():
+    for c in inventory.container_statuses(name):
+      if c.name in [ 'coda', 'mina', 'seed']:
+        yield (name, c.name)
 
-def get_chain_id(v1, namespace):
-  for (pod_name, container_name) in daemon_containers(v1, namespace):
+def get_chain_id(v1, namespace, inventory):
+  for (pod_name, container_name) in daemon_containers(inventory):
+    resp = ''
     try:
-      resp = util.exec_on_pod(v1, namespace, pod_name, container_name, 'mina client status --json')      
-      resp = resp.strip()
-      if resp[0] != '{':
-        #first line could be 'Using password from environment variable MINA_PRIVKEY_PASS'
-        resp = resp.split("\n", 1)[1]
+      lines = list(util.exec_on_pod_lines(v1, namespace, pod_name, container_name, 'mina client status --json'))
+      #first line could be 'Using password from environment variable MINA_PRIVKEY_PASS'
+      start = next((i for i, line in enumerate(lines) if line.lstrip().startswith('{')), 0)
+      resp = ''.join(lines[start:])
       resp_dict = ast.literal_eval(resp.strip())
       print("Chain ID: {}".format(resp_dict['chain_id']))
       return resp_dict['chain_id']
@@ -127,7 +157,7 @@ def get_chain_id(v1, namespace):
       print("Exception when extracting chain id on pod {}: {}\n mina client status response: {}".format(pod_name, e, resp))
       continue
 
-def check_seed_list_up(v1, namespace, seeds_reachable):
+def check_seed_list_up(v1, namespace, inventory, seeds_reachable):
   print('checking seed list up')
   start = time.time()
 
@@ -139,7 +169,7 @@ def check_seed_list_up(v1, namespace, seeds_reachable):
   seeds =  ' '.join(contents.split('\n'))
   #stdbuf -o0 is to disable buffering
 
-  chain_id = get_chain_id(v1, namespace)
+  chain_id = get_chain_id(v1, namespace, inventory)
   if chain_id is None:
     print('could not get chain id')
   else:
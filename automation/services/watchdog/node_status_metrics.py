@@ -12,27 +12,34 @@ import time
 import json
 import urllib.request
 import ast
+import node_status_parser
+from block_index import BlockIndex
+import concurrent.futures
 
 # ========================================================================
 
+# kept across collection cycles, see block_index
+block_index = BlockIndex()
+
+# seeds are queried on one pool kept across collection cycles. query of a seed which missed its deadline keeps running on it
+# (until its exec times out), and that seed is not queried again until it finishes, so late queries never pile up
+seed_executor = None
+seed_queries = {}
+
 def peer_to_multiaddr(peer):
   return '/ip4/{}/tcp/{}/p2p/{}'.format(
     peer['host'],
     peer['libp2p_port'],
     peer['peer_id'] )
 
-def collect_node_status_metrics(v1, namespace, nodes_synced_near_best_tip, nodes_synced, nodes_queried, nodes_responded, seed_nodes_queried, seed_nodes_responded, nodes_errored, context_deadline_exceeded, failed_security_protocol_negotiation, connection_refused_errors, size_limit_exceeded_errors, timed_out_errors, stream_reset_errors, other_connection_errors, prover_errors):
+def collect_node_status_metrics(v1, namespace, inventory, nodes_synced_near_best_tip, nodes_synced, nodes_queried, nodes_responded, seed_nodes_queried, seed_nodes_responded, nodes_errored, context_deadline_exceeded, failed_security_protocol_negotiation, connection_refused_errors, size_limit_exceeded_errors, timed_out_errors, stream_reset_errors, other_connection_errors, prover_errors, node_status_parsed=None, node_status_parse_failures=None):
   print('collecting node status metrics')
 
   start = time.time()
 
-  pods = v1.list_namespaced_pod(namespace, watch=False)
-
-  pod_names = [ p['metadata']['name'] for p in pods.to_dict()['items'] if p['status']['phase'] == 'Running' ]
+  seeds = inventory.seeds()
 
-  seeds = [ p for p in pod_names if 'seed' in p ]
-
-  resp_count, valid_resps, error_resps = collect_node_status(v1, namespace, seeds, pods, seed_nodes_responded, seed_nodes_queried)
+  resp_count, valid_resps, error_resps = collect_node_status(v1, namespace, seeds, inventory, seed_nodes_responded, seed_nodes_queried, node_status_parsed, node_status_parse_failures)
 
   err_context_deadline = 0
   err_negotiate_security_protocol = 0
@@ -96,24 +103,12 @@ def collect_node_status_metrics(v1, namespace, nodes_synced_near_best_tip, nodes
   # note: k_block_hashes_and_timestamps is most recent last
   chains = [ p['k_block_hashes_and_timestamps'] for p in valid_resps ]
 
-  tree = {}
-  parents = {}
+  block_index.begin_cycle()
   for c in chains:
-    for (parent, child) in zip(c, c[1:]):
-      parent = parent[0]
-      child = child[0]
-      tree.setdefault(parent, set())
-      tree[parent].add(child)
-      parents[child] = parent
-
-  def get_deepest_child(p):
-    children_and_depths = []
-    children_and_depths.append((p, 0))
-    if p in tree:
-      for c in tree[p]:
-        child, depth = get_deepest_child(c)
-        children_and_depths.append((child, depth + 1))
-    return max(children_and_depths, key=lambda x: x[1])
+    block_index.add_chain([ block_hash for block_hash, _ in c ])
+  pruned = block_index.prune()
+
+  print("Block index has {} blocks ({} pruned), deepest tip: {}".format(len(block_index), pruned, block_index.deepest_tip()))
 
   #get the latest protocol states of each node and the length of the chain (to eliminate nodes that are newly joining or restarting without persisted frontier)
   latest_protocol_states = [c[len(c)-1][0] for c in chains if len(c) >= 290 and len(c) > 0]
@@ -129,11 +124,7 @@ def collect_node_status_metrics(v1, namespace, nodes_synced_near_best_tip, nodes
   most_common_best_protocol_state,_ = max(common_states.items(), key=lambda x: x[1])
 
   n = 3
-  last_n_protocol_states = [ most_common_best_protocol_state ]
-  for _ in range(n):
-    parent = last_n_protocol_states[-1]
-    if parent in parents:
-      last_n_protocol_states.append(parents[parent])
+  last_n_protocol_states = block_index.ancestors(most_common_best_protocol_state, n)
 
   print("Latest {} protocol states:{}".format(n+1, last_n_protocol_states))
 
@@ -157,7 +148,7 @@ def collect_node_status_metrics(v1, namespace, nodes_synced_near_best_tip, nodes
 
 # ========================================================================
 
-def collect_node_status(v1, namespace, seeds, pods, seed_nodes_responded, seed_nodes_queried):
+def collect_node_status(v1, namespace, seeds, inventory, seed_nodes_responded, seed_nodes_queried, node_status_parsed=None, node_status_parse_failures=None, seed_workers=int(os.environ.get('SEED_WORKERS', 4)), seed_deadline_seconds=int(os.environ.get('SEED_DEADLINE_SECONDS', 8*60))):
   peer_table = {}
   error_resps = []
   all_resps = []
@@ -175,8 +166,10 @@ def collect_node_status(v1, namespace, seeds, pods, seed_nodes_responded, seed_n
   def no_error(resp):
     return (not (contains_error(resp)))
 
-  def add_resp(raw, peers, seed, seed_node_responded, seed_node_queried):
-    resps = [ ast.literal_eval(s) for s in raw.split('\n') if s != '' ]
+  def add_resp(lines, peers, seed, seed_node_responded, seed_node_queried):
+    parsed = node_status_parser.parse_lines(lines)
+    parsed.report(node_status_parsed, node_status_parse_failures)
+    resps = parsed.values
     
     valid_resps = list(filter(no_error, resps))
     error_resps.extend(list(filter(contains_error, resps)))
@@ -192,25 +185,68 @@ def collect_node_status(v1, namespace, seeds, pods, seed_nodes_responded, seed_n
       if p not in peer_table:
         peer_table[p] = r
 
+  def query_seed(seed, seed_daemon_port, deadline):
+    started[seed] = time.time()
+    deadline = started[seed] + deadline
+
+    # every exec gets what is left of seed's deadline
+    def remaining():
+      left = deadline - time.time()
+      if left <= 0:
+        raise TimeoutError('seed ' + seed + ' missed its deadline')
+      return left
+
+    cmd = "mina advanced get-peers"
+    peers = [ line.strip() for line in util.exec_on_pod_lines(v1, namespace, seed, 'mina', cmd, request_timeout_seconds=remaining()) if line.strip() != '' ]
+
+    cmd = "mina advanced node-status -daemon-port " + seed_daemon_port + " -peers " + ",".join(peers) + " -show-errors"
+    resp = list(util.exec_on_pod_lines(v1, namespace, seed, 'mina', cmd, request_timeout_seconds=remaining()))
+    return peers, resp
+
+  # seeds are queried in parallel, responses are merged as seeds finish (first response for a peer wins).
+  # a seed which doesn't finish within its deadline (counted from when its query started) is given up on, so it can't hold back metrics of the whole network
+  global seed_executor
+  if seed_executor is None:
+    seed_executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, seed_workers), thread_name_prefix='seed')
+  for seed, future in list(seed_queries.items()):
+    if future.done():
+      del seed_queries[seed]
+
+  started = {}
+  futures = {}
   for seed in seeds:
-    seed_pod = [ p for p in pods.to_dict()['items'] if p['metadata']['name'] == seed ][0]
-    seed_daemon_container = [ c for c in seed_pod['spec']['containers'] if c['args'][0] == 'daemon' ][0]
-    seed_vars_dict = [ v for v in seed_daemon_container['env'] ]
-    seed_daemon_port = [ v['value'] for v in seed_vars_dict if v['name'] == 'DAEMON_CLIENT_PORT'][0]
-
-    try:
-      cmd = "mina advanced get-peers"
-      peers = util.exec_on_pod(v1, namespace, seed, 'mina', cmd).rstrip().split('\n')
-
-      cmd = "mina advanced node-status -daemon-port " + seed_daemon_port + " -peers " + ",".join(peers) + " -show-errors"
-      resp = util.exec_on_pod(v1, namespace, seed, 'mina', cmd)
-
-      if not 'Error: Unable to connect to Mina Daemon.' in resp:
-        add_resp(resp, peers, seed, seed_nodes_responded, seed_nodes_queried)
-    except Exception as e:
-      print("failed to exec command on pod: {}".format(e))
+    if seed in seed_queries:
+      print("seed {} is still running query of previous cycle, skipping it".format(seed))
       continue
-      
+    future = seed_executor.submit(query_seed, seed, inventory.seed_daemon_port(seed), seed_deadline_seconds)
+    seed_queries[seed] = future
+    futures[future] = seed
+  pending = set(futures)
+
+  while len(pending) > 0:
+    done, pending = concurrent.futures.wait(pending, timeout=1, return_when=concurrent.futures.FIRST_COMPLETED)
+    for future in done:
+      seed = futures[future]
+      try:
+        peers, resp = future.result()
+        print("seed {} responded after {} seconds".format(seed, time.time() - started[seed]))
+        if not any('Error: Unable to connect to Mina Daemon.' in line for line in resp):
+          add_resp(resp, peers, seed, seed_nodes_responded, seed_nodes_queried)
+      except Exception as e:
+        print("failed to exec command on pod {}: {}".format(seed, e))
+
+    now = time.time()
+    expired = set([ f for f in pending if futures[f] in started and now - started[futures[f]] > seed_deadline_seconds ])
+    for future in expired:
+      print("seed {} missed its deadline of {} seconds, skipping it".format(futures[future], seed_deadline_seconds))
+    pending = pending - expired
+
+    # seeds still queued behind late queries when the deadline has passed for the whole cycle are cancelled
+    if now - start > seed_deadline_seconds:
+      cancelled = set([ f for f in pending if f.cancel() ])
+      for future in cancelled:
+        print("seed {} was not queried within {} seconds, cancelling it".format(futures[future], seed_deadline_seconds))
+      pending = pending - cancelled
 
   valid_resps = peer_table.values()
   end = time.time()
@@ -0,0 +1,135 @@
+import ast
+import json
+import multiprocessing
+import os
+import re
+import concurrent.futures
+
+try:
+  import orjson
+  loads = orjson.loads
+except ImportError:
+  loads = json.loads
+
+# node-status responses are json most of the time, but some of them come with python style single quoted strings
+# (and True/False/None). parsing every line with ast.literal_eval made it the hot spot of a watchdog cycle, so lines
+# are parsed with the cheapest parser that accepts them: orjson (or json), then json after quote normalisation and only then literal_eval
+
+literals = { 'True': 'true', 'False': 'false', 'None': 'null' }
+
+# strings, identifiers (numbers like 2e3 have no word boundary before the exponent), tuples and unpaired quotes
+token_syntax = re.compile(r"""'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|\b[A-Za-z_]\w*|[('"]""")
+literal_syntax = re.compile(r'\b(?:True|False|None)\b')
+escape_syntax = re.compile(r'\\.|"')
+
+def fix_escape(match):
+  escape = match.group()
+  if escape == '"':
+    return '\\"'
+  if escape == "\\'":
+    return "'"
+  if escape[1] in '"\\/bfnrtu':
+    return escape
+  raise ValueError('unsupported escape ' + escape)
+
+def normalize_token(match):
+  token = match.group()
+  first = token[0]
+  if len(token) > 1 and (first == "'" or first == '"'):
+    body = token[1:-1]
+    if '\\' not in body and (first == '"' or '"' not in body):
+      return '"' + body + '"'
+    return '"' + escape_syntax.sub(fix_escape, body) + '"'
+  if token in literals:
+    return literals[token]
+  if first == '(':
+    raise ValueError('tuples are not json')
+  if first == "'" or first == '"':
+    raise ValueError('unterminated string')
+  raise ValueError('unexpected identifier ' + token)
+
+# rewrites python literal (dicts, lists, single or double quoted strings, True/False/None) as json.
+# raises ValueError for anything it doesn't understand (like tuples or \x escapes), literal_eval deals with those
+def normalize_quotes(line):
+  if '"' in line or '\\' in line:
+    return token_syntax.sub(normalize_token, line)
+  # common case: without double quotes and escapes every single quote delimits a string, so only parts between strings need a look
+  parts = line.split("'")
+  if len(parts) % 2 == 0:
+    raise ValueError('unterminated string')
+  parts[::2] = [ literal_syntax.sub(lambda m: literals[m.group()], part) if 'True' in part or 'False' in part or 'None' in part else part
+                 for part in parts[::2] ]
+  return '"'.join(parts)
+
+methods = [ 'json', 'normalized', 'literal_eval' ]
+
+def parse_line(line):
+  try:
+    return loads(line), 'json'
+  except ValueError:
+    pass
+  try:
+    return json.loads(normalize_quotes(line)), 'normalized'
+  except ValueError:
+    pass
+  return ast.literal_eval(line.strip()), 'literal_eval'
+
+# returns parsed values, number of lines parsed by each method and lines which could not be parsed at all
+def parse_batch(lines):
+  values = []
+  counts = { m: 0 for m in methods }
+  failures = []
+  for line in lines:
+    try:
+      value, method = parse_line(line)
+      values.append(value)
+      counts[method] += 1
+    except Exception as e:
+      failures.append((line[:200].rstrip(), str(e)))
+  return values, counts, failures
+
+class ParseResult:
+  def __init__(self):
+    self.values = []
+    self.counts = { m: 0 for m in methods }
+    self.failures = []
+
+  def add(self, batch_result):
+    values, counts, failures = batch_result
+    self.values.extend(values)
+    for m, count in counts.items():
+      self.counts[m] += count
+    self.failures.extend(failures)
+
+  def report(self, parsed_counter=None, failure_counter=None):
+    print('parsed node-status lines:', self.counts, 'failed:', len(self.failures))
+    for line, error in self.failures[:10]:
+      print('\tfailed to parse node-status line ({}): {}'.format(error, line))
+    if parsed_counter is not None:
+      for m, count in self.counts.items():
+        parsed_counter.labels(method=m).inc(count)
+    if failure_counter is not None:
+      failure_counter.inc(len(self.failures))
+
+pool = None
+
+# pool is created lazily from a collector thread while other threads (pod inventory watch, prometheus server, seed queries)
+# are running. forking such a process can leave a child stuck on a lock held by another thread, so workers are forked
+# from a single threaded forkserver process instead
+def get_pool(workers=None):
+  global pool
+  if pool is None:
+    pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver'))
+  return pool
+
+# parses non-empty lines, in batches on a (long lived) process pool once there are enough of them to pay for the pickling
+def parse_lines(lines, batch_size=2000, workers=None):
+  lines = [ line for line in lines if line.strip() != '' ]
+  result = ParseResult()
+  if len(lines) <= batch_size or (os.cpu_count() or 1) < 2:
+    result.add(parse_batch(lines))
+    return result
+  batches = [ lines[i:i+batch_size] for i in range(0, len(lines), batch_size) ]
+  for batch_result in get_pool(workers).map(parse_batch, batches):
+    result.add(batch_result)
+  return result
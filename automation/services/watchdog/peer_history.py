@@ -0,0 +1,127 @@
+import ast
+import datetime
+import os
+import sqlite3
+import time
+
+# history of responding peers used by make_report for the 'responding in last n hours' windows.
+#
+# every report appends the peers which responded to a sqlite segment of its day (<dir>/<yyyy-mm-dd>.sqlite), so retention
+# is deleting whole old segments. window aggregates don't rescan history: each segment is asked (through index on report time)
+# for the last time every peer, ip and discord was seen since the start of the largest window, windows are then cut from that
+
+schema = '''
+CREATE TABLE IF NOT EXISTS reports (id INTEGER PRIMARY KEY, time REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS reports_time ON reports (time);
+CREATE TABLE IF NOT EXISTS peers (report INTEGER NOT NULL, ip TEXT NOT NULL, peer_id TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS peers_report ON peers (report);
+CREATE TABLE IF NOT EXISTS discords (report INTEGER NOT NULL, discord TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS discords_report ON discords (report);
+'''
+
+class PeerHistory:
+  def __init__(self, directory, retention_days=8):
+    self.directory = directory
+    self.retention_days = retention_days
+    os.makedirs(directory, exist_ok=True)
+
+  def segment_day(self, timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).date()
+
+  def segment_file(self, day):
+    return os.path.join(self.directory, day.isoformat() + '.sqlite')
+
+  # list of (day, file) of existing segments, oldest first
+  def segments(self):
+    result = []
+    for fname in sorted(os.listdir(self.directory)):
+      if not fname.endswith('.sqlite'):
+        continue
+      try:
+        day = datetime.date.fromisoformat(fname[:-len('.sqlite')])
+      except ValueError:
+        continue
+      result.append((day, os.path.join(self.directory, fname)))
+    return result
+
+  def connect(self, fname):
+    connection = sqlite3.connect(fname)
+    connection.executescript(schema)
+    return connection
+
+  # peers: dict of (ip, peer_id) -> list of discords of block producers of the peer
+  def append(self, timestamp, peers):
+    with self.connect(self.segment_file(self.segment_day(timestamp))) as connection:
+      report = connection.execute('INSERT INTO reports (time) VALUES (?)', (timestamp, )).lastrowid
+      connection.executemany('INSERT INTO peers VALUES (?, ?, ?)', [ (report, ip, peer_id) for ip, peer_id in peers ])
+      discords = set(d for ds in peers.values() for d in ds)
+      connection.executemany('INSERT INTO discords VALUES (?, ?)', [ (report, d) for d in discords ])
+    connection.close()
+
+  def apply_retention(self, now=None):
+    now = time.time() if now is None else now
+    oldest_kept = self.segment_day(now) - datetime.timedelta(days=self.retention_days)
+    for day, fname in self.segments():
+      if day < oldest_kept:
+        print('removing peer history segment', fname)
+        os.remove(fname)
+
+  def oldest_report(self):
+    for _, fname in self.segments():
+      with self.connect(fname) as connection:
+        oldest = connection.execute('SELECT MIN(time) FROM reports').fetchone()[0]
+      connection.close()
+      if oldest is not None:
+        return oldest
+    return None
+
+  # returns dicts window (hours) -> set of responding peers (str of (ip, peer_id) tuple, like keys of peer table file), ips and discords
+  def windows(self, windows_in_hours, now=None):
+    now = time.time() if now is None else now
+    start = now - max(windows_in_hours) * 3600
+
+    peers_last_seen = {}
+    ips_last_seen = {}
+    discords_last_seen = {}
+
+    def update(last_seen, rows):
+      for key, seen in rows:
+        if seen > last_seen.get(key, 0):
+          last_seen[key] = seen
+
+    for day, fname in self.segments():
+      if day < self.segment_day(start):
+        continue
+      with self.connect(fname) as connection:
+        update(peers_last_seen, (((ip, peer_id), seen) for ip, peer_id, seen in connection.execute(
+          'SELECT ip, peer_id, MAX(r.time) FROM peers p JOIN reports r ON r.id = p.report WHERE r.time >= ? GROUP BY ip, peer_id', (start, ))))
+        update(ips_last_seen, connection.execute(
+          'SELECT ip, MAX(r.time) FROM peers p JOIN reports r ON r.id = p.report WHERE r.time >= ? GROUP BY ip', (start, )))
+        update(discords_last_seen, connection.execute(
+          'SELECT discord, MAX(r.time) FROM discords d JOIN reports r ON r.id = d.report WHERE r.time >= ? GROUP BY discord', (start, )))
+      connection.close()
+
+    def cut(last_seen, key_fn):
+      return { w: set(key_fn(key) for key, seen in last_seen.items() if now - seen <= w*3600) for w in windows_in_hours }
+
+    return cut(peers_last_seen, str), cut(ips_last_seen, lambda ip: ip), cut(discords_last_seen, lambda d: d)
+
+  # imports peer_table.<timestamp>.txt files written by previous versions of make_report and renames them to *.imported
+  def import_legacy(self, directory='.'):
+    imported = 0
+    for fname in sorted(os.listdir(directory)):
+      if 'peer_table' not in fname or fname.startswith('.') or not fname.endswith('txt'):
+        continue
+      path = os.path.join(directory, fname)
+      try:
+        file_timestamp = float('.'.join(fname.split('.')[1:-1]))
+        with open(path, 'r') as f:
+          peers = ast.literal_eval(f.read())
+        self.append(file_timestamp, { ast.literal_eval(k): v['discord(s)'] for k, v in peers.items() })
+        os.rename(path, path + '.imported')
+        imported += 1
+      except Exception as e:
+        print('could not import legacy peer table', fname, ':', e)
+    if imported > 0:
+      print('imported', imported, 'legacy peer tables')
+    return imported
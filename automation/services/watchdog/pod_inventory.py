@@ -0,0 +1,121 @@
+import threading
+import time
+import traceback
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+mina_container_names = [ 'coda', 'mina', 'seed', 'coordinator', 'archive' ]
+
+def daemon_port_of(pod):
+  for c in pod.spec.containers:
+    if c.args and c.args[0] == 'daemon':
+      for v in c.env or []:
+        if v.name == 'DAEMON_CLIENT_PORT':
+          return v.value
+  return None
+
+# pods of the namespace shared by all watchdog collectors, instead of each of them listing (and converting to dicts) all pods every cycle.
+#
+# pods are listed once and then kept up to date by a watch stream on a background thread (relisting when the watch expires or fails).
+# pods, their container statuses and seed daemon ports are indexed by pod name. queries return snapshots, so collectors on other threads
+# can iterate them freely. refresh() alone (without start) gives one-off snapshot for short lived scripts like make_report
+class PodInventory:
+  def __init__(self, v1, namespace, watch_timeout_seconds=5*60, retry_seconds=10):
+    self.v1 = v1
+    self.namespace = namespace
+    self.watch_timeout_seconds = watch_timeout_seconds
+    self.retry_seconds = retry_seconds
+    self.lock = threading.Lock()
+    self.pods = {}
+    self.daemon_ports = {}
+    self.resource_version = None
+    self.last_update = None
+    self.thread = None
+
+  def update(self, pod):
+    name = pod.metadata.name
+    self.pods[name] = pod
+    self.daemon_ports[name] = daemon_port_of(pod)
+
+  def delete(self, name):
+    self.pods.pop(name, None)
+    self.daemon_ports.pop(name, None)
+
+  def refresh(self):
+    pods = self.v1.list_namespaced_pod(self.namespace, watch=False)
+    with self.lock:
+      self.pods = {}
+      self.daemon_ports = {}
+      for pod in pods.items:
+        self.update(pod)
+      self.resource_version = pods.metadata.resource_version
+      self.last_update = time.time()
+    print('pod inventory: listed', len(pods.items), 'pods')
+
+  def watch_forever(self):
+    while True:
+      try:
+        w = watch.Watch()
+        for event in w.stream(self.v1.list_namespaced_pod, self.namespace, resource_version=self.resource_version, timeout_seconds=self.watch_timeout_seconds):
+          pod = event['object']
+          with self.lock:
+            if event['type'] == 'DELETED':
+              self.delete(pod.metadata.name)
+            else:
+              self.update(pod)
+            self.resource_version = pod.metadata.resource_version
+            self.last_update = time.time()
+      except ApiException as e:
+        if e.status == 410:
+          # watch expired, start over from fresh list
+          print('pod inventory: watch expired, relisting pods')
+        else:
+          print('pod inventory: watch failed:', traceback.format_exc())
+          time.sleep(self.retry_seconds)
+        self.refresh_safely()
+      except Exception:
+        print('pod inventory: watch failed:', traceback.format_exc())
+        time.sleep(self.retry_seconds)
+        self.refresh_safely()
+
+  def refresh_safely(self):
+    try:
+      self.refresh()
+    except Exception:
+      print('pod inventory: listing pods failed:', traceback.format_exc())
+
+  def start(self):
+    self.refresh()
+    self.thread = threading.Thread(target=self.watch_forever, name='pod-inventory', daemon=True)
+    self.thread.start()
+    return self
+
+  # ===============================================================
+
+  def pod(self, name):
+    with self.lock:
+      return self.pods.get(name)
+
+  def all_pods(self):
+    with self.lock:
+      return list(self.pods.values())
+
+  def running_pods(self):
+    return [ pod for pod in self.all_pods() if pod.status.phase == 'Running' ]
+
+  def running_pod_names(self):
+    return [ pod.metadata.name for pod in self.running_pods() ]
+
+  def container_statuses(self, name):
+    pod = self.pod(name)
+    if pod is None or pod.status.container_statuses is None:
+      return []
+    return pod.status.container_statuses
+
+  def seeds(self):
+    return [ name for name in self.running_pod_names() if 'seed' in name ]
+
+  def seed_daemon_port(self, name):
+    with self.lock:
+      return self.daemon_ports.get(name)
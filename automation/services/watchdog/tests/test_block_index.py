@@ -0,0 +1,108 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from block_index import BlockIndex
+
+class TestBlockIndex(unittest.TestCase):
+
+  # a <- b <- c <- d <- e, fork c <- x
+  def index(self):
+    index = BlockIndex(max_age=2)
+    index.begin_cycle()
+    index.add_chain([ 'a', 'b', 'c', 'd', 'e' ])
+    index.add_chain([ 'a', 'b', 'c', 'd', 'e' ])
+    index.add_chain([ 'b', 'c', 'x' ])
+    return index
+
+  def test_queries(self):
+    index = self.index()
+    self.assertEqual(6, len(index))
+    self.assertEqual('d', index.parent('e'))
+    self.assertIsNone(index.parent('a'))
+    self.assertEqual([ 'e', 'd', 'c', 'b' ], index.ancestors('e', 3))
+    self.assertEqual([ 'b', 'a' ], index.ancestors('b', 5))
+    self.assertEqual([], index.ancestors('unknown', 3))
+    self.assertEqual([ 'a' ], index.roots())
+    self.assertEqual(('e', 4), index.deepest_child('a'))
+    self.assertEqual('e', index.deepest_tip())
+    self.assertEqual('c', index.common_ancestor('e', 'x'))
+    self.assertIsNone(index.common_ancestor('e', 'unknown'))
+
+  def test_deep_chain_has_no_recursion_limit(self):
+    index = BlockIndex()
+    index.begin_cycle()
+    index.add_chain([ str(i) for i in range(20000) ])
+    self.assertEqual(('19999', 19999), index.deepest_child('0'))
+    self.assertEqual('0', index.common_ancestor('19999', '0'))
+
+  def test_summarize(self):
+    summary = self.index().summarize()
+    # c is collapsed into b (same peers, single child), d and x are reported by different peers than their parents
+    self.assertEqual({
+      'a': { 'children': set([ 'b' ]), 'peers': 2, 'intermediate_nodes': 0 },
+      'b': { 'children': set([ 'd', 'x' ]), 'peers': 3, 'intermediate_nodes': 1 },
+      'd': { 'children': set([ 'e' ]), 'peers': 2, 'intermediate_nodes': 0 },
+      'e': { 'children': set(), 'peers': 2, 'intermediate_nodes': 0 },
+      'x': { 'children': set(), 'peers': 1, 'intermediate_nodes': 0 },
+    }, summary)
+
+  def test_summarize_collapses_runs(self):
+    index = BlockIndex()
+    index.begin_cycle()
+    index.add_chain([ 'a', 'b', 'c', 'd', 'e' ])
+    self.assertEqual({ 'a': { 'children': set([ 'e' ]), 'peers': 1, 'intermediate_nodes': 3 },
+                       'e': { 'children': set(), 'peers': 1, 'intermediate_nodes': 0 } }, index.summarize())
+
+  def test_prune_and_reuse(self):
+    index = self.index()
+    index.begin_cycle()
+    index.add_chain([ 'c', 'd', 'e', 'f' ])
+    # blocks not reported in this cycle are only kept until they are max_age cycles old
+    self.assertEqual(0, index.prune())
+    self.assertEqual([ 'c' ], index.roots())
+    index.begin_cycle()
+    index.add_chain([ 'd', 'e', 'f', 'g' ])
+    self.assertEqual(3, index.prune())
+    self.assertEqual(set([ 'c', 'd', 'e', 'f', 'g' ]), set(index.ids))
+    self.assertEqual([ 'g', 'f', 'e', 'd', 'c' ], index.ancestors('g', 10))
+    self.assertIsNone(index.parent('c'))
+    self.assertEqual(set([ index.ids['d'] ]), index.children[index.ids['c']])
+
+    # ids of pruned blocks are reused
+    capacity = len(index.hashes)
+    index.add_chain([ 'g', 'h', 'i' ])
+    self.assertEqual(capacity, len(index.hashes))
+    self.assertEqual('h', index.parent('i'))
+    self.assertEqual(('i', 2), index.deepest_child('g'))
+
+  def test_save_and_load(self):
+    index = self.index()
+    index.begin_cycle()
+    index.add_chain([ 'c', 'd', 'e', 'f' ])
+    index.begin_cycle()
+    index.prune()
+    with tempfile.TemporaryDirectory() as tmp:
+      fname = os.path.join(tmp, 'index.json')
+      index.save(fname)
+      loaded = BlockIndex.load(fname)
+    self.assertEqual(index.to_dict(), loaded.to_dict())
+    self.assertEqual([ 'f', 'e', 'd', 'c' ], loaded.ancestors('f', 10))
+    loaded.begin_cycle()
+    loaded.add_chain([ 'e', 'f', 'g' ])
+    self.assertEqual(('g', 2), loaded.deepest_child('e'))
+
+  def test_load_missing_or_broken(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      fname = os.path.join(tmp, 'index.json')
+      self.assertEqual(0, len(BlockIndex.load(fname, max_age=5)))
+      with open(fname, 'w') as f:
+        f.write('{"cycle": 1')
+      with mock.patch('builtins.print'):
+        index = BlockIndex.load(fname, max_age=5)
+    self.assertEqual(0, len(index))
+    self.assertEqual(5, index.max_age)
+
+if __name__ == '__main__':
+  unittest.main()
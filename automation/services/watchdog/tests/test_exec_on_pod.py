@@ -0,0 +1,98 @@
+import glob
+import subprocess
+import time
+import unittest
+from unittest import mock
+
+import util
+
+# commands which would run on the pod are run by local bash instead, so whole transfer (gzip, dd, base64, sha256sum) is real
+
+def local_exec_cmd(v1, namespace, pod, container, command, timeout):
+  return subprocess.run(['/bin/bash', '-c', command], capture_output=True, text=True, timeout=timeout).stdout
+
+def local_exec_stdout(v1, namespace, pod, container, command, timeout):
+  output = local_exec_cmd(v1, namespace, pod, container, command, timeout)
+  # websocket delivers output in pieces which don't respect base64 groups
+  for i in range(0, len(output), 1001):
+    yield output[i:i + 1001]
+
+# last line has no newline
+COMMAND = 'seq 1 20000 | awk \'{ printf "%s{\\"line\\": %d, \\"text\\": \\"żółw %d\\"}", (NR > 1 ? "\\n" : ""), $1, $1 * 7919 % 10007 }\''
+
+class TestExecOnPodLines(unittest.TestCase):
+
+  def setUp(self):
+    self.patches = [ mock.patch('util.exec_cmd', side_effect=local_exec_cmd), mock.patch('util.exec_stdout', side_effect=local_exec_stdout), mock.patch('builtins.print') ]
+    for p in self.patches:
+      p.start()
+    self.leftovers = set(glob.glob('/tmp/cns_command.*'))
+
+  def tearDown(self):
+    for p in self.patches:
+      p.stop()
+
+  def lines(self, **kwargs):
+    return list(util.exec_on_pod_lines(None, 'ns', 'pod', 'mina', COMMAND, **kwargs))
+
+  def assert_cleaned_up(self):
+    self.assertEqual(self.leftovers, set(glob.glob('/tmp/cns_command.*')))
+
+  def test_output_in_many_chunks(self):
+    lines = self.lines(chunk_size=4096)
+    self.assertEqual(20000, len(lines))
+    self.assertEqual('{"line": 1, "text": "żółw 7919"}\n', lines[0])
+    self.assertTrue(all(line.endswith('\n') for line in lines[:-1]))
+    self.assertEqual('{"line": 20000, "text": "żółw ' + str(20000 * 7919 % 10007) + '"}', lines[-1])
+    self.assert_cleaned_up()
+
+  def test_broken_transfer_is_resumed(self):
+    calls = []
+    def flaky(v1, namespace, pod, container, command, timeout):
+      calls.append(command)
+      for i, piece in enumerate(local_exec_stdout(v1, namespace, pod, container, command, timeout)):
+        if len(calls) == 2 and i == 3:
+          raise ConnectionError('websocket closed')
+        yield piece
+    with mock.patch('util.exec_stdout', side_effect=flaky):
+      lines = self.lines(chunk_size=50000)
+    self.assertEqual(20000, len(lines))
+    self.assertIn('skip=50000 ', calls[1])
+    self.assertNotIn('skip=50000 ', calls[2])
+    self.assert_cleaned_up()
+
+  def test_corrupted_transfer_yields_nothing(self):
+    def corrupted(v1, namespace, pod, container, command, timeout):
+      for i, piece in enumerate(local_exec_stdout(v1, namespace, pod, container, command, timeout)):
+        yield ('AAAA' + piece[4:]) if i == 5 else piece
+    with mock.patch('util.exec_stdout', side_effect=corrupted):
+      lines = util.exec_on_pod_lines(None, 'ns', 'pod', 'mina', COMMAND, chunk_size=4096)
+      with self.assertRaises(util.TransferError):
+        next(lines)
+    self.assert_cleaned_up()
+
+  def test_failing_transfer_gives_up(self):
+    def failing(v1, namespace, pod, container, command, timeout):
+      raise ConnectionError('websocket closed')
+      yield
+    with mock.patch('util.exec_stdout', side_effect=failing):
+      with self.assertRaises(util.TransferError):
+        self.lines(retries=2)
+    self.assert_cleaned_up()
+
+  def test_deadline_covers_whole_transfer(self):
+    timeouts = []
+    def slow(v1, namespace, pod, container, command, timeout):
+      timeouts.append(timeout)
+      time.sleep(0.2)
+      yield from local_exec_stdout(v1, namespace, pod, container, command, timeout)
+    with mock.patch('util.exec_stdout', side_effect=slow):
+      with self.assertRaises(util.TransferError):
+        self.lines(chunk_size=4096, request_timeout_seconds=1)
+    self.assertGreater(len(timeouts), 1)
+    self.assertTrue(all(0 < t <= 1 for t in timeouts))
+    self.assertLess(timeouts[-1], timeouts[0])
+    self.assert_cleaned_up()
+
+if __name__ == '__main__':
+  unittest.main()
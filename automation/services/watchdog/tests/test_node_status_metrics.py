@@ -0,0 +1,71 @@
+import concurrent.futures
+import json
+import threading
+import unittest
+from unittest import mock
+
+import node_status_metrics
+
+def status(seed):
+  return json.dumps({ 'node_ip_addr': '10.0.0.1', 'node_peer_id': 'peer-of-' + seed, 'sync_status': 'Synced' }) + '\n'
+
+class TestCollectNodeStatus(unittest.TestCase):
+
+  def setUp(self):
+    node_status_metrics.seed_executor = None
+    node_status_metrics.seed_queries.clear()
+    self.inventory = mock.Mock()
+    self.inventory.seed_daemon_port.return_value = '8301'
+    self.release = threading.Event()
+    self.queried = []
+    self.printed = mock.patch('builtins.print')
+    self.printed.start()
+
+  def tearDown(self):
+    self.release.set()
+    node_status_metrics.seed_executor.shutdown(wait=True)
+    self.printed.stop()
+
+  # 'stuck' seeds don't answer until released, others answer right away
+  def exec_on_pod_lines(self, v1, namespace, pod, container, command, request_timeout_seconds):
+    self.queried.append((pod, command.split()[2], request_timeout_seconds))
+    if pod.startswith('stuck'):
+      self.release.wait()
+    if 'get-peers' in command:
+      return iter([ 'peer-of-' + pod + '\n' ])
+    return iter([ status(pod) ])
+
+  def collect(self, seeds, deadline=1):
+    with mock.patch('util.exec_on_pod_lines', side_effect=self.exec_on_pod_lines):
+      return node_status_metrics.collect_node_status(None, 'ns', seeds, self.inventory, mock.MagicMock(), mock.MagicMock(), seed_workers=2, seed_deadline_seconds=deadline)
+
+  def test_responses_are_merged(self):
+    queried, valid_resps, error_resps = self.collect([ 'a', 'b', 'c' ])
+    self.assertEqual(3, queried)
+    self.assertEqual(set([ 'peer-of-a', 'peer-of-b', 'peer-of-c' ]), set(r['node_peer_id'] for r in valid_resps))
+    self.assertEqual([], error_resps)
+    self.assertTrue(all(0 < timeout <= 1 for _, _, timeout in self.queried))
+
+  def test_late_seed_is_not_queried_again_while_running(self):
+    queried, valid_resps, _ = self.collect([ 'stuck', 'a' ])
+    self.assertEqual(1, queried)
+
+    with mock.patch('builtins.print') as printed:
+      queried, _, _ = self.collect([ 'stuck', 'a' ])
+    self.assertEqual(1, queried)
+    self.assertEqual(1, len([ q for q in self.queried if q[0] == 'stuck' ]))
+    printed.assert_any_call('seed stuck is still running query of previous cycle, skipping it')
+
+    self.release.set()
+    concurrent.futures.wait([ node_status_metrics.seed_queries['stuck'] ])
+    queried, _, _ = self.collect([ 'stuck', 'a' ])
+    self.assertEqual(2, queried)
+
+  def test_queued_seeds_are_cancelled_after_deadline(self):
+    # both workers are taken by stuck seeds, so 'a' never starts
+    queried, _, _ = self.collect([ 'stuck', 'stuck-too', 'a' ])
+    self.assertEqual(0, queried)
+    self.assertTrue(node_status_metrics.seed_queries['a'].cancelled())
+
+if __name__ == '__main__':
+  unittest.main()
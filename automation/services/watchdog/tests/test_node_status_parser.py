@@ -0,0 +1,75 @@
+import ast
+import json
+import unittest
+from unittest import mock
+
+import node_status_parser
+
+class TestParseLine(unittest.TestCase):
+
+  def assert_parsed(self, line, method):
+    value, used = node_status_parser.parse_line(line)
+    self.assertEqual(method, used)
+    self.assertEqual(ast.literal_eval(line.strip()), value)
+
+  def test_json(self):
+    self.assert_parsed('{"node_peer_id": "12D3", "sync_status": "Synced", "k_block_hashes": ["a", "b"], "uptime": 2e3}\n', 'json')
+
+  def test_single_quotes_and_literals(self):
+    self.assert_parsed("{'sync_status': 'Synced', 'catchup': None, 'ok': True, 'failed': False, 'note': 'None of True'}", 'normalized')
+
+  def test_mixed_quotes_and_escapes(self):
+    self.assert_parsed("{'error': {'string': 'RPC failed: \"context deadline exceeded\"', 'hint': \"it's\", 'path': 'a\\\\b', 'quote': 'it\\'s'}}", 'normalized')
+
+  def test_tuples_fall_back_to_literal_eval(self):
+    self.assert_parsed("{'k_block_hashes_and_timestamps': [('a', '1'), ('b', '2')]}", 'literal_eval')
+
+  def test_unsupported_escape_falls_back_to_literal_eval(self):
+    self.assert_parsed("{'data': 'caf\\xe9'}", 'literal_eval')
+
+  def test_unterminated_string(self):
+    with self.assertRaises(ValueError):
+      node_status_parser.normalize_quotes("{'a': 'b}")
+    with self.assertRaises(SyntaxError):
+      node_status_parser.parse_line("{'a': 'b}")
+
+  def test_identifiers_are_not_json(self):
+    with self.assertRaises(ValueError):
+      node_status_parser.normalize_quotes('{"a": Synced}')
+
+class TestParseLines(unittest.TestCase):
+
+  lines = [
+    '{"node_peer_id": "a"}\n',
+    "{'node_peer_id': 'b', 'synced': True}\n",
+    "{'node_peer_id': 'c', 'chain': [('x', 'y')]}\n",
+    '\n',
+    'Error: Unable to connect to Mina Daemon.\n',
+  ]
+
+  def test_counts_and_failures(self):
+    result = node_status_parser.parse_lines(self.lines)
+    self.assertEqual([ 'a', 'b', 'c' ], [ v['node_peer_id'] for v in result.values ])
+    self.assertEqual({ 'json': 1, 'normalized': 1, 'literal_eval': 1 }, result.counts)
+    self.assertEqual(1, len(result.failures))
+    self.assertEqual('Error: Unable to connect to Mina Daemon.', result.failures[0][0])
+
+  def test_batches_on_process_pool(self):
+    lines = [ json.dumps({ 'node_peer_id': str(i) }) for i in range(50) ] + [ "{'node_peer_id': 'last'}" ]
+    with mock.patch('os.cpu_count', return_value=2):
+      result = node_status_parser.parse_lines(lines, batch_size=7, workers=2)
+    self.assertEqual([ str(i) for i in range(50) ] + [ 'last' ], [ v['node_peer_id'] for v in result.values ])
+    self.assertEqual({ 'json': 50, 'normalized': 1, 'literal_eval': 0 }, result.counts)
+    # watchdog process is multi-threaded, so workers must not be forked from it
+    self.assertEqual('forkserver', node_status_parser.get_pool()._mp_context.get_start_method())
+
+  def test_report(self):
+    result = node_status_parser.parse_lines(self.lines)
+    parsed, failures = mock.MagicMock(), mock.MagicMock()
+    with mock.patch('builtins.print'):
+      result.report(parsed, failures)
+    parsed.labels.assert_any_call(method='literal_eval')
+    failures.inc.assert_called_once_with(1)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,78 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from peer_history import PeerHistory
+
+HOUR = 3600
+# noon of 2021-06-10 UTC
+NOW = datetime.datetime(2021, 6, 10, 12, tzinfo=datetime.timezone.utc).timestamp()
+
+class TestPeerHistory(unittest.TestCase):
+
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.directory = os.path.join(self.tmp.name, 'history')
+    self.history = PeerHistory(self.directory, retention_days=2)
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+  def test_windows(self):
+    self.history.append(NOW - 30*HOUR, { ('1.1.1.1', 'old'): [ 'alice' ] })
+    self.history.append(NOW - 13*HOUR, { ('1.1.1.1', 'a'): [ 'alice' ], ('2.2.2.2', 'b'): [] })
+    self.history.append(NOW - 2*HOUR, { ('1.1.1.1', 'a'): [ 'alice', 'bob' ] })
+    self.history.append(NOW - 1, { ('3.3.3.3', 'c'): [ 'carol' ] })
+    # reports span two daily segments
+    self.assertEqual([ '2021-06-09.sqlite', '2021-06-10.sqlite' ], [ os.path.basename(f) for _, f in self.history.segments() ])
+
+    peers, ips, discords = self.history.windows([ 1, 12, 24 ], now=NOW)
+    self.assertEqual({
+      1: set([ str(('3.3.3.3', 'c')) ]),
+      12: set([ str(('1.1.1.1', 'a')), str(('3.3.3.3', 'c')) ]),
+      24: set([ str(('1.1.1.1', 'a')), str(('2.2.2.2', 'b')), str(('3.3.3.3', 'c')) ]),
+    }, peers)
+    self.assertEqual({ 1: set([ '3.3.3.3' ]), 12: set([ '1.1.1.1', '3.3.3.3' ]), 24: set([ '1.1.1.1', '2.2.2.2', '3.3.3.3' ]) }, ips)
+    self.assertEqual({ 1: set([ 'carol' ]), 12: set([ 'alice', 'bob', 'carol' ]), 24: set([ 'alice', 'bob', 'carol' ]) }, discords)
+
+    self.assertEqual(NOW - 30*HOUR, self.history.oldest_report())
+
+  def test_empty_history(self):
+    self.assertIsNone(self.history.oldest_report())
+    self.assertEqual(({ 1: set() }, { 1: set() }, { 1: set() }), self.history.windows([ 1 ], now=NOW))
+
+  def test_retention_removes_whole_old_segments(self):
+    for days in range(5):
+      self.history.append(NOW - days*24*HOUR, { ('1.1.1.1', str(days)): [] })
+    open(os.path.join(self.directory, 'notes.txt'), 'w').close()
+    with mock.patch('builtins.print'):
+      self.history.apply_retention(now=NOW)
+    self.assertEqual([ datetime.date(2021, 6, 8), datetime.date(2021, 6, 9), datetime.date(2021, 6, 10) ], [ day for day, _ in self.history.segments() ])
+    self.assertTrue(os.path.exists(os.path.join(self.directory, 'notes.txt')))
+    self.assertEqual(NOW - 2*24*HOUR, self.history.oldest_report())
+
+  def test_import_legacy(self):
+    legacy = os.path.join(self.tmp.name, 'legacy')
+    os.makedirs(legacy)
+    table = { str(('1.1.1.1', 'a')): { 'discord(s)': [ 'alice' ] }, str(('2.2.2.2', 'b')): { 'discord(s)': [] } }
+    with open(os.path.join(legacy, 'peer_table.' + str(NOW - HOUR) + '.txt'), 'w') as f:
+      f.write(str(table))
+    with open(os.path.join(legacy, 'peer_table.' + str(NOW) + '.txt'), 'w') as f:
+      f.write('{ broken')
+
+    with mock.patch('builtins.print'):
+      self.assertEqual(1, self.history.import_legacy(legacy))
+    self.assertEqual(sorted([ 'peer_table.' + str(NOW - HOUR) + '.txt.imported', 'peer_table.' + str(NOW) + '.txt' ]), sorted(os.listdir(legacy)))
+
+    peers, _, discords = self.history.windows([ 2 ], now=NOW)
+    self.assertEqual(set([ str(('1.1.1.1', 'a')), str(('2.2.2.2', 'b')) ]), peers[2])
+    self.assertEqual(set([ 'alice' ]), discords[2])
+
+    # imported files are not imported again
+    with mock.patch('builtins.print'):
+      self.assertEqual(0, self.history.import_legacy(legacy))
+
+if __name__ == '__main__':
+  unittest.main()
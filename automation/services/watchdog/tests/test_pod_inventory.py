@@ -0,0 +1,89 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from kubernetes.client.rest import ApiException
+
+from pod_inventory import PodInventory
+
+def pod(name, phase='Running', port=None, resource_version='1'):
+  env = [] if port is None else [ SimpleNamespace(name='DAEMON_CLIENT_PORT', value=port) ]
+  container = SimpleNamespace(args=[ 'daemon' ], env=env)
+  statuses = [ SimpleNamespace(name='mina', restart_count=0) ]
+  return SimpleNamespace(metadata=SimpleNamespace(name=name, resource_version=resource_version),
+                         spec=SimpleNamespace(containers=[ container ]),
+                         status=SimpleNamespace(phase=phase, container_statuses=statuses))
+
+def pod_list(pods, resource_version):
+  return SimpleNamespace(items=pods, metadata=SimpleNamespace(resource_version=resource_version))
+
+# ends watch_forever, which otherwise never returns
+class Stop(BaseException):
+  pass
+
+class TestPodInventory(unittest.TestCase):
+
+  def setUp(self):
+    self.v1 = mock.Mock()
+    self.inventory = PodInventory(self.v1, 'ns', retry_seconds=0)
+    self.printed = mock.patch('builtins.print')
+    self.printed.start()
+
+  def tearDown(self):
+    self.printed.stop()
+
+  def test_refresh(self):
+    self.v1.list_namespaced_pod.return_value = pod_list([ pod('seed-1', port='8301'), pod('block-producer-1'), pod('seed-2', phase='Pending') ], '10')
+    self.inventory.refresh()
+    self.assertEqual(3, len(self.inventory.all_pods()))
+    self.assertEqual([ 'seed-1', 'block-producer-1' ], self.inventory.running_pod_names())
+    self.assertEqual([ 'seed-1' ], self.inventory.seeds())
+    self.assertEqual('8301', self.inventory.seed_daemon_port('seed-1'))
+    self.assertIsNone(self.inventory.seed_daemon_port('block-producer-1'))
+    self.assertEqual([ 'mina' ], [ c.name for c in self.inventory.container_statuses('seed-1') ])
+    self.assertEqual([], self.inventory.container_statuses('unknown'))
+    self.assertEqual('10', self.inventory.resource_version)
+
+  def test_watch_events_and_relist_on_expiry(self):
+    self.v1.list_namespaced_pod.side_effect = [
+      pod_list([ pod('seed-1', port='8301'), pod('seed-2') ], '10'),
+      pod_list([ pod('seed-3') ], '20'),
+    ]
+    self.inventory.refresh()
+
+    streams = [
+      iter([
+        { 'type': 'MODIFIED', 'object': pod('seed-1', port='9000', resource_version='11') },
+        { 'type': 'DELETED', 'object': pod('seed-2', resource_version='12') },
+        { 'type': 'ADDED', 'object': pod('seed-4', resource_version='13') },
+      ]),
+      ApiException(status=410),
+      Stop(),
+    ]
+    resource_versions = []
+    def stream(fn, namespace, resource_version, timeout_seconds):
+      resource_versions.append(resource_version)
+      next_stream = streams.pop(0)
+      if isinstance(next_stream, BaseException):
+        raise next_stream
+      return next_stream
+
+    snapshots = []
+    original_refresh = self.inventory.refresh
+    def refresh():
+      snapshots.append(sorted(self.inventory.running_pod_names()))
+      snapshots.append(self.inventory.seed_daemon_port('seed-1'))
+      original_refresh()
+
+    with mock.patch('kubernetes.watch.Watch') as watch, mock.patch.object(self.inventory, 'refresh', side_effect=refresh):
+      watch.return_value.stream.side_effect = stream
+      with self.assertRaises(Stop):
+        self.inventory.watch_forever()
+
+    # events were applied on top of the list, expired watch relisted and resumed from the new list
+    self.assertEqual([ [ 'seed-1', 'seed-4' ], '9000' ], snapshots)
+    self.assertEqual([ '10', '13', '20' ], resource_versions)
+    self.assertEqual([ 'seed-3' ], self.inventory.seeds())
+
+if __name__ == '__main__':
+  unittest.main()
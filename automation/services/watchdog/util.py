@@ -6,7 +6,13 @@ import traceback
 import asyncio
 import uuid
 import time
-import math
+import base64
+import codecs
+import hashlib
+import zlib
+import random
+import concurrent.futures
+from prometheus_client import Counter, Gauge, Histogram
 
 def get_kubernetes():
   if os.environ.get('LOCAL_KUBERNETES') is not None:
@@ -19,66 +25,204 @@ def get_kubernetes():
   v1 = client.CoreV1Api()
   return v1, namespace
 
-async def run_periodically(fn, seconds_between, error_counter):
-  while True:
+class Collector:
+  def __init__(self, name, fn, seconds_between, timeout_seconds=None):
+    self.name = name
+    self.fn = fn
+    self.seconds_between = seconds_between
+    # by default collector has to finish before its next run is due
+    self.timeout_seconds = seconds_between if timeout_seconds is None else timeout_seconds
+    self.running = None
+
+# runs blocking collectors on a thread pool, so a slow one (like a ten minute exec_on_pod_lines) never stalls the event loop or other collectors.
+# every collector gets a timeout, random start offset and jittered period (so collectors don't line up), and is never run twice at once:
+# a collector still running after its timeout keeps its thread and its next runs are skipped until it finishes
+class Scheduler:
+  def __init__(self, error_counter, jitter=0.1, max_workers=None):
+    self.error_counter = error_counter
+    self.jitter = jitter
+    self.max_workers = max_workers
+    self.collectors = []
+
+    self.last_success = Gauge('Coda_watchdog_collector_last_success_timestamp_seconds', 'Unix time of the last successful run of each collector', ['collector'])
+    self.duration = Histogram('Coda_watchdog_collector_duration_seconds', 'Duration of collector runs', ['collector'], buckets=[ 1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600 ])
+    self.timeouts = Counter('Coda_watchdog_collector_timeouts', 'Number of collector runs which exceeded their timeout', ['collector'])
+    self.skipped = Counter('Coda_watchdog_collector_skipped', 'Number of collector runs skipped because the previous run was still in progress', ['collector'])
+
+  def add(self, name, fn, seconds_between, timeout_seconds=None):
+    self.collectors.append(Collector(name, fn, seconds_between, timeout_seconds))
+
+  def jittered(self, seconds):
+    return seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+  def run_once(self, collector):
+    start = time.time()
     try:
-      fn()
+      collector.fn()
+      self.last_success.labels(collector=collector.name).set(time.time())
     except Exception as e:
-      exc_type, exc_obj, exc_tb = sys.exc_info()
       trace = traceback.format_exc()
-      error_counter.inc()
-      print(trace)
-
-    await asyncio.sleep(seconds_between)
+      self.error_counter.inc()
+      print('collector', collector.name, 'failed:', trace)
+    finally:
+      duration = time.time() - start
+      self.duration.labels(collector=collector.name).observe(duration)
+      print('collector', collector.name, 'took', duration, 'seconds')
+
+  async def run_periodically(self, collector, executor):
+    loop = asyncio.get_running_loop()
+    await asyncio.sleep(random.uniform(0, self.jitter * collector.seconds_between))
+    while True:
+      next_run = loop.time() + self.jittered(collector.seconds_between)
+      if collector.running is not None and not collector.running.done():
+        print('collector', collector.name, 'is still running, skipping')
+        self.skipped.labels(collector=collector.name).inc()
+      else:
+        collector.running = loop.run_in_executor(executor, self.run_once, collector)
+        try:
+          await asyncio.wait_for(asyncio.shield(collector.running), collector.timeout_seconds)
+        except asyncio.TimeoutError:
+          print('collector', collector.name, 'timed out after', collector.timeout_seconds, 'seconds')
+          self.error_counter.inc()
+          self.timeouts.labels(collector=collector.name).inc()
+      await asyncio.sleep(max(0, next_run - loop.time()))
+
+  async def run(self):
+    max_workers = len(self.collectors) if self.max_workers is None else self.max_workers
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='collector')
+    await asyncio.gather(*[ self.run_periodically(c, executor) for c in self.collectors ])
+
+  def run_forever(self):
+    asyncio.run(self.run())
 
 # ===============================================================
 
-# kubernetes has issues streaming big blobs over - this function runs a command, and then breaks the result up over multiple requests to ensure the result makes it over safely
-def exec_on_pod(v1, namespace, pod, container, command, request_timeout_seconds = 600):
-  def exec_cmd(command, timeout):
-    exec_command = [
-      '/bin/bash',
-      '-c',
-      command,
-    ]
-    result = stream.stream(v1.connect_get_namespaced_pod_exec, pod, namespace, command=exec_command, container=container, stderr=True, stdout=True, stdin=False, tty=False, _request_timeout=timeout)
-    return result
+def exec_cmd(v1, namespace, pod, container, command, timeout):
+  exec_command = [
+    '/bin/bash',
+    '-c',
+    command,
+  ]
+  result = stream.stream(v1.connect_get_namespaced_pod_exec, pod, namespace, command=exec_command, container=container, stderr=True, stdout=True, stdin=False, tty=False, _request_timeout=timeout)
+  return result
 
+# yields stdout of command piece by piece as it arrives on the websocket, instead of waiting for all of it
+def exec_stdout(v1, namespace, pod, container, command, timeout):
+  exec_command = [
+    '/bin/bash',
+    '-c',
+    command,
+  ]
+  resp = stream.stream(v1.connect_get_namespaced_pod_exec, pod, namespace, command=exec_command, container=container, stderr=True, stdout=True, stdin=False, tty=False, _preload_content=False, _request_timeout=timeout)
+  deadline = time.time() + timeout
+  try:
+    while resp.is_open():
+      if time.time() > deadline:
+        raise TimeoutError('command ' + command + ' did not finish in ' + str(timeout) + ' seconds')
+      resp.update(timeout=1)
+      if resp.peek_stdout():
+        yield resp.read_stdout()
+    rest = resp.read_stdout()
+    if rest:
+      yield rest
+  finally:
+    resp.close()
+
+class TransferError(Exception):
+  pass
+
+# kubernetes has issues streaming big blobs over - this function runs a command into a file on the pod, gzips it and then streams
+# the compressed file over in chunks (base64 encoded, since the exec websocket carries text). a broken chunk transfer is resumed
+# from the last byte received. compressed output is small, so it is kept in memory until its length, sha256 and uncompressed
+# length (from gzip trailer) are verified. only then it is decompressed and yielded line by line, so callers never see
+# output of a broken transfer. request_timeout_seconds bounds the whole call: running the command, stat and every chunk read only get
+# what is left of it
+def exec_on_pod_lines(v1, namespace, pod, container, command, request_timeout_seconds = 600, chunk_size = int(20e6), retries = 3):
   print('running command:', command)
 
   tmp_file = '/tmp/cns_command.' + str(uuid.uuid4()) + '.out'
+  gz_file = tmp_file + '.gz'
+
+  deadline = time.time() + request_timeout_seconds
+  def remaining(limit):
+    left = deadline - time.time()
+    if left <= 0:
+      raise TransferError('output of ' + command + ' was not transferred from ' + pod + ' in ' + str(request_timeout_seconds) + ' seconds')
+    return min(limit, left)
 
   start = time.time()
-  result = exec_cmd(command + ' &> ' + tmp_file, request_timeout_seconds)
+  exec_cmd(v1, namespace, pod, container, command + ' &> ' + tmp_file + '; gzip -c ' + tmp_file + ' > ' + gz_file, remaining(request_timeout_seconds))
   end = time.time()
 
   print('done running command')
   print('\tseconds to run:', end - start)
 
-  file_len = int(exec_cmd('stat --printf="%s" ' + tmp_file, 10))
-  print('\tfile length:', str(file_len/(1024*1024)) + 'MB')
-
-
-  read_segment = lambda start, size: exec_cmd('cat ' + tmp_file + ' | head -c ' + str(start + size) + ' | tail -c ' + str(size), 240)
-  chunk_size = int(20e6)
-  read_chunk = lambda i: read_segment(i*chunk_size, min((i+1)*chunk_size, file_len) - i*chunk_size)
-  num_chunks = math.ceil(file_len/chunk_size)
-
-  start = time.time()
-  chunks = list(map(read_chunk, range(num_chunks)))
-  result = ''.join(chunks)
-  end = time.time()
-
-  print('\tseconds to get result:', end - start)
-
-  exec_cmd('rm ' + tmp_file, 10)
-
-  received_len = len(result.encode('utf-8'))
-
-  if file_len != received_len:
-    print('\twarning, result length didn\'t match received length', file_len, received_len)
-
-  # seems to fail frequently
-  # assert(file_len - received_len == 0 or file_len - received_len == 1)
-
-  return result
+  try:
+    stats = exec_cmd(v1, namespace, pod, container, 'stat --printf="%s " ' + tmp_file + ' ' + gz_file + ' && sha256sum ' + gz_file, remaining(30)).split()
+    file_len, gz_len, checksum = int(stats[0]), int(stats[1]), stats[2]
+    print('\tfile length:', str(file_len/(1024*1024)) + 'MB', 'compressed:', str(gz_len/(1024*1024)) + 'MB')
+
+    def read_segment(offset, size):
+      encoded = ''
+      read_command = 'dd if=' + gz_file + ' iflag=skip_bytes,count_bytes skip=' + str(offset) + ' count=' + str(size) + ' status=none | base64 -w 0'
+      for piece in exec_stdout(v1, namespace, pod, container, read_command, remaining(240)):
+        encoded += piece
+        # base64 decodes in groups of 4 characters
+        decodable = len(encoded) - len(encoded) % 4
+        if decodable > 0:
+          yield base64.b64decode(encoded[:decodable])
+          encoded = encoded[decodable:]
+      if encoded:
+        yield base64.b64decode(encoded)
+
+    compressed = bytearray()
+    failures = 0
+
+    start = time.time()
+    while len(compressed) < gz_len:
+      segment_end = min(len(compressed) + chunk_size, gz_len)
+      try:
+        for data in read_segment(len(compressed), segment_end - len(compressed)):
+          compressed += data
+      except TransferError:
+        raise
+      except Exception as e:
+        print('\ttransfer of', gz_file, 'failed at byte', len(compressed), ':', e)
+        failures += 1
+      else:
+        if len(compressed) != segment_end:
+          print('\ttransfer of', gz_file, 'ended early at byte', len(compressed), 'of', segment_end)
+          failures += 1
+      if failures > retries:
+        raise TransferError('could not transfer output of ' + command + ' from ' + pod + ' after ' + str(retries) + ' retries')
+    end = time.time()
+
+    print('\tseconds to get result:', end - start)
+
+    if len(compressed) != gz_len or hashlib.sha256(compressed).hexdigest() != checksum:
+      raise TransferError('checksum of output of ' + command + ' did not match')
+    # gzip trailer holds length of uncompressed data (modulo 2^32)
+    if int.from_bytes(compressed[-4:], 'little') != file_len % 2**32:
+      raise TransferError('result length didn\'t match length in gzip trailer ' + str(file_len))
+  finally:
+    exec_cmd(v1, namespace, pod, container, 'rm -f ' + tmp_file + ' ' + gz_file, 10)
+
+  yield from decompressed_lines(compressed)
+
+def decompressed_lines(compressed, piece_size = 1024*1024):
+  decompressor = zlib.decompressobj(wbits=31)
+  decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+  partial_line = ''
+  view = memoryview(compressed)
+  for offset in range(0, len(view), piece_size):
+    text = decoder.decode(decompressor.decompress(view[offset:offset + piece_size]))
+    lines = (partial_line + text).split('\n')
+    partial_line = lines.pop()
+    for line in lines:
+      yield line + '\n'
+  lines = (partial_line + decoder.decode(decompressor.flush(), True)).split('\n')
+  partial_line = lines.pop()
+  for line in lines:
+    yield line + '\n'
+  if partial_line:
+    yield partial_line
@@ -7,10 +7,11 @@ import os
 import json
 from prometheus_client import Counter
 from prometheus_client import Gauge
-import asyncio
+from prometheus_client import Histogram
 import util
 
 import metrics
+from pod_inventory import PodInventory
 
 # =================================================
 
@@ -21,6 +22,7 @@ def main():
   start_http_server(port)
 
   v1, namespace = util.get_kubernetes()
+  inventory = PodInventory(v1, namespace).start()
 
   cluster_crashes = Gauge('Coda_watchdog_cluster_crashes', 'Description of gauge')
   error_counter = Counter('Coda_watchdog_errors', 'Description of gauge')
@@ -29,7 +31,9 @@ def main():
   nodes_synced = Gauge('Coda_watchdog_nodes_synced', 'Description of gauge')
   nodes_responded = Gauge('Coda_watchdog_nodes_responded', 'Number of nodes that responded to the last status query')
   prover_errors = Counter('Coda_watchdog_prover_errors', 'Description of gauge')
-  pods_with_no_new_logs = Gauge('Coda_watchdog_pods_with_no_new_logs', 'Number of nodes whose latest log is older than 10 minutes')
+  pods_with_no_new_logs = Gauge('Coda_watchdog_pods_with_no_new_logs', 'Fraction of running nodes which logged nothing in the last hour')
+  pod_last_log_age = Gauge('Coda_watchdog_pod_last_log_age_seconds', 'Age of the latest log line of each node (just over an hour if it logged nothing in the last hour)', ['pod'])
+  pod_last_log_age_histogram = Histogram('Coda_watchdog_pod_last_log_age', 'Distribution of ages (in seconds) of the latest log line of nodes', buckets=(60, 5*60, 10*60, 30*60, 60*60, float('inf')))
   nodes_queried=Gauge('Coda_watchdog_nodes_queried', 'Number of nodes that were queried for node-status')
   seed_nodes_responded=Gauge('Coda_watchdog_nodes_responded_to_seed', 'Number of nodes that responded to the last status query on each seed', ['seed'])
   seed_nodes_queried=Gauge('Coda_watchdog_nodes_queried_by_seed', 'Number of nodes that were queried for node-status on each seed', ['seed'])
@@ -40,6 +44,8 @@ def main():
   timed_out_errors=Gauge('Coda_watchdog_timed_out', 'Number of nodes that failed with the time-out error to a node-status query')
   stream_reset_errors=Gauge('Coda_watchdog_stream_reset', 'Number of nodes that failed with the stream-reset error to a node-status query')
   other_connection_errors=Gauge('Coda_watchdog_node_status_other_errors', 'Number of nodes that failed with an unexpected error to respond to a node-status query(look for it in the logs)')
+  node_status_parsed=Counter('Coda_watchdog_node_status_lines_parsed', 'Number of node-status response lines parsed by each parser (json, normalized, literal_eval)', ['method'])
+  node_status_parse_failures=Counter('Coda_watchdog_node_status_parse_failures', 'Number of node-status response lines which could not be parsed')
   nodes_errored=Gauge('Coda_watchdog_node_status_errors', 'Number of nodes that failed to respond to a node-status query')
 
   recent_google_bucket_blocks = Gauge('Coda_watchdog_recent_google_bucket_blocks', 'Description of gauge')
@@ -47,20 +53,16 @@ def main():
 
   # ========================================================================
 
-  fns = [
-    ( lambda: metrics.collect_cluster_crashes(v1, namespace, cluster_crashes), 30*60 ),
-    ( lambda: metrics.collect_node_status_metrics(v1, namespace, nodes_synced_near_best_tip, nodes_synced, nodes_queried, nodes_responded, seed_nodes_queried, seed_nodes_responded, nodes_errored, context_deadline_exceeded, failed_security_protocol_negotiation, connection_refused_errors,size_limit_exceeded_errors, timed_out_errors, stream_reset_errors, other_connection_errors, prover_errors), 10*60 ),
-    ( lambda: metrics.check_seed_list_up(v1, namespace, seeds_reachable), 60*60 ),
-    ( lambda: metrics.pods_with_no_new_logs(v1, namespace, pods_with_no_new_logs), 60*10 ),
-  ]
+  scheduler = util.Scheduler(error_counter)
 
-  if os.environ.get('CHECK_GCLOUD_STORAGE_BUCKET') is not None:
-    fns += [ ( lambda: metrics.check_google_storage_bucket(v1, namespace, recent_google_bucket_blocks), 30*60 ) ]
+  scheduler.add('cluster_crashes', lambda: metrics.collect_cluster_crashes(v1, namespace, inventory, cluster_crashes), 30*60 )
+  scheduler.add('node_status', lambda: metrics.collect_node_status_metrics(v1, namespace, inventory, nodes_synced_near_best_tip, nodes_synced, nodes_queried, nodes_responded, seed_nodes_queried, seed_nodes_responded, nodes_errored, context_deadline_exceeded, failed_security_protocol_negotiation, connection_refused_errors,size_limit_exceeded_errors, timed_out_errors, stream_reset_errors, other_connection_errors, prover_errors, node_status_parsed, node_status_parse_failures), 10*60 )
+  scheduler.add('seed_list_up', lambda: metrics.check_seed_list_up(v1, namespace, inventory, seeds_reachable), 60*60 )
+  scheduler.add('pods_with_no_new_logs', lambda: metrics.pods_with_no_new_logs(v1, namespace, inventory, pods_with_no_new_logs, pod_last_log_age, pod_last_log_age_histogram), 60*10 )
 
-  for fn, time_between in fns:
-    asyncio.ensure_future(util.run_periodically(fn, time_between, error_counter))
+  if os.environ.get('CHECK_GCLOUD_STORAGE_BUCKET') is not None:
+    scheduler.add('google_storage_bucket', lambda: metrics.check_google_storage_bucket(v1, namespace, recent_google_bucket_blocks), 30*60 )
 
-  loop = asyncio.get_event_loop()
-  loop.run_forever()
+  scheduler.run_forever()
 
 main()
@@ -6,10 +6,12 @@
     Requirements:
 
     all INFLUX_* env vars need to be defined (INFLUX_HOST,INFLUX_TOKEN,INFLUX_BUCKET_NAME,INFLUX_ORG)
+    unless local store is used (--store sqlite:<path> or BENCHMARK_STORE env var)
 
 """
 
 import argparse
+import atexit
 from pathlib import Path
 
 from lib import *
@@ -18,7 +20,7 @@ parser = argparse.ArgumentParser(description='Executes mina benchmarks')
 subparsers = parser.add_subparsers(dest="cmd")
 run_bench = subparsers.add_parser('run')
 run_bench.add_argument("--outfile", required=True, help="output file")
-run_bench.add_argument("--benchmark", type= BenchmarkType, help="benchmark to run")
+run_bench.add_argument("--benchmark", choices=registry.names(), help="benchmark to run")
 run_bench.add_argument("--influx", action='store_true', help = "Required only if --format=csv. Makes csv complaint with influx csv ")
 run_bench.add_argument("--format", type=Format, help="output file format [text,csv]", default=Format.text)
 run_bench.add_argument("--path", help="override path to benchmark")
@@ -27,31 +29,68 @@ run_bench.add_argument("--genesis-ledger-path", default="./genesis_ledgers/devne
 run_bench.add_argument("--k", default=1)
 run_bench.add_argument("--max-num-updates", default=4 , type=int)
 run_bench.add_argument("--min-num-updates", default=2, type=int)
+run_bench.add_argument("--target-name", help="Applicable only for allocation benchmark. Measurement name (defaults to executable name and arguments)")
+run_bench.add_argument("--target-args", help="Applicable only for allocation benchmark. Arguments of profiled executable")
+run_bench.add_argument("--repetitions", default=1, type=int, help="number of samples collected for each benchmark")
+run_bench.add_argument("--warmup", default=0, type=int, help="number of runs discarded before sampling")
+run_bench.add_argument("--min-time", default=0, type=float, help="keep sampling until at least given number of seconds passed")
+run_bench.add_argument("--no-cache", action='store_true', help="do not use (nor store) cached benchmark output for unchanged binary and inputs")
+run_bench.add_argument("--perf", action='store_true', help="record hardware counters with perf stat (if available) alongside resource usage")
+run_bench.add_argument("--calibrate", action='store_true', help="measure calibration loop before and after each run and mark results of noisy runs as untrusted (they are not uploaded)")
+run_bench.add_argument("--control-env", action='store_true', help="set performance cpu governor, disable turbo boost and ASLR for the time of benchmark (needs root, implies --calibrate)")
+run_bench.add_argument("--pin-cpus", help="pin benchmark to given cpus, like 2-3 (implies --calibrate). Defaults to isolated cpus (isolcpus) when calibrating")
+run_bench.add_argument("--noise-threshold", type=float, default=0.1, help="maximal calibration noise (coefficient of variation or drift) of trusted run")
+
+run_all_bench = subparsers.add_parser('run-all', help="runs multiple benchmarks concurrently on process pool")
+run_all_bench.add_argument("--outdir", required=True, help="output directory. Each benchmark writes to <outdir>/<benchmark>.[out|csv]")
+run_all_bench.add_argument("--benchmark", dest="benchmarks", choices=registry.names(), action='append', help="benchmark to run (can be repeated). By default runs all except allocation")
+run_all_bench.add_argument("--path", dest="paths", action='append', default=[], help="override path to benchmark in form <benchmark>=<path> (can be repeated)")
+run_all_bench.add_argument("--jobs", type=int, help="concurrency budget (number of cpus used by all benchmarks). Defaults to all available cpus")
+run_all_bench.add_argument("--influx", action='store_true', help = "Required only if --format=csv. Makes csv complaint with influx csv ")
+run_all_bench.add_argument("--format", type=Format, help="output file format [text,csv]", default=Format.text)
+run_all_bench.add_argument("--branch", default="test", help="Required only if --format=csv. Add branch name to csv file")
+run_all_bench.add_argument("--genesis-ledger-path", default="./genesis_ledgers/devnet.json",  help="Applicable only for ledger-export benchmark. Location of genesis config file")
+run_all_bench.add_argument("--k", default=1)
+run_all_bench.add_argument("--max-num-updates", default=4 , type=int)
+run_all_bench.add_argument("--min-num-updates", default=2, type=int)
+run_all_bench.add_argument("--repetitions", default=1, type=int, help="number of samples collected for each benchmark")
+run_all_bench.add_argument("--warmup", default=0, type=int, help="number of runs discarded before sampling")
+run_all_bench.add_argument("--min-time", default=0, type=float, help="keep sampling until at least given number of seconds passed")
+run_all_bench.add_argument("--no-cache", action='store_true', help="do not use (nor store) cached benchmark output for unchanged binary and inputs")
+run_all_bench.add_argument("--perf", action='store_true', help="record hardware counters with perf stat (if available) alongside resource usage")
 
 parse_bench = subparsers.add_parser('parse',help="parse textual benchmark output to csv")
-parse_bench.add_argument("--benchmark", type= BenchmarkType, help="benchmark to run")
-parse_bench.add_argument("--infile",help="input file")
+parse_bench.add_argument("--benchmark", choices=registry.names(), help="benchmark to run")
+parse_bench.add_argument("--infile", action='append', help="input file. Can be repeated when benchmark was sampled multiple times")
 parse_bench.add_argument("--influx", action='store_true', help="assure output file is compliant with influx schena")
 parse_bench.add_argument("--branch", help="adds additional colum in csv with branch from which benchmarks where built")
 parse_bench.add_argument("--outfile", help="output file")
+parse_bench.add_argument("--target-name", help="Applicable only for allocation benchmark. Measurement name (defaults to executable name and arguments)")
 
 compare_bench = subparsers.add_parser('compare', help="compare current data with historical downloaded from influx db")
-compare_bench.add_argument("--benchmark", type= BenchmarkType, help="benchmark to run")
+compare_bench.add_argument("--benchmark", choices=registry.names(), help="benchmark to run")
 compare_bench.add_argument("--infile", help="input file")
-compare_bench.add_argument("--yellow-threshold",help="defines how many percent current measurement can exceed average so app will trigger warning",
+compare_bench.add_argument("--yellow-threshold",help="defines how many percent current measurement can significantly exceed historical median so app will trigger warning",
                            type=float,
                            choices=[Range(0.0, 1.0)],
                            default=0.1)
-compare_bench.add_argument("--red-threshold",help="defines how many percent current measurement can exceed average so app will exit with error",
+compare_bench.add_argument("--red-threshold",help="defines how many percent current measurement can significantly exceed historical median so app will exit with error",
                            type=float,
                            choices=[Range(0.0, 1.0)],
                            default=0.2)
+compare_bench.add_argument("--history-size", type=int, default=20, help="number of last historical samples used for comparison")
+compare_bench.add_argument("--method", type=Method, default=Method.bootstrap, help="statistical test [bootstrap,mann-whitney]")
+compare_bench.add_argument("--confidence", type=float, choices=[Range(0.5, 0.999)], default=0.95, help="confidence level of statistical test")
+compare_bench.add_argument("--store", help="where historical results are kept: influx (default, requires INFLUX_* env vars) or sqlite:<path>. Defaults to BENCHMARK_STORE env var")
 
 upload_bench = subparsers.add_parser('upload')
+upload_bench.add_argument("--benchmark", choices=registry.names(), help="benchmark which produced file")
 upload_bench.add_argument("--infile")
+upload_bench.add_argument("--force", action='store_true', help="upload file even if it was produced by run marked as untrusted (see --calibrate)")
+upload_bench.add_argument("--store", help="where historical results are kept: influx (default, requires INFLUX_* env vars) or sqlite:<path>. Defaults to BENCHMARK_STORE env var")
 
 test_bench = subparsers.add_parser('test', help="Performs entire cycle of operations from run till upload")
-test_bench.add_argument("--benchmark", type=BenchmarkType, help="benchmark to test")
+test_bench.add_argument("--benchmark", choices=registry.names(), help="benchmark to test")
 test_bench.add_argument("--tmpfile", help="temporary location of result file")
 test_bench.add_argument("--path")
 test_bench.add_argument("--yellow-threshold",
@@ -64,13 +103,93 @@ test_bench.add_argument("--red-threshold",
                         type=float,
                         choices=[Range(0.0, 1.0)],
                         default=0.2)
+test_bench.add_argument("--history-size", type=int, default=20, help="number of last historical samples used for comparison")
+test_bench.add_argument("--method", type=Method, default=Method.bootstrap, help="statistical test [bootstrap,mann-whitney]")
+test_bench.add_argument("--confidence", type=float, choices=[Range(0.5, 0.999)], default=0.95, help="confidence level of statistical test")
+test_bench.add_argument("--store", help="where historical results are kept: influx (default, requires INFLUX_* env vars) or sqlite:<path>. Defaults to BENCHMARK_STORE env var")
 test_bench.add_argument("--branch", help="branch which was used in tests")
 test_bench.add_argument("--genesis-ledger-path", default="./genesis_ledgers/devnet.json", help="Applicable only for ledger-export benchmark. Location of genesis config file")
 test_bench.add_argument('-m','--mainline-branches', action='append', help='Defines mainline branch. If values of \'--branch\' parameter is among mainline branches then result will be uploaded')
 test_bench.add_argument("--k", default=1)
 test_bench.add_argument("--max-num-updates", default=4 , type=int)
 test_bench.add_argument("--min-num-updates", default=2, type=int)
+test_bench.add_argument("--target-name", help="Applicable only for allocation benchmark. Measurement name (defaults to executable name and arguments)")
+test_bench.add_argument("--target-args", help="Applicable only for allocation benchmark. Arguments of profiled executable")
+test_bench.add_argument("--repetitions", default=1, type=int, help="number of samples collected for each benchmark")
+test_bench.add_argument("--warmup", default=0, type=int, help="number of runs discarded before sampling")
+test_bench.add_argument("--min-time", default=0, type=float, help="keep sampling until at least given number of seconds passed")
+test_bench.add_argument("--cache", action='store_true', help="use (and store) cached benchmark output for unchanged binary and inputs. Results served from cache are neither compared nor uploaded again")
+test_bench.add_argument("--perf", action='store_true', help="record hardware counters with perf stat (if available) alongside resource usage")
+test_bench.add_argument("--calibrate", action='store_true', help="measure calibration loop before and after each run and mark results of noisy runs as untrusted (they are not uploaded)")
+test_bench.add_argument("--control-env", action='store_true', help="set performance cpu governor, disable turbo boost and ASLR for the time of benchmark (needs root, implies --calibrate)")
+test_bench.add_argument("--pin-cpus", help="pin benchmark to given cpus, like 2-3 (implies --calibrate). Defaults to isolated cpus (isolcpus) when calibrating")
+test_bench.add_argument("--noise-threshold", type=float, default=0.1, help="maximal calibration noise (coefficient of variation or drift) of trusted run")
+
+bisect_bench = subparsers.add_parser('bisect', help="finds first commit which regressed measurement by driving git bisect")
+bisect_bench.add_argument("--benchmark", choices=registry.names(), help="benchmark to bisect")
+bisect_bench.add_argument("--good", required=True, help="last known good commit")
+bisect_bench.add_argument("--bad", required=True, help="commit on which regression was observed")
+bisect_bench.add_argument("--measurement", required=True, help="name of regressed measurement (row name in csv)")
+bisect_bench.add_argument("--field", help="regressed field (like 'Time/Run' or 'Time/Run [us]'). Defaults to first field of benchmark")
+bisect_bench.add_argument("--build-cmd", required=True, help="shell command which builds benchmark at checked out commit")
+bisect_bench.add_argument("--repo", default=".", help="git repository to bisect")
+bisect_bench.add_argument("--path", help="override path to benchmark")
+bisect_bench.add_argument("--yellow-threshold", type=float, choices=[Range(0.0, 1.0)], default=0.1)
+bisect_bench.add_argument("--red-threshold", help="commit is bad when measurement significantly exceeds good commit median by given fraction",
+                          type=float,
+                          choices=[Range(0.0, 1.0)],
+                          default=0.2)
+bisect_bench.add_argument("--method", type=Method, default=Method.bootstrap, help="statistical test [bootstrap,mann-whitney]")
+bisect_bench.add_argument("--confidence", type=float, choices=[Range(0.5, 0.999)], default=0.95, help="confidence level of statistical test")
+bisect_bench.add_argument("--genesis-ledger-path", default="./genesis_ledgers/devnet.json", help="Applicable only for ledger-export benchmark. Location of genesis config file")
+bisect_bench.add_argument("--k", default=1)
+bisect_bench.add_argument("--max-num-updates", default=4 , type=int)
+bisect_bench.add_argument("--min-num-updates", default=2, type=int)
+bisect_bench.add_argument("--repetitions", default=5, type=int, help="number of samples collected at each commit")
+bisect_bench.add_argument("--warmup", default=0, type=int, help="number of runs discarded before sampling")
+bisect_bench.add_argument("--no-cache", action='store_true', help="do not use (nor store) cached benchmark output for unchanged binary and inputs")
+bisect_bench.add_argument("--perf", action='store_true', help="record hardware counters with perf stat (if available) alongside resource usage")
+
+sweep_bench = subparsers.add_parser('sweep', help="runs benchmark over grid of parameters and fits scaling curves")
+sweep_bench.add_argument("--benchmark", choices=["snark", "zkapp"], help="benchmark to sweep")
+sweep_bench.add_argument("--outfile", required=True, help="output csv with intercept and slopes of each fitted curve")
+sweep_bench.add_argument("--path", help="override path to benchmark")
+sweep_bench.add_argument("--k", dest="ks", type=int, action='append', help="k of snark profiler (can be repeated). Defaults to 1")
+sweep_bench.add_argument("--updates", default="1,2,3,4", help="comma separated numbers of account updates run by snark profiler")
+sweep_bench.add_argument("--jobs", type=int, help="concurrency budget. Defaults to all available cpus")
+sweep_bench.add_argument("--isolate", action='store_true', help="run points of isolated benchmarks (snark) one at a time instead of in parallel")
+sweep_bench.add_argument("--repetitions", default=1, type=int, help="number of samples collected for each point")
+sweep_bench.add_argument("--influx", action='store_true', help="makes csv complaint with influx csv")
+sweep_bench.add_argument("--branch", default="test", help="add branch name to csv file")
+sweep_bench.add_argument("--no-cache", action='store_true', help="do not use (nor store) cached benchmark output for unchanged binary and inputs")
+sweep_bench.add_argument("--compare", action='store_true', help="compare slopes against history and exit with error on significant change")
+sweep_bench.add_argument("--yellow-threshold", type=float, choices=[Range(0.0, 1.0)], default=0.1)
+sweep_bench.add_argument("--red-threshold", type=float, choices=[Range(0.0, 1.0)], default=0.2)
+sweep_bench.add_argument("--history-size", type=int, default=20, help="number of last historical samples used for comparison")
+sweep_bench.add_argument("--method", type=Method, default=Method.bootstrap, help="statistical test [bootstrap,mann-whitney]")
+sweep_bench.add_argument("--confidence", type=float, choices=[Range(0.5, 0.999)], default=0.95, help="confidence level of statistical test")
+sweep_bench.add_argument("--store", help="where historical results are kept: influx (default, requires INFLUX_* env vars) or sqlite:<path>. Defaults to BENCHMARK_STORE env var")
+
+report_bench = subparsers.add_parser('report', help="generates html dashboard and json summary of benchmarks history")
+report_bench.add_argument("--benchmark", dest="benchmarks", choices=registry.names(), action='append', help="benchmark to report (can be repeated). By default reports all except allocation")
+report_bench.add_argument("--branch", required=True, help="branch which history is reported")
+report_bench.add_argument("--html", default="benchmarks.html", help="output html file")
+report_bench.add_argument("--json", default="benchmarks.json", help="output json summary file")
+report_bench.add_argument("--history-size", type=int, default=100, help="number of last runs shown for each measurement")
+report_bench.add_argument("--yellow-threshold", type=float, choices=[Range(0.0, 1.0)], default=0.1, help="change point exceeding threshold is reported as warning")
+report_bench.add_argument("--red-threshold", type=float, choices=[Range(0.0, 1.0)], default=0.2, help="change point exceeding threshold is reported as regression")
+report_bench.add_argument("--alpha", type=float, default=0.01, help="significance level of change point detection")
+report_bench.add_argument("--recent", type=int, default=10, help="change points within last given number of runs define status of measurement")
+report_bench.add_argument("--store", help="where historical results are kept: influx (default, requires INFLUX_* env vars) or sqlite:<path>. Defaults to BENCHMARK_STORE env var")
 
+import_bench = subparsers.add_parser('import', help="backfills store with historical raw benchmark outputs from directory or tarball")
+import_bench.add_argument("--source", required=True, help="directory or tarball with raw benchmark outputs. Commit hash is taken from file path")
+import_bench.add_argument("--benchmark", choices=registry.names(), help="type of all outputs. By default inferred from output format")
+import_bench.add_argument("--branch", required=True, help="branch which imported outputs belong to")
+import_bench.add_argument("--repo", help="git repository used to resolve commit time. Without it file modification time is used")
+import_bench.add_argument("--jobs", type=int, help="number of parsing processes (default: number of cpus)")
+import_bench.add_argument("--dry-run", action='store_true', help="parse and deduplicate outputs without writing to store")
+import_bench.add_argument("--store", help="where historical results are kept: influx (default, requires INFLUX_* env vars) or sqlite:<path>. Defaults to BENCHMARK_STORE env var")
 
 upload_bench = subparsers.add_parser('ls')
 
@@ -82,68 +201,198 @@ default_mainline_branches = ["develop", "compatible", "master"]
 
 
 def select_benchmark(kind):
-    if kind == BenchmarkType.mina_base:
-        return MinaBaseBenchmark()
-    elif kind == BenchmarkType.zkapp:
-        return ZkappLimitsBenchmark()
-    elif kind == BenchmarkType.heap_usage:
-        return HeapUsageBenchmark()
-    elif kind == BenchmarkType.snark:
-        return SnarkBenchmark(args.k, args.max_num_updates, args.min_num_updates)
-    elif kind == BenchmarkType.ledger_export:
-        if args.genesis_ledger_path is None:
-            print(
-                "--genesis-ledger-path need to be provided when running ledger export benchmark"
-            )
-            exit(1)
-        return LedgerExportBenchmark(args.genesis_ledger_path)
+    try:
+        return registry.create(kind, args)
+    except RuntimeError as e:
+        print(e)
+        exit(1)
 
 if args.cmd == "ls":
-    benches = [str(b) for b in BenchmarkType]
+    benches = registry.names()
     print("\n".join(benches))
     exit(0)
 
+if args.cmd == "run-all":
+    kinds = registry.defaults() if args.benchmarks is None else args.benchmarks
+    paths = dict(p.split("=", 1) for p in args.paths)
+    jobs = [
+        Job(select_benchmark(kind), paths.get(str(kind)), args.repetitions,
+            args.warmup, args.min_time) for kind in kinds
+    ]
+    cache = None if args.no_cache else ResultCache()
+    for job in jobs:
+        job.bench.cache = cache
+        job.bench.perf = args.perf
+
+    Path(args.outdir).mkdir(parents=True, exist_ok=True)
+    results = Scheduler(budget=args.jobs).run(jobs)
+
+    for result in results:
+        if not result.succeeded():
+            continue
+        bench = result.job.bench
+        outfile = str(Path(args.outdir) / result.job.name)
+        if args.format == Format.text:
+            for i, sample in enumerate(result.samples):
+                suffix = "" if len(result.samples) == 1 else f".{i}"
+                with open(f"{outfile}.out{suffix}", 'w') as file:
+                    file.write(sample)
+        else:
+            files = bench.parse_samples(result.samples, f"{outfile}.csv", args.influx, args.branch)
+            bench.annotate_usage(files, result.usage)
+            files = ",".join(files)
+            print(f"produced files: {files}")
+
+    failed = [result.job.name for result in results if not result.succeeded()]
+    if any(failed):
+        print(f"failed benchmarks: {','.join(failed)}")
+        exit(1)
+    exit(0)
+
+if args.cmd == "report":
+    report = Report(open_store(args.store), args.branch, args.history_size, args.yellow_threshold,
+                    args.red_threshold, args.alpha, args.recent)
+    for kind in registry.defaults() if args.benchmarks is None else args.benchmarks:
+        report.add(select_benchmark(kind))
+    report.write_html(args.html)
+    report.write_json(args.json)
+    print(f"produced files: {args.html},{args.json}")
+    exit(0)
+
+if args.cmd == "import":
+    importer = Importer(open_store(args.store), args.branch, args.benchmark, args.repo, args.jobs)
+    outputs, written, skipped = importer.run(args.source, args.dry_run)
+    print(f"imported {outputs} outputs: {written} new points, {skipped} duplicates skipped")
+    exit(0)
+
+if args.cmd == "sweep":
+    options = dict(path=args.path, repetitions=args.repetitions, isolate=args.isolate)
+    if args.benchmark == "snark":
+        updates = [int(n) for n in args.updates.split(",")]
+        sweep = SnarkSweep([1] if args.ks is None else args.ks, updates, **options)
+    else:
+        sweep = ZkappLimitsSweep(**options)
+    sweep.cache = None if args.no_cache else ResultCache()
+
+    curves = sweep.run(args.jobs)
+    sweep.export_to_csv(curves, args.outfile, args.influx, args.branch)
+    print(f"produced file: {args.outfile}")
+
+    if args.compare:
+        sweep.store = open_store(args.store)
+        if sweep.compare(args.outfile, args.yellow_threshold, args.red_threshold,
+                         args.history_size, args.method, args.confidence):
+            exit(1)
+    exit(0)
+
 if args.benchmark is None:
     print("benchmark not selected")
     exit(1)
 
 bench = select_benchmark(args.benchmark)
 
+if args.cmd in ["run", "bisect"]:
+    bench.cache = None if args.no_cache else ResultCache()
+
+if args.cmd == "test":
+    # cached output was already compared and uploaded when it was produced, so test runs benchmark unless asked otherwise
+    bench.cache = ResultCache() if args.cache else None
+
+if args.cmd in ["run", "test", "bisect"]:
+    bench.perf = args.perf
+
+if args.cmd in ["compare", "upload", "test"]:
+    bench.store = open_store(args.store)
+
+if args.cmd in ["run", "test"] and (args.calibrate or args.control_env or args.pin_cpus):
+    cpus = None if args.pin_cpus is None else parse_cpu_list(args.pin_cpus)
+    bench.environment = RunEnvironment(args.control_env, cpus, args.noise_threshold)
+    bench.environment.start()
+    # original governor, turbo and ASLR settings are restored however command ends
+    atexit.register(bench.environment.stop)
+
 if args.cmd == "run":
-    output = bench.run(path=args.path)
-    if args.format == "text":
-        with open(args.outfile, 'w') as file:
-            file.write(output)
+    if args.format == Format.text:
+        if args.repetitions == 1 and args.warmup == 0 and args.min_time == 0:
+            with open(args.outfile, 'w') as file:
+                file.writelines(bench.stream(path=args.path))
+        else:
+            samples = bench.sample(path=args.path, repetitions=args.repetitions, warmup=args.warmup, min_time=args.min_time)
+            for i, sample in enumerate(samples):
+                with open(f"{args.outfile}.{i}", 'w') as file:
+                    file.write(sample)
     else:
         files = ",".join(
-            bench.parse(output, args.outfile, args.influx, args.branch))
+            bench.run_and_parse(args.path, args.outfile, args.influx, args.branch,
+                                args.repetitions, args.warmup, args.min_time))
         print(f"produced files: {files}")
 
 if args.cmd == "parse":
-    files = bench.parse(Path(args.infile).read_text(), args.outfile, args.influx, args.branch)
+    if len(args.infile) == 1:
+        with open(args.infile[0]) as infile:
+            files = bench.parse(infile, args.outfile, args.influx, args.branch)
+    else:
+        samples = [Path(infile).read_text() for infile in args.infile]
+        files = bench.parse_samples(samples, args.outfile, args.influx, args.branch)
     print(f'Parsed files: \n{",".join(files)}')
 
 
 if args.cmd == "compare":
-    bench.compare(args.infile, args.yellow_threshold, args.red_threshold)
+    bench.compare(args.infile, args.yellow_threshold, args.red_threshold,
+                  args.history_size, args.method, args.confidence)
 
 if args.cmd == "upload":
-    bench.upload(args.infile)
+    if not args.force and not bench.trusted([args.infile]):
+        print(f"{args.infile} was produced by noisy run, not uploading (use --force to override)")
+        exit(1)
+    if not bench.upload(args.infile).succeeded():
+        exit(1)
 
 if args.cmd == "test":
-    output = bench.run(path=args.path)
-    files = bench.parse(output,
-                        args.tmpfile,
-                        influxdb=True,
-                        branch=args.branch)
+    files = bench.run_and_parse(args.path,
+                                args.tmpfile,
+                                influxdb=True,
+                                branch=args.branch,
+                                repetitions=args.repetitions,
+                                warmup=args.warmup,
+                                min_time=args.min_time)
+
+    if bench.cache_hits > 0:
+        print("benchmark output was served from result cache of earlier run, skipping comparison and upload")
+        exit(0)
 
     [
-        bench.compare(file, args.yellow_threshold, args.red_threshold)
+        bench.compare(file, args.yellow_threshold, args.red_threshold,
+                      args.history_size, args.method, args.confidence)
         for file in files
     ]
 
     mainline_branches = default_mainline_branches if args.mainline_branches is None else args.mainline_branches
 
-    if args.branch in mainline_branches:
-        for file in files:
-            bench.upload(file)
\ No newline at end of file
+    if args.branch in mainline_branches and not bench.trusted(files):
+        print("machine was too noisy during benchmark, results are marked as untrusted and not uploaded")
+    elif args.branch in mainline_branches:
+        results = [bench.upload(file) for file in files]
+        if not all(result.succeeded() for result in results):
+            exit(1)
+if args.cmd == "bisect":
+    bisector = Bisector(bench, args.build_cmd, args.measurement, args.field,
+                        repo=args.repo,
+                        path=args.path,
+                        repetitions=args.repetitions,
+                        warmup=args.warmup,
+                        yellow_threshold=args.yellow_threshold,
+                        red_threshold=args.red_threshold,
+                        method=args.method,
+                        confidence=args.confidence)
+    first_bad = bisector.run(args.good, args.bad)
+    if first_bad is None:
+        print(f"could not find commit which regressed {args.measurement}")
+        if bisector.candidates:
+            print("commits left to test could not be built, first regressing commit is one of:")
+            for commit in bisector.candidates:
+                print(f"  {commit}")
+        exit(1)
+    print(f"first regressing commit: {first_bad.commit}")
+    if first_bad.comparison is not None:
+        print(f"  {first_bad.comparison}")
@@ -1,3 +1,13 @@
+from .store import *
 from .influx import *
 from .bench import *
 from .utils import *
+from .scheduler import *
+from .stats import *
+from .regression import *
+from .cache import *
+from .bisect import *
+from .registry import *
+from .sweep import *
+from .report import *
+from .importer import *
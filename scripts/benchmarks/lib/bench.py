@@ -1,31 +1,67 @@
-import re
 from abc import ABC
 
-import parse
 from pathlib import Path
 import io
 import os
+import json
+import tempfile
+import time
 from enum import Enum
 import logging
-from lib.utils import isclose, assert_cmd
+from lib.utils import assert_cmd, stream_cmd, ResourceUsage, NoiseReport
+from lib.cache import sha256_file
 from lib.influx import *
+from lib.store import open_store
+from lib.regression import RegressionDetector, Verdict, Method
+from lib.stats import median, percentile, stdev, coefficient_of_variation
+from lib.parsing import JaneStreet, Table, ZKAPP_LIMITS, SNARK_PROFILER, HEAP_USAGE, GC_STATS
 
 import csv
 import abc
 
 logger = logging.getLogger(__name__)
 
+CSV_BUFFER_SIZE = 1024 * 1024
+
+
+def lines_of(content):
+    """
+     Allows parsers to accept both entire output and stream of lines
+    """
+    return io.StringIO(content) if isinstance(content, str) else content
+
+
 class Benchmark(abc.ABC):
     """
         Abstract class which aggregate all necessary operations
         (run,parse) which then are implemented by children.
         Moreover, for all general and common operations like upload it has concrete implementation
 
+        When run alongside other benchmarks (see Scheduler) benchmark gets `cpus` cores for itself.
+        Isolated benchmarks are noisy or sensitive enough that they need to run alone
     """
 
+    cpus = 1
+    isolated = False
+    # benchmark reports results on stderr
+    merge_stderr = False
+
     def __init__(self, kind):
         self.kind = kind
-        self.influx_client = Influx()
+        # Store used by compare and upload (influx db unless BENCHMARK_STORE says otherwise)
+        self.store = open_store()
+        # optional ResultCache
+        self.cache = None
+        # record hardware counters with perf stat
+        self.perf = False
+        # ResourceUsage of last run and of all runs collected by sample
+        self.usage = None
+        self.usages = []
+        # optional RunEnvironment used to calibrate machine around each run and NoiseReports of runs
+        self.environment = None
+        self.noise = []
+        # number of runs since last sample/run_and_parse served from result cache instead of running benchmark
+        self.cache_hits = 0
 
     def headers_to_influx(self, headers):
         """
@@ -62,6 +98,15 @@ class Benchmark(abc.ABC):
         """
         return list(map(lambda x: x.name, headers))
 
+    def header_names(self):
+        """
+         Names of csv columns. Field names include unit
+        """
+        return [
+            str(header) if isinstance(header, FieldColumn) else header.name
+            for header in self.headers()
+        ]
+
     @abc.abstractmethod
     def headers(self):
         """
@@ -78,73 +123,374 @@ class Benchmark(abc.ABC):
         pass
 
     @abc.abstractmethod
-    def run(self, path):
+    def command(self, path):
         """
-         Runs benchmark
+         Returns command (list of args) and env vars used to run benchmark
         """
         pass
 
+    def cache_inputs(self, path=None):
+        """
+         Inputs (besides binary itself) which determine benchmark output. Used as part of result cache key
+        """
+        cmd, _ = self.command(path)
+        return {"args": cmd[1:]}
+
+    def cache_key(self, path=None, sample=0):
+        if self.cache is None:
+            return None
+        cmd, _ = self.command(path)
+        return self.cache.key(cmd[0], self.kind, self.cache_inputs(path),
+                              sample)
+
+    def run(self, path=None, sample=0):
+        """
+         Runs benchmark and returns its entire output.
+         If result cache is enabled and has output for the same binary and inputs, benchmark is not run at all
+        """
+        key = self.cache_key(path, sample)
+        if self.cache is not None and self.cache.contains(key):
+            self.usage = self.cached_usage(key)
+            self.cache_hits += 1
+            return self.cache.get(key)
+
+        self.usage = ResourceUsage()
+        before = self.environment.calibrate() if self.environment is not None else None
+        output = assert_cmd(*self.command(path), usage=self.usage, perf=self.perf,
+                            merge_stderr=self.merge_stderr)
+        if self.environment is not None:
+            self.noise.append(self.environment.report(before, self.environment.calibrate()))
+        if key is not None:
+            self.cache.put(key, output, self.usage.to_dict())
+        return output
+
+    def stream(self, path=None):
+        """
+         Runs benchmark and yields its output line by line as it arrives (or from result cache)
+        """
+        key = self.cache_key(path)
+        if self.cache is not None and self.cache.contains(key):
+            self.usage = self.cached_usage(key)
+            self.cache_hits += 1
+            return self.cache.lines(key)
+
+        usage = self.usage = ResourceUsage()
+        lines = stream_cmd(*self.command(path), usage=usage, perf=self.perf,
+                           merge_stderr=self.merge_stderr)
+        if self.environment is not None:
+            lines = self.calibrated(lines)
+        if key is not None:
+            return self.cache.tee(key, lines, usage.to_dict)
+        return lines
+
+    def calibrated(self, lines):
+        # stream_cmd starts process on first line requested, so calibration runs right before and after it
+        before = self.environment.calibrate()
+        yield from lines
+        self.noise.append(self.environment.report(before, self.environment.calibrate()))
+
+    def annotate_noise(self, files):
+        """
+         Stores noise reports of runs which produced files in sidecar <csv>.env.json (see NoiseReport)
+        """
+        if not self.noise:
+            return
+        for file in files:
+            NoiseReport.save(self.noise, file)
+
+    def trusted(self, files):
+        """
+         True if all runs which produced files were calibrated as trusted (or not calibrated at all)
+        """
+        return all(NoiseReport.trusted_file(file) for file in files)
+
+    def cached_usage(self, key):
+        meta = self.cache.get_meta(key)
+        return None if meta is None else ResourceUsage.from_dict(meta)
+
+    def annotate_usage(self, files, usage):
+        """
+         Appends resource usage of benchmark process (peak rss, cpu time, context switches, page faults, perf counters)
+         as additional field columns to every row of produced csv files
+        """
+        if usage is None or not usage.values:
+            return
+        names = list(usage.values)
+        for file in files:
+            tmp = f"{file}.tmp"
+            with open(file, newline='') as src, open(tmp, 'w', buffering=CSV_BUFFER_SIZE) as dst:
+                first = src.readline()
+                annotated = first.startswith("#datatype")
+                if annotated:
+                    dst.write(first.rstrip("\r\n") + ",double" * len(names) + "\n")
+                else:
+                    src.seek(0)
+                reader = csv.reader(src)
+                writer = csv.writer(dst)
+                header = next(reader, None)
+                if header is None:
+                    continue
+                pos = len(header)
+                writer.writerow(header + [
+                    str(FieldColumn(name, pos + i, usage.units[name]))
+                    for i, name in enumerate(names)
+                ])
+                values = [usage.values[name] for name in names]
+                for row in reader:
+                    writer.writerow(row + values)
+            os.replace(tmp, file)
+
+    def usage_fields(self, header):
+        """
+         Field columns for resource usage found in csv header (see annotate_usage)
+        """
+        regular = set(header[field.pos] for field in self.fields())
+        known = len(self.headers())
+        return [
+            FieldColumn(name, pos) for pos, name in enumerate(header)
+            if pos >= known and name not in regular and self.is_usage_column(name)
+        ]
+
+    @staticmethod
+    def is_usage_column(name):
+        return any(
+            name.startswith(prefix) for prefix in [
+                "peak rss", "user cpu", "sys cpu", "voluntary context switches",
+                "involuntary context switches", "minor page faults",
+                "major page faults", "perf "
+            ])
+
     @abc.abstractmethod
     def parse(self, content, output_filename, influxdb, branch):
         """
-         Parses benchmark output to csv
+         Parses benchmark output to csv. Content can be either entire output or
+         iterable of lines (like one returned by stream), in which case rows are written as they arrive
         """
         pass
 
-    def compare(self, result_file, yellow_threshold, red_threshold):
+    def open_csv(self, filename, influxdb):
+        """
+         Opens buffered csv output and writes influx annotation if requested.
+         Returns file and csv writer
         """
-         Compares actual measurements against thresholds (yellow,red)
+        csvfile = open(filename, 'w', buffering=CSV_BUFFER_SIZE)
+        if influxdb:
+            csvfile.write(self.headers_to_influx(self.headers()) + "\n")
+        return csvfile, csv.writer(csvfile)
+
+    def compare(self,
+                result_file,
+                yellow_threshold,
+                red_threshold,
+                history_size=20,
+                method=Method.bootstrap,
+                confidence=0.95):
+        """
+         Compares actual measurements against last `history_size` historical samples stored in influx db.
+         History of all measurements is fetched with single query per branch and comparison runs in memory
 
          Constraints on result file:
          - comma as delimiter
          - implements influx csv format:
            https://docs.influxdata.com/influxdb/cloud/reference/syntax/annotated-csv/extended/
 
-         It gets moving average from influx db and adds grace values (yellow,red) to handle measurements skew.
-
+         Each field is checked with RegressionDetector, which takes measurement noise into account
+         and reports effect size. Yellow and red thresholds define minimal relative change (in worse direction)
+         which results in warning or build failure.
+         If result file was produced from multiple samples, whole distribution of current values is used.
+         Resource usage columns (see annotate_usage) are compared and reported, but never fail the build
         """
+        detector = RegressionDetector(yellow_threshold, red_threshold, method,
+                                      confidence)
+        regressions = []
+
         with open(result_file, newline='') as csvfile:
             reader = csv.reader(csvfile, delimiter=',')
-            for i in range(2):
-                next(reader)
-            for row in reader:
-                for field in self.fields():
-                    value = float(row[field.pos])
-                    name = row[self.name_header().pos]
-                    branch = row[self.branch_header().pos]
-                    result = self.influx_client.query_moving_average(
-                        name, branch, str(field), self.branch_header())
-
-                    if not any(result):
-                        logger.warning(
-                            f"Skipping comparison for {name} as there are no historical data available yet"
-                        )
-                    else:
-                        average = float(result[-1].records[-1]["_value"])
-
-                        current_red_threshold = average * red_threshold
-                        current_yellow_threshold = average * yellow_threshold
-
-                        logger.debug(
-                            f"calculated thresholds: [red={current_red_threshold},yellow={current_yellow_threshold}]"
-                        )
-
-                        if isclose(value + red_threshold, average):
-                            logger.error(
-                                f"{name} measurement exceeds time greatly ({value + current_red_threshold} against {average}). failing the build"
-                            )
-                            exit(1)
-                        elif isclose(value + yellow_threshold, average):
-                            logger.warning(
-                                f"WARNING: {name} measurement exceeds expected time ({value + current_yellow_threshold} against {average})"
-                            )
-                        else:
-                            logger.info(
-                                f"comparison succesful for {name}. {value} is less than threshold [yellow={average + current_yellow_threshold},red={average + current_red_threshold}]"
-                            )
+            next(reader)
+            header = next(reader)
+            rows = list(reader)
+
+        usage_fields = self.usage_fields(header)
+        fields = self.fields() + usage_fields
+
+        branches = set(row[self.branch_header().pos] for row in rows)
+        snapshots = {
+            branch: self.store.query_history_snapshot(
+                branch, fields, self.branch_header(), history_size)
+            for branch in branches
+        }
+
+        distributions = {}
+        if Path(f"{result_file}.samples.json").is_file():
+            with open(f"{result_file}.samples.json") as samples_file:
+                distributions = json.load(samples_file)
+
+        for row in rows:
+            name = row[self.name_header().pos]
+            snapshot = snapshots[row[self.branch_header().pos]]
+            for field in fields:
+                current = distributions.get(name, {}).get(
+                    str(field), [float(row[field.pos])])
+                history = snapshot.get((name, str(field)), [])
+
+                result = detector.compare(name, field, current, history)
+
+                if result.verdict == Verdict.no_data:
+                    logger.warning(f"Skipping comparison for {result}")
+                elif field in usage_fields and result.verdict in [Verdict.regression, Verdict.warning]:
+                    # resource usage is too noisy to fail the build, it is only reported
+                    logger.warning(f"RESOURCE USAGE: {result}")
+                elif result.verdict == Verdict.regression:
+                    logger.error(str(result))
+                    regressions.append(result)
+                elif result.verdict == Verdict.warning:
+                    logger.warning(f"WARNING: {result}")
+                else:
+                    logger.info(str(result))
+
+        if any(regressions):
+            logger.error(
+                f"{len(regressions)} measurements regressed greatly. failing the build"
+            )
+            exit(1)
+
+    def aggregate_headers(self):
+        """
+         Additional field columns produced when benchmark was sampled more than once.
+         They are placed after all regular headers
+        """
+        pos = len(self.headers())
+        headers = []
+        for field in self.fields():
+            for stat in ["p90", "stddev", "cv"]:
+                unit = "" if stat == "cv" else field.unit
+                headers.append(FieldColumn(f"{field.name} {stat}", pos, unit))
+                pos += 1
+        return headers
+
+    def sample(self, path=None, repetitions=1, warmup=0, min_time=0):
+        """
+         Runs benchmark `warmup` times discarding output and then collects samples until
+         there are at least `repetitions` of them and at least `min_time` seconds passed
+        """
+        self.usages = []
+        self.noise = []
+        self.cache_hits = 0
+        cached = self.cache is not None and all(
+            self.cache.contains(self.cache_key(path, i))
+            for i in range(repetitions))
+
+        if not cached:
+            for i in range(warmup):
+                logger.info(f"warmup run {i + 1}/{warmup}")
+                assert_cmd(*self.command(path))
+
+        samples = []
+        start = time.time()
+        while len(samples) < repetitions or time.time() - start < min_time:
+            logger.info(f"sample run {len(samples) + 1}")
+            samples.append(self.run(path=path, sample=len(samples)))
+            self.usages.append(self.usage)
+        return samples
+
+    def run_and_parse(self,
+                      path,
+                      output_filename,
+                      influxdb,
+                      branch,
+                      repetitions=1,
+                      warmup=0,
+                      min_time=0):
+        """
+         Runs benchmark and parses its output to csv. Single run is streamed
+         directly from benchmark process to parser.
+         Resource usage of benchmark process is appended to every row (see annotate_usage)
+        """
+        self.noise = []
+        self.cache_hits = 0
+        if repetitions <= 1 and warmup == 0 and min_time == 0:
+            files = self.parse(self.stream(path), output_filename, influxdb,
+                               branch)
+            self.annotate_usage(files, self.usage)
+            self.annotate_noise(files)
+            return files
+        samples = self.sample(path, repetitions, warmup, min_time)
+        files = self.parse_samples(samples, output_filename, influxdb, branch)
+        self.annotate_usage(files, ResourceUsage.median(self.usages))
+        self.annotate_noise(files)
+        return files
+
+    def parse_samples(self, samples, output_filename, influxdb, branch):
+        """
+         Parses multiple outputs of the same benchmark into single csv (or set of csv files).
+         Regular field columns hold median of all samples and aggregate columns (see aggregate_headers)
+         hold p90, standard deviation and coefficient of variation. Values of each sample
+         are kept in sidecar <csv>.samples.json file which is used by compare.
+        """
+        if len(samples) == 1:
+            return self.parse(samples[0], output_filename, influxdb, branch)
+
+        output_path = Path(output_filename)
+        # relative file name -> measurement -> list of rows (one per sample)
+        grouped = {}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for i, sample in enumerate(samples):
+                sample_dir = Path(tmp) / str(i)
+                sample_dir.mkdir()
+                files = self.parse(sample, str(sample_dir / output_path.name),
+                                   False, branch)
+                for file in files:
+                    with open(file, newline='') as csvfile:
+                        reader = csv.reader(csvfile)
+                        header = next(reader)
+                        table = grouped.setdefault(Path(file).name, {
+                            "header": header,
+                            "rows": {}
+                        })
+                        for row in reader:
+                            table["rows"].setdefault(
+                                row[self.name_header().pos], []).append(row)
+
+        files = []
+        for name, table in grouped.items():
+            file = str(output_path.with_name(name))
+            distributions = {}
+
+            with open(file, 'w') as csvfile:
+                if influxdb:
+                    csvfile.write(
+                        self.headers_to_influx(self.headers() +
+                                               self.aggregate_headers()) + "\n")
+                csvwriter = csv.writer(csvfile)
+                csvwriter.writerow(
+                    table["header"] +
+                    [str(header) for header in self.aggregate_headers()])
+
+                for measurement, rows in table["rows"].items():
+                    row = list(rows[0])
+                    aggregates = []
+                    for field in self.fields():
+                        values = [float(r[field.pos]) for r in rows]
+                        distributions.setdefault(measurement,
+                                                 {})[str(field)] = values
+                        row[field.pos] = median(values)
+                        aggregates.extend([
+                            percentile(values, 90),
+                            stdev(values),
+                            coefficient_of_variation(values)
+                        ])
+                    csvwriter.writerow(row + aggregates)
+
+            with open(f"{file}.samples.json", 'w') as samples_file:
+                json.dump(distributions, samples_file)
+
+            files.append(file)
+
+        return files
 
     def upload(self, file):
-        self.influx_client.upload_csv(file)
+        return self.store.upload_csv(file)
 
 
 class BenchmarkType(Enum):
@@ -154,6 +500,7 @@ class BenchmarkType(Enum):
     heap_usage = 'heap-usage'
     zkapp = 'zkapp'
     ledger_export = 'ledger-export'
+    allocation = 'allocation'
 
     def __str__(self):
         return self.value
@@ -198,115 +545,48 @@ class JaneStreetBenchmark(Benchmark, ABC):
     def branch_header(self):
         return self.branch
 
-    def export_to_csv(self, lines, filename, influxdb, branch):
+    def export_table(self, table, filename, influxdb, branch):
         """
-         Exports Native Ocaml benchmarks to influxdb annotated csv
-         JaneStreet benchmarks has a common tabular layout. Similar to:
-
-         | No.| Proof updates| Non-proof pairs| Non-proof singles| Mempool verification time (sec)| Transaction proving time (sec)|Permutation|
-         |--|--|--|--|--|--|--|
-         | 1| 0| 1| 1| 0.002070| 12.125372| SSS|
-         | 2| 1| 0| 2| 0.102019| 0.263364| SPS|
-         | 3| 1| 1| 0| 0.110309| 0.427459| SSP|
-         | 4| 2| 0| 1| 0.129152| 0.277442| SPP|
-         | 5| 0| 2| 0| 0.002546| 0.508766| SSSS|
-         | 6| 1| 1| 1| 0.135265| 0.384839| SPSS|
-         | 7| 2| 0| 2| 0.172069| 0.346551| SPPS|
-        """
-        with open(filename, 'w') as csvfile:
-
-            csvwriter = csv.writer(csvfile)
-
-            if influxdb:
-                csvfile.write(self.headers_to_influx(self.headers()) + "\n")
-
-            for line in lines:
-                if line.startswith('│'):
-
-                    rows = list(map(lambda x: x.strip(), line.split('│')))
-                    rows = list(filter(lambda x: x, rows))
-
-                    if rows[0].startswith(MinaBaseBenchmark.name.name):
-                        rows[
-                            1] += " " + MinaBaseBenchmark.time_per_runs.format_unit(
-                            )
-                        rows[
-                            2] += " " + MinaBaseBenchmark.cycles_per_runs.format_unit(
-                            )
-                        rows[
-                            3] += " " + MinaBaseBenchmark.minor_words_per_runs.format_unit(
-                            )
-                        rows[
-                            4] += " " + MinaBaseBenchmark.major_words_per_runs.format_unit(
-                            )
-                        rows[
-                            5] += " " + MinaBaseBenchmark.promotions_per_runs.format_unit(
-                            )
-                        rows.append("gitbranch")
-
-                    else:
-                        # remove [.*] from name
-                        rows[0] = re.sub('\[.*?\]', '', rows[0]).strip()
-                        time = rows[1]
-                        # remove units from values
-                        if not time.endswith("us"):
-                            if time.endswith("ns"):
-                                time = float(time[:-2]) * 1_000
-                                rows[1] = time
-                            else:
-                                raise Exception(
-                                    "Time can be expressed only in us or ns")
-                        else:
-                            # us
-                            rows[1] = time[:-2]
-                            # kc
-                            rows[2] = rows[2][:-2]
-                            # w
-                            rows[3] = rows[3][:-1]
-                            # w
-                            rows[4] = rows[4][:-1]
-                            # w
-                            rows[5] = rows[5][:-1]
-                            rows.append(branch)
-
-                    csvwriter.writerow(rows[:])
+         Exports Native Ocaml benchmarks table (see JaneStreet in lib/parsing.py) to influxdb annotated csv
+        """
+        csvfile, csvwriter = self.open_csv(filename, influxdb)
+        with csvfile:
+            csvwriter.writerow(self.header_names())
+            csvwriter.writerows(
+                row + (branch, ) for row in table.rows(
+                    "name", "time", "cycles", "minor_words", "major_words",
+                    "promoted_words"))
 
     def parse(self, content, output_filename, influxdb, branch):
         """
          Parses output of standard jane street benchmark to csv. Format is well known and similar to below:
-         | No.| Proof updates| Non-proof pairs| Non-proof singles| Mempool verification time (sec)| Transaction proving time (sec)|Permutation|
-         |--|--|--|--|--|--|--|
-         | 1| 0| 1| 1| 0.002070| 12.125372| SSS|
+         ┌───────────────────────────┬──────────┬───────────┬─────────┬──────────┬──────────┐
+         │ Name                      │ Time/Run │ Cycls/Run │ mWd/Run │ mjWd/Run │ Prom/Run │
+         ├───────────────────────────┼──────────┼───────────┼─────────┼──────────┼──────────┤
+         │ [vrf_lib_tests.ml] vrf    │ 12.52us  │ 25.01kc   │ 12.00w  │ 0.01w    │ 0.01w    │
          ....
 
+         Times are converted to microseconds, cycles to kilocycles and words to plain words (core_bench scales
+         units with ns/us/ms/s and k/M/G prefixes). Table row of unknown format fails the parse. Output of each library (marked by 'Running inline tests in library' line)
+         goes to separate <library>_<output_filename> file.
+
          It can produce standard csv of annotated influx db csv
         """
-        buf = io.StringIO(content)
-        lines = buf.readlines()
-
-        starts = []
-        ends = []
+        output_path = Path(output_filename)
         files = []
-        for i, e in enumerate(lines):
-            if "Running" in e:
-                starts.append(i)
-
-        if not any(starts):
-            self.export_to_csv(lines, output_filename, influxdb, branch)
-        else:
-            for start in starts[1:]:
-                ends.append(start)
-
-            ends.append(len(lines) - 1)
-
-            for start, end in zip(starts, ends):
-                name = parse.parse('Running inline tests in library "{}"',
-                                   lines[start].strip())[0]
-                file = f'{name}_{output_filename}'
-                logger.info(f"exporting {file}..")
-                self.export_to_csv(lines[start:end], f'{file}', influxdb,
-                                   branch)
-                files.append(file)
+
+        for library, table in JaneStreet.sections(content):
+            file = output_filename if library is None else str(
+                output_path.with_name(f'{library}_{output_path.name}'))
+            logger.info(f"exporting {file}..")
+            self.export_table(JaneStreet.normalize(table), file, influxdb,
+                              branch)
+            files.append(file)
+
+        if not files:
+            self.export_table(Table(JaneStreet.row), output_filename, influxdb,
+                              branch)
+            files.append(output_filename)
 
         return files
 
@@ -319,7 +599,7 @@ class MinaBaseBenchmark(JaneStreetBenchmark):
     def __init__(self):
         JaneStreetBenchmark.__init__(self, BenchmarkType.mina_base)
 
-    def run(self, path=None):
+    def command(self, path=None):
         path = self.default_path() if path is None else path
         cmd = [
             path, "time", "cycles", "alloc", "-clear-columns", "-all-values",
@@ -330,7 +610,7 @@ class MinaBaseBenchmark(JaneStreetBenchmark):
         envs["BENCHMARKS_RUNNER"] = "TRUE"
         envs["X_LIBRARY_INLINING"] = "true"
 
-        return assert_cmd(cmd, envs)
+        return cmd, envs
 
     def default_path(self):
         return "mina-benchmarks"
@@ -346,7 +626,7 @@ class LedgerExportBenchmark(JaneStreetBenchmark):
         JaneStreetBenchmark.__init__(self, BenchmarkType.ledger_export)
         self.genesis_ledger_path = genesis_ledger_path
 
-    def run(self, path=None):
+    def command(self, path=None):
         path = self.default_path() if path is None else path
         cmd = [
             path, "time", "cycles", "alloc", "-clear-columns", "-all-values",
@@ -355,7 +635,12 @@ class LedgerExportBenchmark(JaneStreetBenchmark):
         envs = os.environ.copy()
         envs["RUNTIME_CONFIG"] = self.genesis_ledger_path
 
-        return assert_cmd(cmd, envs)
+        return cmd, envs
+
+    def cache_inputs(self, path=None):
+        inputs = JaneStreetBenchmark.cache_inputs(self, path)
+        inputs["genesis_ledger"] = sha256_file(self.genesis_ledger_path)
+        return inputs
 
     def default_path(self):
         return "mina-ledger-export-benchmark"
@@ -414,50 +699,29 @@ class ZkappLimitsBenchmark(Benchmark):
         ]
 
     def parse(self, content, output_filename, influxdb, branch):
-
-        buf = io.StringIO(content)
-        lines = buf.readlines()
-
-        stats = [list(map(lambda x: x.name, self.headers()))]
-
-        for line in lines:
-            if line == '':
-                continue
-
-            syntax = "Proofs updates=(?P<proofs_updates>\d+)  Signed/None updates=(?P<signed_updates>\d+)  Pairs of Signed/None updates=(?P<pairs_of_signed_updates>\d+): Total account updates: (?P<total_account_updates>\d+) Cost: (?P<cost>[0-9]*[.]?[0-9]+)"
-
-            match = re.match(syntax, line)
-
-            if match:
-                proofs_updates = int(match.group("proofs_updates"))
-                signed_updates = int(match.group("signed_updates"))
-                pairs_of_signed_updates = int(
-                    match.group("pairs_of_signed_updates"))
-                total_account_updates = int(
-                    match.group("total_account_updates"))
-                cost = float(match.group(ZkappLimitsBenchmark.cost.name))
-                name = f"P{proofs_updates}S{signed_updates}PS{pairs_of_signed_updates}TA{total_account_updates}"
-                tag = "zkapp"
-                stats.append((name, proofs_updates, signed_updates,
-                              pairs_of_signed_updates, total_account_updates,
-                              cost, tag, branch))
-
-            with open(output_filename, 'w') as csvfile:
-                if influxdb:
-                    csvfile.write(
-                        self.headers_to_influx(self.headers()) + "\n")
-                csvwriter = csv.writer(csvfile)
-                csvwriter.writerows(stats)
+        table = ZKAPP_LIMITS.table(content)
+        csvfile, csvwriter = self.open_csv(output_filename, influxdb)
+        with csvfile:
+            csvwriter.writerow(self.headers_to_name(self.headers()))
+            for proofs, signed, pairs, total, cost in table.rows(
+                    "proofs_updates", "signed_updates",
+                    "pairs_of_signed_updates", "total_account_updates",
+                    "cost"):
+                name = f"P{proofs}S{signed}PS{pairs}TA{total}"
+                csvwriter.writerow((name, proofs, signed, pairs, total, cost,
+                                    "zkapp", branch))
 
         return [output_filename]
 
-    def run(self, path=None):
+    def command(self, path=None):
         path = self.default_path() if path is None else path
-        return assert_cmd([path])
+        return [path], None
 
 
 class SnarkBenchmark(Benchmark):
 
+    isolated = True
+
     name = MeasurementColumn("name", 0)
     proofs_updates = FieldColumn("proofs updates", 1, "")
     nonproofs_pairs = FieldColumn("non-proof pairs", 2, "")
@@ -494,54 +758,34 @@ class SnarkBenchmark(Benchmark):
         ]
 
     def parse(self, content, output_filename, influxdb, branch):
-        buf = io.StringIO(content)
-        lines = buf.readlines()
-        rows = []
-        category = "snark"
-        rows.append(list(map(lambda x: x.name, self.headers())))
-
-        for line in lines:
-            if line.startswith("|"):
-                if "--" in line:
-                    continue
-                elif line.startswith("| No.|"):
-                    continue
-                else:
-                    cols = line.split("|")
-                    cols = list(map(lambda x: x.strip(), cols))
-                    cols = list(filter(lambda x: x, cols))
-
-                    #| No.| Proof updates| Non-proof pairs| Non-proof singles| Mempool verification time (sec)| Transaction proving time (sec)|Permutation|
-                    proof_update = cols[1]
-                    non_proof_pairs = cols[2]
-                    non_proof_singles = cols[3]
-                    verification_time = cols[4]
-                    proving_time = cols[5]
-                    name = cols[6]
-
-                    rows.append((name,proof_update,non_proof_pairs,non_proof_singles,verification_time,proving_time,
-                                   category,branch))
-
-        with open(output_filename, 'w') as csvfile:
-            if influxdb:
-                csvfile.write(self.headers_to_influx(self.headers()) + "\n")
-
-            csvwriter = csv.writer(csvfile)
-            csvwriter.writerows(rows)
+        """
+         Parses table of transaction snark profiler:
+         | No.| Proof updates| Non-proof pairs| Non-proof singles| Mempool verification time (sec)| Transaction proving time (sec)|Permutation|
+         |--|--|--|--|--|--|--|
+         | 1| 0| 1| 1| 0.002070| 12.125372| SSS|
+        """
+        table = SNARK_PROFILER.table(content)
+        csvfile, csvwriter = self.open_csv(output_filename, influxdb)
+        with csvfile:
+            csvwriter.writerow(self.headers_to_name(self.headers()))
+            csvwriter.writerows(
+                row + ("snark", branch) for row in table.rows(
+                    "permutation", "proofs_updates", "nonproofs_pairs",
+                    "nonproofs_singles", "verification_time", "proving_time"))
 
-        return [ output_filename ]
+        return [output_filename]
 
     def default_path(self):
         return "mina"
 
-    def run(self, path=None):
+    def command(self, path=None):
         path = self.default_path() if path is None else path
-        return assert_cmd([
+        return [
             path, "transaction-snark-profiler", "--zkapps", "--k",
             str(self.k), "--max-num-updates",
             str(self.max_num_updates), "--min-num-updates",
             str(self.min_num_updates)
-        ])
+        ], None
 
 
 class HeapUsageBenchmark(Benchmark):
@@ -586,30 +830,117 @@ class HeapUsageBenchmark(Benchmark):
         ]
 
     def parse(self, content, output_filename, influxdb, branch):
-        buf = io.StringIO(content)
-        lines = buf.readlines()
-        rows = []
-        rows.append(self.headers_to_name(self.headers()))
-
-        for i, line in enumerate(lines):
-            if line.startswith("Data of type"):
-                sanitized_line = line.replace(" ", "").strip()
-                row = list(
-                    parse.parse("Dataoftype{}uses{}heapwords={}bytes",
-                          sanitized_line))
-                row.extend(("heap_usage", branch))
-                rows.append(row)
-
-        with open(output_filename, 'w') as csvfile:
-            if influxdb:
-                csvfile.write(self.headers_to_influx(self.headers()) + "\n")
-            csvwriter = csv.writer(csvfile)
-            csvwriter.writerows(rows)
+        table = HEAP_USAGE.table(content)
+        csvfile, csvwriter = self.open_csv(output_filename, influxdb)
+        with csvfile:
+            csvwriter.writerow(self.headers_to_name(self.headers()))
+            csvwriter.writerows(
+                row + ("heap_usage", branch)
+                for row in table.rows("name", "heap_words", "bytes"))
+
         return [output_filename]
 
     def default_path(self):
         return "mina-heap-usage"
 
-    def run(self, path=None):
+    def command(self, path=None):
         path = self.default_path() if path is None else path
-        return assert_cmd([path])
+        return [path], None
+
+
+class AllocationBenchmark(Benchmark):
+    """
+     Runs any OCaml executable with GC statistics enabled (OCAMLRUNPARAM=v=0x400), which makes OCaml runtime
+     print at exit (on stderr) summary similar to:
+
+        allocated_words: 3503329
+        minor_words: 3402151
+        promoted_words: 239212
+        major_words: 340390
+        minor_collections: 13
+        major_collections: 2
+        heap_words: 507904
+        heap_chunks: 1
+        top_heap_words: 507904
+        compactions: 0
+        forced_major_collections: 0
+
+     Measurement is named after target. Promotion rate (promoted words / minor words) is derived from above.
+     Benchmark reports GC statistics of whole process only, it doesn't attribute allocations to allocation sites
+    """
+
+    merge_stderr = True
+
+    name = MeasurementColumn("Name", 0)
+    minor_collections = FieldColumn("minor collections", 1, "")
+    major_collections = FieldColumn("major collections", 2, "")
+    compactions = FieldColumn("compactions", 3, "")
+    minor_words = FieldColumn("minor words", 4, "w")
+    promoted_words = FieldColumn("promoted words", 5, "w")
+    major_words = FieldColumn("major words", 6, "w")
+    promotion_rate = FieldColumn("promotion rate", 7, "")
+    top_heap_words = FieldColumn("top heap words", 8, "w")
+    category = TagColumn("category", 9)
+    branch = TagColumn("gitbranch", 10)
+
+    def __init__(self, target_name, target_args=None):
+        Benchmark.__init__(self, BenchmarkType.allocation)
+        self.target_name = target_name
+        self.target_args = target_args or []
+
+    def default_path(self):
+        return "mina"
+
+    def name_header(self):
+        return self.name
+
+    def branch_header(self):
+        return self.branch
+
+    def headers(self):
+        return [
+            AllocationBenchmark.name, AllocationBenchmark.minor_collections,
+            AllocationBenchmark.major_collections, AllocationBenchmark.compactions,
+            AllocationBenchmark.minor_words, AllocationBenchmark.promoted_words,
+            AllocationBenchmark.major_words, AllocationBenchmark.promotion_rate,
+            AllocationBenchmark.top_heap_words, AllocationBenchmark.category,
+            AllocationBenchmark.branch
+        ]
+
+    def fields(self):
+        return [
+            AllocationBenchmark.minor_collections,
+            AllocationBenchmark.major_collections,
+            AllocationBenchmark.compactions, AllocationBenchmark.minor_words,
+            AllocationBenchmark.promoted_words, AllocationBenchmark.major_words,
+            AllocationBenchmark.promotion_rate,
+            AllocationBenchmark.top_heap_words
+        ]
+
+    def command(self, path=None):
+        path = self.default_path() if path is None else path
+        envs = os.environ.copy()
+        params = [envs["OCAMLRUNPARAM"]] if envs.get("OCAMLRUNPARAM") else []
+        envs["OCAMLRUNPARAM"] = ",".join(params + ["v=0x400"])
+        return [path] + self.target_args, envs
+
+    def parse(self, content, output_filename, influxdb, branch):
+        stats = dict(GC_STATS.table(content).rows("stat", "value"))
+
+        csvfile, csvwriter = self.open_csv(output_filename, influxdb)
+        with csvfile:
+            csvwriter.writerow(self.headers_to_name(self.headers()))
+            if "minor_words" not in stats:
+                logger.warning(
+                    "no gc statistics found in output. Is target an OCaml executable?")
+            else:
+                minor_words = stats["minor_words"]
+                promotion_rate = stats["promoted_words"] / minor_words if minor_words else 0.0
+                csvwriter.writerow(
+                    (self.target_name, stats["minor_collections"],
+                     stats["major_collections"], stats.get("compactions", 0),
+                     minor_words, stats["promoted_words"],
+                     stats["major_words"], promotion_rate,
+                     stats.get("top_heap_words", 0), "allocation", branch))
+
+        return [output_filename]
@@ -0,0 +1,199 @@
+import csv
+import logging
+import subprocess
+import tempfile
+from pathlib import Path
+
+from lib.regression import RegressionDetector, Verdict, Method
+
+logger = logging.getLogger(__name__)
+
+
+def git(repo, *args, returncodes=(0, )):
+    """
+        Runs git command in repo and returns its stdout. Raises RuntimeError when exit code is not one of returncodes
+    """
+    result = subprocess.run(["git"] + list(args),
+                            cwd=repo,
+                            capture_output=True,
+                            text=True)
+    if result.returncode not in returncodes:
+        raise RuntimeError(
+            f"git {' '.join(args)} failed: {result.stderr.strip()}")
+    return result.stdout
+
+
+class BisectStep:
+    """
+        Single tested commit with its samples and comparison against good commit.
+        Comparison is None when commit could not be built
+    """
+
+    def __init__(self, commit, samples, comparison):
+        self.commit = commit
+        self.samples = samples
+        self.comparison = comparison
+
+    def is_bad(self):
+        return self.comparison is not None and self.comparison.verdict == Verdict.regression
+
+    def __str__(self):
+        if self.comparison is None:
+            return f"{self.commit[:12]}: skipped (build failed)"
+        return f"{self.commit[:12]}: {self.comparison}"
+
+
+class Bisector:
+    """
+        Finds first commit which regressed single measurement of benchmark by driving `git bisect`.
+
+        Good commit is measured first and its samples are the baseline. Each bisect step builds checked out
+        commit with user supplied build command, samples benchmark and compares samples against baseline with
+        RegressionDetector. Commit is bad when comparison gives regression (significant change exceeding red threshold).
+        Commits which fail to build are skipped. When only skipped commits are left, first bad commit can't be
+        narrowed down and commits it could be are kept in `candidates`. Benchmark result cache (if set on benchmark)
+        makes revisiting commit with identical binary free
+    """
+
+    def __init__(self,
+                 bench,
+                 build_cmd,
+                 measurement,
+                 field,
+                 repo=".",
+                 path=None,
+                 repetitions=5,
+                 warmup=0,
+                 yellow_threshold=0.1,
+                 red_threshold=0.2,
+                 method=Method.bootstrap,
+                 confidence=0.95):
+        self.bench = bench
+        self.build_cmd = build_cmd
+        self.measurement = measurement
+        self.field = self.find_field(field)
+        self.repo = repo
+        self.path = path
+        self.repetitions = repetitions
+        self.warmup = warmup
+        self.detector = RegressionDetector(yellow_threshold,
+                                           red_threshold,
+                                           method,
+                                           confidence,
+                                           min_samples=min(repetitions, 5))
+        self.steps = []
+        self.candidates = []
+
+    def find_field(self, name):
+        fields = self.bench.fields()
+        if name is None:
+            return fields[0]
+        for field in fields:
+            if name in [field.name, str(field)]:
+                return field
+        raise RuntimeError(
+            f"{self.bench.kind} has no field {name}. Available: {', '.join(str(field) for field in fields)}"
+        )
+
+    def build(self):
+        logger.info(f"building: {self.build_cmd}")
+        return subprocess.run(self.build_cmd, shell=True,
+                              cwd=self.repo).returncode == 0
+
+    def measure(self):
+        """
+            Samples benchmark and returns values of measured field
+        """
+        samples = self.bench.sample(path=self.path,
+                                    repetitions=self.repetitions,
+                                    warmup=self.warmup)
+        values = []
+        with tempfile.TemporaryDirectory() as tmp:
+            for i, sample in enumerate(samples):
+                files = self.bench.parse(sample, str(Path(tmp) / f"{i}.csv"),
+                                         True, "bisect")
+                values.extend(self.values_of(files))
+        if not values:
+            raise RuntimeError(
+                f"measurement {self.measurement} not found in {self.bench.kind} output"
+            )
+        return values
+
+    def values_of(self, files):
+        for file in files:
+            with open(file, newline='') as csvfile:
+                reader = csv.reader(csvfile)
+                next(reader)
+                next(reader)
+                for row in reader:
+                    if row[self.bench.name_header().pos] == self.measurement:
+                        yield float(row[self.field.pos])
+
+    def test_commit(self, baseline):
+        commit = git(self.repo, "rev-parse", "HEAD").strip()
+        if not self.build():
+            step = BisectStep(commit, [], None)
+        else:
+            samples = self.measure()
+            step = BisectStep(
+                commit, samples,
+                self.detector.compare(self.measurement, self.field, samples,
+                                      baseline))
+        logger.info(f"bisect step {step}")
+        self.steps.append(step)
+        return step
+
+    def run(self, good, bad):
+        """
+            Bisects range good..bad. Returns BisectStep of first bad commit or None
+            if regression could not be reproduced on bad commit or commits left to test could not be built
+        """
+        original = git(self.repo, "rev-parse", "--abbrev-ref", "HEAD").strip()
+        if original == "HEAD":
+            original = git(self.repo, "rev-parse", "HEAD").strip()
+
+        try:
+            git(self.repo, "checkout", "-q", good)
+            if not self.build():
+                raise RuntimeError(f"cannot build good commit {good}")
+            baseline = self.measure()
+            logger.info(f"baseline of {self.measurement} [{self.field}] at {good}: {baseline}")
+
+            git(self.repo, "checkout", "-q", bad)
+            if not self.test_commit(baseline).is_bad():
+                logger.error(f"regression of {self.measurement} is not reproducible on {bad}")
+                return None
+        finally:
+            git(self.repo, "checkout", "-q", original)
+
+        output = git(self.repo, "bisect", "start", bad, good)
+        try:
+            while "is the first bad commit" not in output:
+                step = self.test_commit(baseline)
+                if step.comparison is None:
+                    verdict = "skip"
+                else:
+                    verdict = "bad" if step.is_bad() else "good"
+                # git exits with 2 when only skipped commits are left
+                output = git(self.repo, "bisect", verdict, returncodes=(0, 2))
+                if "only 'skip'ped commits left" in output:
+                    self.candidates = self.skipped_candidates(output)
+                    logger.error(
+                        f"first bad commit could not be narrowed down, commits left to test could not be built. "
+                        f"It could be any of: {', '.join(self.candidates)}")
+                    return None
+        finally:
+            git(self.repo, "bisect", "reset")
+
+        first_bad = output.split()[0]
+        return next((step for step in self.steps if step.commit == first_bad),
+                    BisectStep(first_bad, [], None))
+
+    @staticmethod
+    def skipped_candidates(output):
+        """
+            Commits listed by `git bisect` after "The first bad commit could be any of:"
+        """
+        lines = output.splitlines()
+        start = next((i + 1 for i, line in enumerate(lines) if "could be any of" in line), len(lines))
+        return [line.strip() for line in lines[start:] if line.strip() and "cannot bisect more" not in line]
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import logging
+import os
+import platform
+import shutil
+import tempfile
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def host_fingerprint():
+    """
+        Identifies machine on which benchmark was run. Results from different hardware are never mixed
+    """
+    cpu_model = platform.processor()
+    try:
+        with open("/proc/cpuinfo") as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith("model name"):
+                    cpu_model = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return {
+        "node": platform.node(),
+        "machine": platform.machine(),
+        "cpu": cpu_model,
+        "cpus": os.cpu_count(),
+    }
+
+
+class ResultCache:
+    """
+        Local content-addressed cache of raw benchmark outputs.
+
+        Key is computed from sha256 of benchmark binary, benchmark type, benchmark inputs
+        (see Benchmark.cache_inputs), sample number and host fingerprint.
+        Entries are evicted in least recently used order when cache exceeds max_size bytes
+    """
+
+    default_dir = Path(__file__).parent.parent / ".cache"
+    dir_env = "BENCHMARK_CACHE_DIR"
+
+    def __init__(self, directory=None, max_size=2 * 1024**3):
+        if directory is None:
+            directory = os.environ.get(ResultCache.dir_env, ResultCache.default_dir)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.binary_hashes = {}
+
+    def binary_hash(self, binary):
+        """
+            Returns sha256 of binary (resolved via PATH) or None if it cannot be found.
+            Hash is memoized by path, size and modification time
+        """
+        resolved = shutil.which(binary) or binary
+        if not os.path.isfile(resolved):
+            return None
+        stat = os.stat(resolved)
+        memo_key = (os.path.realpath(resolved), stat.st_size, stat.st_mtime)
+        if memo_key not in self.binary_hashes:
+            self.binary_hashes[memo_key] = sha256_file(resolved)
+        return self.binary_hashes[memo_key]
+
+    def key(self, binary, kind, inputs, sample=0):
+        binary_hash = self.binary_hash(binary)
+        if binary_hash is None:
+            return None
+        description = json.dumps(
+            {
+                "binary": binary_hash,
+                "kind": str(kind),
+                "inputs": inputs,
+                "sample": sample,
+                "host": host_fingerprint(),
+            },
+            sort_keys=True)
+        return hashlib.sha256(description.encode("UTF-8")).hexdigest()
+
+    def entry(self, key):
+        return self.directory / f"{key}.out"
+
+    def meta_entry(self, key):
+        return self.directory / f"{key}.json"
+
+    def get_meta(self, key):
+        """
+            Returns metadata stored alongside cached output (like resource usage) or None
+        """
+        if key is None or not self.meta_entry(key).is_file():
+            return None
+        return json.loads(self.meta_entry(key).read_text())
+
+    def contains(self, key):
+        return key is not None and self.entry(key).is_file()
+
+    def get(self, key):
+        """
+            Returns cached output or None. Hit refreshes entry position in LRU order
+        """
+        if not self.contains(key):
+            return None
+        entry = self.entry(key)
+        os.utime(entry)
+        logger.info(f"using cached benchmark output {entry}")
+        return entry.read_text()
+
+    def lines(self, key):
+        """
+            Yields cached output line by line. Use only after contains returned True
+        """
+        entry = self.entry(key)
+        os.utime(entry)
+        logger.info(f"using cached benchmark output {entry}")
+        with open(entry) as file:
+            yield from file
+
+    def put(self, key, output, meta=None):
+        for _ in self.tee(key, [output], lambda: meta):
+            pass
+
+    def tee(self, key, lines, meta=None):
+        """
+            Passes lines through while writing them to cache. Entry is committed
+            only when lines were fully consumed (so failed runs are never cached).
+            Optional meta callable is evaluated at commit and its result stored as entry metadata
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as file:
+                for line in lines:
+                    file.write(line)
+                    yield line
+            os.replace(tmp, self.entry(key))
+            data = None if meta is None else meta()
+            if data is not None:
+                self.meta_entry(key).write_text(json.dumps(data))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.evict()
+
+    def evict(self):
+        entries = sorted(self.directory.glob("*.out"),
+                         key=lambda entry: entry.stat().st_mtime)
+        total = sum(entry.stat().st_size for entry in entries)
+        while entries and total > self.max_size:
+            entry = entries.pop(0)
+            total -= entry.stat().st_size
+            logger.info(f"evicting {entry} from benchmark cache")
+            entry.unlink()
+            entry.with_suffix(".json").unlink(missing_ok=True)
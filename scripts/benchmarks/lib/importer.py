@@ -0,0 +1,190 @@
+import logging
+import os
+import re
+import subprocess
+import tarfile
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from lib.bench import BenchmarkType
+from lib.parsing import JaneStreet, ZKAPP_LIMITS, SNARK_PROFILER, HEAP_USAGE, GC_STATS
+from lib.registry import registry
+from lib.store import read_annotated_csv
+
+logger = logging.getLogger(__name__)
+
+
+class RawOutput:
+    """
+        Raw benchmark output found in archive together with its inferred metadata
+    """
+
+    def __init__(self, name, content, mtime):
+        self.name = name
+        self.content = content
+        self.mtime = mtime
+        self.kind = None
+        self.commit = None
+        self.time_ns = None
+
+
+def infer_kind(name, content):
+    """
+        Guesses benchmark type from output format. Returns None for unknown outputs
+    """
+    if JaneStreet.row.regex.search(content):
+        if "ledger" in Path(name).name and "export" in Path(name).name:
+            return str(BenchmarkType.ledger_export)
+        return str(BenchmarkType.mina_base)
+    if SNARK_PROFILER.regex.search(content):
+        return str(BenchmarkType.snark)
+    if ZKAPP_LIMITS.regex.search(content):
+        return str(BenchmarkType.zkapp)
+    if HEAP_USAGE.regex.search(content):
+        return str(BenchmarkType.heap_usage)
+    if any(stat == "minor_collections" for stat, _ in GC_STATS.table(content).rows("stat", "value")):
+        return str(BenchmarkType.allocation)
+    return None
+
+
+commit_syntax = re.compile(r"(?<![0-9a-f])([0-9a-f]{40}|[0-9a-f]{7,12})(?![0-9a-f])")
+
+
+def infer_commit(name):
+    """
+        Takes commit hash from path of output (CI artifacts are stored under commit directory or
+        have commit in file name). Full hashes are preferred over abbreviated ones
+    """
+    matches = commit_syntax.findall(name.lower())
+    matches = [match for match in matches if not match.isdigit()]
+    if not matches:
+        return None
+    return max(matches, key=len)
+
+
+def parse_output(output, branch):
+    """
+        Worker entry point. Parses raw output with benchmark parser and returns list of Points
+        stamped with commit time and tagged with branch. Commit is stored as string field
+    """
+    bench = registry.create(output.kind)
+    points = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for file in bench.parse(output.content, str(Path(tmp) / "import.csv"), True, branch):
+            for point in read_annotated_csv(file, output.time_ns):
+                if output.commit is not None:
+                    point.fields["commit"] = output.commit
+                points.append(point)
+    return points
+
+
+class Importer:
+    """
+        Backfills store with historical raw benchmark outputs from directory or tarball.
+
+        Benchmark type is inferred from output format (unless given), commit from path. Points are stamped
+        with commit time (taken from git repository when available, otherwise file modification time), so importing
+        the same output again gives the same points which are then skipped as duplicates.
+        Outputs are parsed on process pool and loaded to store in batches
+    """
+
+    def __init__(self, store, branch, kind=None, repo=None, jobs=None, batch_size=256):
+        self.store = store
+        self.branch = branch
+        self.kind = kind
+        self.repo = repo
+        self.jobs = jobs
+        self.batch_size = batch_size
+        self.commit_times = {}
+
+    def outputs(self, source):
+        """
+            Yields RawOutput for every file in directory or tarball. Modification time is truncated to seconds
+            (like in tar headers), so both give the same timestamps
+        """
+        if os.path.isfile(source) and tarfile.is_tarfile(source):
+            with tarfile.open(source) as tar:
+                for member in tar:
+                    if member.isfile():
+                        file = tar.extractfile(member)
+                        yield RawOutput(member.name, file.read().decode("UTF-8", errors="replace"), member.mtime)
+        else:
+            for path in sorted(Path(source).rglob("*")):
+                if path.is_file():
+                    yield RawOutput(str(path), path.read_text(errors="replace"), int(path.stat().st_mtime))
+
+    def commit_time(self, commit):
+        if self.repo is None or commit is None:
+            return None
+        if commit not in self.commit_times:
+            result = subprocess.run(["git", "show", "-s", "--format=%ct", commit],
+                                    cwd=self.repo, capture_output=True, text=True)
+            self.commit_times[commit] = int(result.stdout.strip()) if result.returncode == 0 else None
+        return self.commit_times[commit]
+
+    def annotate(self, output):
+        output.kind = self.kind or infer_kind(output.name, output.content)
+        output.commit = infer_commit(output.name)
+        seconds = self.commit_time(output.commit)
+        output.time_ns = int((output.mtime if seconds is None else seconds) * 1_000_000_000)
+        return output
+
+    def deduplicate(self, points):
+        """
+            Drops points already present in store (or repeated in imported batch),
+            identified by measurement and time on branch
+        """
+        if not points:
+            return points
+        times = [point.time_ns for point in points]
+        seen = self.store.query_times(self.branch, min(times), max(times))
+        unique = []
+        for point in points:
+            key = (point.measurement, point.time_ns)
+            if key not in seen:
+                seen.add(key)
+                unique.append(point)
+        return unique
+
+    def load(self, executor, outputs, dry_run):
+        points = []
+        for output, parsed in zip(outputs, executor.map(parse_output, outputs, [self.branch] * len(outputs))):
+            logger.debug(f"{output.name}: {len(parsed)} points")
+            points.extend(parsed)
+
+        unique = self.deduplicate(points)
+        if unique and not dry_run:
+            result = self.store.write_points(unique, "import")
+            if not result.succeeded():
+                raise RuntimeError(f"import of {outputs[0].name}..{outputs[-1].name} failed")
+        return len(unique), len(points) - len(unique)
+
+    def run(self, source, dry_run=False):
+        """
+            Imports all recognized outputs. Outputs are parsed and loaded in batches of `batch_size` files,
+            so archive never has to fit in memory. Returns tuple of (imported outputs, written points, skipped points)
+        """
+        imported, written, skipped = 0, 0, 0
+        batch = []
+
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            for output in self.outputs(source):
+                self.annotate(output)
+                if output.kind is None:
+                    logger.warning(f"skipping {output.name}: unknown benchmark output")
+                    continue
+                logger.info(f"found {output.kind} output {output.name} (commit {output.commit})")
+                batch.append(output)
+                imported += 1
+
+                if len(batch) == self.batch_size:
+                    new, duplicates = self.load(executor, batch, dry_run)
+                    written, skipped, batch = written + new, skipped + duplicates, []
+
+            if batch:
+                new, duplicates = self.load(executor, batch, dry_run)
+                written, skipped = written + new, skipped + duplicates
+
+        logger.info(f"{imported} outputs imported: {written} new points, {skipped} duplicates skipped")
+        return imported, written, skipped
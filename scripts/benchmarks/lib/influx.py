@@ -1,10 +1,14 @@
 import logging
 import os
-import subprocess
 import time
-from pathlib import Path
 
 import influxdb_client
+from influxdb_client import WritePrecision
+from influxdb_client.client.write_api import SYNCHRONOUS
+from influxdb_client.rest import ApiException
+from urllib3.exceptions import HTTPError
+
+from lib.store import Store, UploadResult, read_annotated_csv
 
 logger = logging.getLogger(__name__)
 
@@ -35,11 +39,13 @@ class FieldColumn(HeaderColumn):
         Column header which represents influx field header.
         It has additional unit field which can be formatted as part of name
         Currently field is always a double (there was no need so far for different type)
+        lower_is_better defines direction of field when looking for regressions
     """
 
-    def __init__(self, name, pos, unit=None):
+    def __init__(self, name, pos, unit=None, lower_is_better=True):
         HeaderColumn.__init__(self, name, influx_kind="double", pos=pos)
         self.unit = unit
+        self.lower_is_better = lower_is_better
 
     def __str__(self):
         if self.unit:
@@ -60,9 +66,9 @@ class TagColumn(HeaderColumn):
         HeaderColumn.__init__(self, name, influx_kind="tag", pos=pos)
 
 
-class Influx:
+class Influx(Store):
     """
-        Influx helper which wraps influx cli and python api
+        Influx helper which wraps influx python api
         It requires INFLUX_* env vars to be set
         and raises RuntimeException if they are not defined
     """
@@ -88,16 +94,23 @@ class Influx:
         if Influx.bucket not in os.environ:
             raise RuntimeError(f"{Influx.bucket} env var not defined")
 
+    # client is shared by all Influx instances in process, so http connection pool is reused between queries
+    _client = None
+
     def client(self):
-        Influx.check_envs()
-        return influxdb_client.InfluxDBClient(
-            url=os.environ[Influx.host],
-            token=os.environ[Influx.token],
-            org=os.environ[Influx.org],
-            bucket=os.environ[Influx.bucket])
-        
-    def __init__(self, moving_average_size=10):
+        if Influx._client is None:
+            Influx.check_envs()
+            Influx._client = influxdb_client.InfluxDBClient(
+                url=os.environ[Influx.host],
+                token=os.environ[Influx.token],
+                org=os.environ[Influx.org],
+                bucket=os.environ[Influx.bucket],
+                enable_gzip=True)
+        return Influx._client
+
+    def __init__(self, moving_average_size=10, history_range="90d"):
         self.moving_average_size = moving_average_size
+        self.history_range = history_range
 
     def __get_moving_average_query(self, name, branch, field, branch_header):
         """
@@ -117,49 +130,236 @@ class Influx:
 
     def query_moving_average(self, name, branch, field, branch_header):
         """
-            Retrieves moving average from influx db for particular
-            branch and field
+            Retrieves latest moving average from influx db for particular
+            branch and field. Returns None if there is no data
         """
 
         query = self.__get_moving_average_query(name, branch, field,
                                                 branch_header)
         logger.debug(f"running influx query: {query}")
         query_api = self.client().query_api()
-        return query_api.query(query)
+        values = [
+            float(record["_value"]) for table in query_api.query(query)
+            for record in table.records
+        ]
+        return values[-1] if values else None
+
+    def __get_history_query(self, name, branch, field, branch_header, limit):
+        """
+            Constructs query for last `limit` samples of particular measurement field
+        """
+
+        bucket = os.environ[Influx.bucket]
+        return f"from(bucket: \"{bucket}\") \
+                |>  range(start: -{self.history_range})   \
+                |> filter (fn: (r) => (r[\"{branch_header.name}\"] == \"{branch}\" ) \
+                                       and r._measurement == \"{name}\"   \
+                                       and r._field == \"{field}\" ) \
+                |> keep(columns: [\"_time\", \"_value\"]) \
+                |> sort(columns: [\"_time\"]) \
+                |> tail(n:{limit}) "
+
+    def query_history(self, name, branch, field, branch_header, limit):
+        """
+            Retrieves last `limit` values (oldest first) from influx db for particular
+            branch and field
+        """
+
+        query = self.__get_history_query(name, branch, field, branch_header,
+                                         limit)
+        logger.debug(f"running influx query: {query}")
+        query_api = self.client().query_api()
+        tables = query_api.query(query)
+        return [
+            float(record["_value"]) for table in tables
+            for record in table.records
+        ]
+
+    def __get_history_snapshot_query(self, branch, fields, branch_header, limit):
+        """
+            Constructs single query for last `limit` samples of all measurements and given fields on branch.
+            Result is pivoted, so each record holds all fields of measurement at given time
+        """
+
+        bucket = os.environ[Influx.bucket]
+        fields_set = ",".join(f"\"{field}\"" for field in fields)
+        return f"from(bucket: \"{bucket}\") \
+                |>  range(start: -{self.history_range})   \
+                |> filter (fn: (r) => (r[\"{branch_header.name}\"] == \"{branch}\" ) \
+                                       and contains(value: r._field, set: [{fields_set}]) ) \
+                |> keep(columns: [\"_time\", \"_value\", \"_measurement\", \"_field\"]) \
+                |> group(columns: [\"_measurement\", \"_field\"]) \
+                |> sort(columns: [\"_time\"]) \
+                |> tail(n:{limit}) \
+                |> pivot(rowKey: [\"_time\"], columnKey: [\"_field\"], valueColumn: \"_value\") "
+
+    def query_history_snapshot(self, branch, fields, branch_header, limit):
+        """
+            Retrieves last `limit` values of all measurements and fields for branch in one round-trip.
+            Returns dictionary (measurement, field) -> list of values (oldest first)
+        """
+
+        fields = [str(field) for field in fields]
+        query = self.__get_history_snapshot_query(branch, fields,
+                                                  branch_header, limit)
+        logger.debug(f"running influx query: {query}")
+        tables = self.client().query_api().query(query)
+
+        snapshot = {}
+        for table in tables:
+            for record in table.records:
+                measurement = record["_measurement"]
+                for field in fields:
+                    value = record.values.get(field)
+                    if value is not None:
+                        snapshot.setdefault((measurement, field),
+                                            []).append(float(value))
+        return snapshot
+
+    def __get_series_query(self, branch, fields, branch_header, limit):
+        """
+            Constructs single query for last `limit` timestamped samples of all measurements and given fields on branch
+        """
+
+        bucket = os.environ[Influx.bucket]
+        fields_set = ",".join(f"\"{field}\"" for field in fields)
+        return f"from(bucket: \"{bucket}\") \
+                |>  range(start: -{self.history_range})   \
+                |> filter (fn: (r) => (r[\"{branch_header.name}\"] == \"{branch}\" ) \
+                                       and contains(value: r._field, set: [{fields_set}]) ) \
+                |> keep(columns: [\"_time\", \"_value\", \"_measurement\", \"_field\"]) \
+                |> group(columns: [\"_measurement\", \"_field\"]) \
+                |> sort(columns: [\"_time\"]) \
+                |> tail(n:{limit}) "
 
-    def upload_csv(self, file):
+    def query_series(self, branch, fields, branch_header, limit):
+        """
+            Retrieves last `limit` timestamped values of all measurements and fields for branch in one round-trip.
+            Returns dictionary (measurement, field) -> list of (time in nanoseconds, value) (oldest first)
         """
-            Uploads csv to influx db. File need to be formatter according to influx requirements:
-            https://docs.influxdata.com/influxdb/cloud/reference/syntax/annotated-csv/
 
-            WARNING: InfluxDb write api is not very friendly with csv which contains more than measurement
-            in csv file (which is our case). I decided to use influx cli as it supports multiple measurements in
-            single csv file.
-            Unfortunately influx cli has nasty issue when calling from python similar to:
-            (similar to hanging queries problem: https://community.influxdata.com/t/influxdb-hanging-queries/1522).
-            My workaround is to use --http-debug flag, then read output of command and if there is 204 status code
-            returned i kill influx cli
+        fields = [str(field) for field in fields]
+        query = self.__get_series_query(branch, fields, branch_header, limit)
+        logger.debug(f"running influx query: {query}")
+        tables = self.client().query_api().query(query)
+
+        series = {}
+        for table in tables:
+            for record in table.records:
+                time_ns = int(record.get_time().timestamp() * 1_000_000_000)
+                series.setdefault((record.get_measurement(), record.get_field()),
+                                  []).append((time_ns, float(record.get_value())))
+        return series
+
+    def query_times(self, branch, start_ns, end_ns):
+        """
+            Retrieves distinct (measurement, time) of points on branch in given time range.
+            Branch is expected in gitbranch tag (like in all benchmarks csv)
         """
 
-        if not Path(file).is_file():
-            raise RuntimeError(f"cannot find {file}")
+        bucket = os.environ[Influx.bucket]
+        query = f"from(bucket: \"{bucket}\") \
+                |>  range(start: time(v: {start_ns}), stop: time(v: {end_ns + 1}))   \
+                |> filter (fn: (r) => r[\"gitbranch\"] == \"{branch}\" ) \
+                |> keep(columns: [\"_time\", \"_measurement\"]) \
+                |> group() \
+                |> unique(column: \"_time\") "
+        logger.debug(f"running influx query: {query}")
+        tables = self.client().query_api().query(query)
+        return set((record.get_measurement(),
+                    int(record.get_time().timestamp() * 1_000_000_000))
+                   for table in tables for record in table.records)
+
+    def write_points(self, points, source=None, batch_size=5000, max_retries=5, backoff=1.0):
+        """
+            Writes points to influx db. Points are converted to line protocol (see LineProtocol) and sent
+            through python write api in gzip compressed batches. Batch which fails with connection error,
+            429 or 5xx response is retried up to `max_retries` times with exponential backoff.
+            Returns UploadResult which describes which batches were acknowledged by influx db
+        """
 
-        if not open(file).readline().rstrip().startswith("#datatype"):
-            raise RuntimeError(
-                f"{file} is badly formatted and not eligible for uploading to influx db. "
-                f"see more at https://docs.influxdata.com/influxdb/cloud/reference/syntax/annotated-csv/"
+        source = source or "points"
+        lines = [LineProtocol.from_point(point) for point in points]
+        batches = [
+            lines[i:i + batch_size] for i in range(0, len(lines), batch_size)
+        ]
+        result = UploadResult(source, len(lines), len(batches))
+        write_api = self.client().write_api(write_options=SYNCHRONOUS)
+
+        for index, batch in enumerate(batches):
+            for attempt in range(max_retries + 1):
+                try:
+                    write_api.write(bucket=os.environ[Influx.bucket],
+                                    org=os.environ[Influx.org],
+                                    record=batch,
+                                    write_precision=WritePrecision.NS)
+                    break
+                except (ApiException, HTTPError, OSError) as e:
+                    status = getattr(e, "status", None)
+                    retryable = status is None or status == 429 or status >= 500
+                    if not retryable or attempt == max_retries:
+                        logger.error(
+                            f"batch {index} of {source} failed after {attempt + 1} attempts: {e}"
+                        )
+                        result.failed_batches[index] = str(e)
+                        break
+                    delay = backoff * 2**attempt
+                    logger.warning(
+                        f"batch {index} of {source} failed ({e}). retrying in {delay}s"
+                    )
+                    time.sleep(delay)
+
+        if result.succeeded():
+            logger.info(f"{source} uploaded to influx db ({result.points} points)")
+        else:
+            logger.error(
+                f"{source} uploaded partially: {len(result.failed_batches)} of {result.batches} batches failed"
             )
+        return result
+
+
+class LineProtocol:
+    """
+        Converts influx annotated csv (as produced by benchmarks parse) to influx line protocol:
+        https://docs.influxdata.com/influxdb/cloud/reference/syntax/line-protocol/
+    """
 
-        process = subprocess.Popen([
-            "influx", "write", "--http-debug", "--format=csv", f"--file={file}"
-        ],
-            stderr=subprocess.PIPE)
+    @staticmethod
+    def escape_key(value):
+        return value.replace("\\", "\\\\").replace(",", "\\,").replace(
+            "=", "\\=").replace(" ", "\\ ")
 
-        timeout = time.time() + 60  # 1  minute
-        while True:
-            line = process.stderr.readline()
-            if b"HTTP/2.0 204 No Content" in line or time.time() > timeout:
-                process.kill()
-                break
+    @staticmethod
+    def escape_measurement(value):
+        return value.replace("\\", "\\\\").replace(",", "\\,").replace(
+            " ", "\\ ")
 
-        logger.info(f"{file} uploaded to influx db")
+    @staticmethod
+    def format_field(value):
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, int):
+            return f"{value}i"
+        if isinstance(value, float):
+            return repr(value)
+        escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+        return f'"{escaped}"'
+
+    @staticmethod
+    def from_point(point):
+        tag_set = "".join(
+            f",{LineProtocol.escape_key(name)}={LineProtocol.escape_key(value)}"
+            for name, value in sorted(point.tags.items()))
+        fields = ",".join(
+            f"{LineProtocol.escape_key(name)}={LineProtocol.format_field(value)}"
+            for name, value in point.fields.items())
+        return f"{LineProtocol.escape_measurement(point.measurement)}{tag_set} {fields} {point.time_ns}"
+
+    @staticmethod
+    def from_annotated_csv(file, timestamp=None):
+        """
+            Yields line protocol line for each data row. All rows share the same timestamp
+            (upload time unless given) as benchmark csv does not carry time column
+        """
+        for point in read_annotated_csv(file, timestamp):
+            yield LineProtocol.from_point(point)
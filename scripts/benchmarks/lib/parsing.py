@@ -0,0 +1,239 @@
+"""
+    Parsing of raw benchmark outputs shared by benchmark runner and legacy result_parser.py.
+
+    Every output format is described by Grammar: single compiled multiline regex with named groups and converter of
+    each group. Output is matched in large line aligned chunks (so it can still be streamed) and matches are stored in
+    columnar Table backed by `array` module, instead of building list per line.
+"""
+
+import re
+from array import array
+
+CHUNK_LINES = 4096
+
+
+def chunks(content, lines_per_chunk=CHUNK_LINES):
+    """
+        Splits output (entire string or stream of lines) into chunks of whole lines
+    """
+    if isinstance(content, str):
+        yield content
+        return
+    chunk = []
+    for line in content:
+        chunk.append(line)
+        if len(chunk) == lines_per_chunk:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+# scale of unit prefixes printed by core_bench
+PREFIXES = {"": 1, "k": 1_000, "M": 1_000_000, "G": 1_000_000_000}
+
+TIME_UNITS = {"ns": 0.001, "us": 1, "ms": 1_000, "s": 1_000_000}
+
+
+def microseconds(value, unit):
+    return float(value) * TIME_UNITS[unit]
+
+
+def scaled(value, unit, base):
+    """
+        Converts value with prefixed unit (like 6.37Mc or 212.33kw) to multiple of `base` prefix
+    """
+    return float(value) * PREFIXES[unit[:-1]] / PREFIXES[base]
+
+
+def zero_if_empty(value):
+    # core_bench leaves cell empty when value is zero
+    return 0.0 if value is None else float(value)
+
+
+def strip_location(name):
+    # jane street benchmark names start with [file.ml]
+    return re.sub(r"\[.*?\]", "", name).strip()
+
+
+def without_spaces(name):
+    return name.replace(" ", "")
+
+
+class Grammar:
+    """
+        Compiled regex (in multiline mode) with converters from matched group to column value.
+        Groups without converter are kept as strings. Float columns are stored in array('d')
+    """
+
+    def __init__(self, pattern, converters=None, floats=()):
+        self.regex = re.compile(pattern, re.MULTILINE)
+        self.converters = converters or {}
+        self.floats = set(floats)
+
+    def finditer(self, content):
+        for chunk in chunks(content):
+            yield from self.regex.finditer(chunk)
+
+    def table(self, content):
+        table = Table(self)
+        for match in self.finditer(content):
+            table.append(match)
+        return table
+
+
+class Table:
+    """
+        Columnar storage of matches of grammar: group name -> array of floats (for float columns) or list
+    """
+
+    def __init__(self, grammar):
+        self.grammar = grammar
+        self.columns = {
+            name: array('d') if name in grammar.floats else []
+            for name in grammar.regex.groupindex
+        }
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, match):
+        for name, column in self.columns.items():
+            value = match.group(name)
+            converter = self.grammar.converters.get(name)
+            if converter is not None:
+                value = converter(value)
+            elif name in self.grammar.floats:
+                value = float(value)
+            column.append(value)
+        self.size += 1
+
+    def rows(self, *names):
+        """
+            Yields tuples of given columns
+        """
+        return zip(*(self.columns[name] for name in names))
+
+
+class JaneStreet:
+    """
+        Output of jane street core_bench (mina-benchmarks, ledger export). Library marker switches output file,
+        table rows hold time (ns, us, ms or s), cycles (c, kc, Mc or Gc), minor, major and promoted words (w, kw, Mw or Gw).
+        Empty word cells stand for zero. Any other table row is an error, so unknown format can't be silently dropped
+    """
+
+    library = Grammar(r'^Running inline tests in library "(?P<library>[^"]+)"')
+
+    row = Grammar(
+        r"^│[ \t]*(?P<name>[^│\n]*?)[ \t]*│[ \t]*(?P<time>[0-9_]*[.]?[0-9]+)(?P<time_unit>ns|us|ms|s)[ \t]*"
+        r"│[ \t]*(?P<cycles>[0-9_]*[.]?[0-9]+)(?P<cycles_unit>[kMG]?c)[ \t]*"
+        r"│[ \t]*(?:(?P<minor_words>[0-9_]*[.]?[0-9]+)(?P<minor_words_unit>[kMG]?w))?[ \t]*"
+        r"│[ \t]*(?:(?P<major_words>[0-9_]*[.]?[0-9]+)(?P<major_words_unit>[kMG]?w))?[ \t]*"
+        r"│[ \t]*(?:(?P<promoted_words>[0-9_]*[.]?[0-9]+)(?P<promoted_words_unit>[kMG]?w))?[ \t]*│[ \t]*$",
+        converters={
+            "name": strip_location,
+            "minor_words": zero_if_empty,
+            "major_words": zero_if_empty,
+            "promoted_words": zero_if_empty
+        },
+        floats=["time", "cycles", "minor_words", "major_words", "promoted_words"])
+
+    # any other table line (header or unknown format)
+    other_row = Grammar(r"^│(?P<other>[^\n]*)$")
+
+    # library marker, table row or other table line, so order of all is preserved
+    output = Grammar(
+        library.regex.pattern + "|" + row.regex.pattern + "|" + other_row.regex.pattern,
+        converters={"name": strip_location},
+    )
+
+    words = ["minor_words", "major_words", "promoted_words"]
+
+    @staticmethod
+    def is_header(line):
+        return line.strip(" │").startswith("Name")
+
+    @staticmethod
+    def sections(content):
+        """
+            Yields (library or None, Table of rows) for each library section of output.
+            Raises RuntimeError on table row which doesn't match the format
+        """
+        library = None
+        table = Table(JaneStreet.row)
+        for match in JaneStreet.output.finditer(content):
+            if match.group("library") is not None:
+                if len(table) or library is not None:
+                    yield library, table
+                library = match.group("library")
+                table = Table(JaneStreet.row)
+            elif match.group("other") is not None:
+                if not JaneStreet.is_header(match.group("other")):
+                    raise RuntimeError(f"unknown format of benchmark table row: {match.group(0)}")
+            else:
+                table.append(match)
+        if len(table) or library is not None:
+            yield library, table
+
+    @staticmethod
+    def normalize(table):
+        """
+            Converts times to microseconds, cycles to kilocycles and words to words in place
+        """
+        table.columns["time"] = array('d', (
+            microseconds(value, unit)
+            for value, unit in table.rows("time", "time_unit")))
+        table.columns["cycles"] = array('d', (
+            scaled(value, unit, "k")
+            for value, unit in table.rows("cycles", "cycles_unit")))
+        for words in JaneStreet.words:
+            table.columns[words] = array('d', (
+                value if unit is None else scaled(value, unit, "")
+                for value, unit in table.rows(words, f"{words}_unit")))
+        return table
+
+
+ZKAPP_LIMITS = Grammar(
+    r"^Proofs updates=(?P<proofs_updates>\d+)  Signed/None updates=(?P<signed_updates>\d+)  "
+    r"Pairs of Signed/None updates=(?P<pairs_of_signed_updates>\d+): Total account updates: "
+    r"(?P<total_account_updates>\d+) Cost: (?P<cost>[0-9]*[.]?[0-9]+)",
+    converters={
+        "proofs_updates": int,
+        "signed_updates": int,
+        "pairs_of_signed_updates": int,
+        "total_account_updates": int
+    },
+    floats=["cost"])
+
+SNARK_PROFILER = Grammar(
+    r"^\|[ \t]*(?P<no>\d+)[ \t]*\|[ \t]*(?P<proofs_updates>\d+)[ \t]*\|[ \t]*(?P<nonproofs_pairs>\d+)[ \t]*"
+    r"\|[ \t]*(?P<nonproofs_singles>\d+)[ \t]*\|[ \t]*(?P<verification_time>[0-9]*[.]?[0-9]+)[ \t]*"
+    r"\|[ \t]*(?P<proving_time>[0-9]*[.]?[0-9]+)[ \t]*\|[ \t]*(?P<permutation>[^|\s]+)[ \t]*\|",
+    converters={
+        "proofs_updates": int,
+        "nonproofs_pairs": int,
+        "nonproofs_singles": int
+    },
+    floats=["verification_time", "proving_time"])
+
+SNARK_GENERATED = Grammar(
+    r"^Generated zkapp transactions with (?P<updates>\d+) updates and (?P<proof>\d+) proof updates "
+    r"in (?P<time>[0-9]*[.]?[0-9]+) secs",
+    converters={
+        "updates": int,
+        "proof": int
+    },
+    floats=["time"])
+
+HEAP_USAGE = Grammar(
+    r"^Data of type (?P<name>.+?)[ \t]+uses[ \t]+(?P<heap_words>\d+) heap words =[ \t]+(?P<bytes>\d+) bytes",
+    # names were historically stored without spaces
+    converters={
+        "name": without_spaces,
+        "heap_words": int,
+        "bytes": int
+    })
+
+GC_STATS = Grammar(r"^(?P<stat>[a-z_]+): (?P<value>\d+)$",
+                   converters={"value": int})
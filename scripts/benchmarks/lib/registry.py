@@ -0,0 +1,227 @@
+import logging
+import os
+import re
+from importlib import metadata
+
+from lib.bench import *
+
+logger = logging.getLogger(__name__)
+
+
+class BenchmarkSpec:
+    """
+        Declarative description of benchmark. Instead of writing Benchmark subclass one can declare:
+
+        - name: benchmark name used on command line (--benchmark <name>)
+        - binary: default binary (resolved via PATH) and args/env used to run it
+        - grammar: regex matched against each output line. Every matched line produces one csv row
+        - columns: MeasurementColumn, FieldColumn and TagColumn list in csv order. Field and tag values are taken
+          from grammar group named as column (non alphanumeric characters replaced by '_', see group_name),
+          tags can be also given as constants in `tags`. TagColumn named 'gitbranch' receives branch
+        - measurement: format string of measurement name filled with grammar groups
+
+        For example:
+
+        BenchmarkSpec(
+            name="merkle-ledger",
+            binary="mina-merkle-ledger-benchmark",
+            args=["--accounts", "100000"],
+            grammar=r"(?P<op>\\w+): (?P<time>[0-9.]+)us",
+            columns=[MeasurementColumn("name", 0), FieldColumn("time", 1, "us"), TagColumn("gitbranch", 2)],
+            measurement="{op}")
+    """
+
+    def __init__(self,
+                 name,
+                 binary,
+                 grammar,
+                 columns,
+                 args=(),
+                 env=None,
+                 measurement="{name}",
+                 tags=None,
+                 isolated=False,
+                 cpus=1):
+        self.name = name
+        self.binary = binary
+        self.grammar = re.compile(grammar)
+        self.columns = columns
+        self.args = list(args)
+        self.env = env or {}
+        self.measurement = measurement
+        self.tags = tags or {}
+        self.isolated = isolated
+        self.cpus = cpus
+
+    @staticmethod
+    def group_name(column):
+        return re.sub(r"\W+", "_", column.name).strip("_")
+
+
+class DeclarativeBenchmark(Benchmark):
+    """
+        Benchmark fully defined by BenchmarkSpec
+    """
+
+    branch_column = "gitbranch"
+
+    def __init__(self, spec):
+        Benchmark.__init__(self, spec.name)
+        self.spec = spec
+        self.isolated = spec.isolated
+        self.cpus = spec.cpus
+
+    def default_path(self):
+        return self.spec.binary
+
+    def headers(self):
+        return self.spec.columns
+
+    def fields(self):
+        return [
+            column for column in self.spec.columns
+            if isinstance(column, FieldColumn)
+        ]
+
+    def name_header(self):
+        return next(column for column in self.spec.columns
+                    if isinstance(column, MeasurementColumn))
+
+    def branch_header(self):
+        return next(column for column in self.spec.columns
+                    if column.name == DeclarativeBenchmark.branch_column)
+
+    def command(self, path=None):
+        path = self.default_path() if path is None else path
+        envs = None
+        if self.spec.env:
+            envs = os.environ.copy()
+            envs.update(self.spec.env)
+        return [path] + self.spec.args, envs
+
+    def row(self, match, branch):
+        groups = match.groupdict()
+        row = []
+        for column in self.spec.columns:
+            if isinstance(column, MeasurementColumn):
+                row.append(self.spec.measurement.format(**groups))
+            elif column.name == DeclarativeBenchmark.branch_column:
+                row.append(branch)
+            elif column.name in self.spec.tags:
+                row.append(self.spec.tags[column.name])
+            else:
+                row.append(groups[BenchmarkSpec.group_name(column)])
+        return row
+
+    def parse(self, content, output_filename, influxdb, branch):
+        csvfile, csvwriter = self.open_csv(output_filename, influxdb)
+        with csvfile:
+            csvwriter.writerow(self.headers_to_name(self.headers()))
+
+            for line in lines_of(content):
+                match = self.spec.grammar.search(line)
+                if match:
+                    csvwriter.writerow(self.row(match, branch))
+
+        return [output_filename]
+
+
+def snark_benchmark(options):
+    return SnarkBenchmark(getattr(options, "k", 1),
+                          getattr(options, "max_num_updates", 4),
+                          getattr(options, "min_num_updates", 2))
+
+
+def ledger_export_benchmark(options):
+    if hasattr(options, "genesis_ledger_path") and options.genesis_ledger_path is None:
+        raise RuntimeError(
+            "--genesis-ledger-path need to be provided when running ledger export benchmark")
+    return LedgerExportBenchmark(getattr(options, "genesis_ledger_path", None))
+
+
+def allocation_benchmark(options):
+    target_args = (getattr(options, "target_args", None) or "").split()
+    target_name = getattr(options, "target_name", None)
+    if target_name is None:
+        path = getattr(options, "path", None) or "mina"
+        target_name = " ".join([os.path.basename(path)] + target_args)
+    return AllocationBenchmark(target_name, target_args)
+
+
+class BenchmarkRegistry:
+    """
+        Maps benchmark name to factory which creates Benchmark from command line options.
+
+        Besides built-in benchmarks, benchmarks are discovered from `mina_benchmarks` entry point group.
+        Entry point name is benchmark name and it should point to BenchmarkSpec or to factory
+        (like Benchmark subclass) accepting command line options, e.g. in setup.cfg of plugin package:
+
+        [options.entry_points]
+        mina_benchmarks =
+            merkle-ledger = mina_ledger_benchmarks:merkle_ledger_spec
+
+        Benchmarks registered with default=False (like allocation, which needs target given on command line)
+        are left out of `defaults`, which run-all and report use when no benchmark is selected
+    """
+
+    entry_point_group = "mina_benchmarks"
+
+    def __init__(self):
+        self.factories = {}
+        self.non_default = set()
+        # plugins are loaded on first lookup, as they usually import lib themselves
+        self.discovered = False
+
+    def register(self, name, factory, default=True):
+        if isinstance(factory, BenchmarkSpec):
+            spec = factory
+            factory = lambda options: DeclarativeBenchmark(spec)
+        if name in self.factories:
+            logger.warning(f"benchmark {name} is already registered. overriding")
+        self.factories[name] = factory
+        if default:
+            self.non_default.discard(name)
+        else:
+            self.non_default.add(name)
+
+    def register_spec(self, spec):
+        self.register(spec.name, spec)
+
+    def discover(self):
+        self.discovered = True
+        entry_points = metadata.entry_points()
+        if hasattr(entry_points, "select"):
+            group = entry_points.select(group=BenchmarkRegistry.entry_point_group)
+        else:
+            group = entry_points.get(BenchmarkRegistry.entry_point_group, [])
+
+        for entry_point in group:
+            try:
+                self.register(entry_point.name, entry_point.load())
+            except Exception as e:
+                logger.error(f"cannot load benchmark plugin {entry_point.name}: {e}")
+
+    def names(self):
+        if not self.discovered:
+            self.discover()
+        return list(self.factories)
+
+    def defaults(self):
+        return [name for name in self.names() if name not in self.non_default]
+
+    def create(self, name, options=None):
+        if not self.discovered:
+            self.discover()
+        if name not in self.factories:
+            raise RuntimeError(
+                f"unknown benchmark {name}. Available: {', '.join(self.names())}")
+        return self.factories[name](options)
+
+
+registry = BenchmarkRegistry()
+registry.register(str(BenchmarkType.mina_base), lambda options: MinaBaseBenchmark())
+registry.register(str(BenchmarkType.snark), snark_benchmark)
+registry.register(str(BenchmarkType.heap_usage), lambda options: HeapUsageBenchmark())
+registry.register(str(BenchmarkType.zkapp), lambda options: ZkappLimitsBenchmark())
+registry.register(str(BenchmarkType.ledger_export), ledger_export_benchmark)
+registry.register(str(BenchmarkType.allocation), allocation_benchmark, default=False)
@@ -0,0 +1,117 @@
+import logging
+from enum import Enum
+
+from lib.stats import median, bootstrap_ci, mann_whitney_u, cliffs_delta, relative_change
+
+logger = logging.getLogger(__name__)
+
+
+class Method(Enum):
+    bootstrap = 'bootstrap'
+    mann_whitney = 'mann-whitney'
+
+    def __str__(self):
+        return self.value
+
+
+class Verdict(Enum):
+    no_data = 'no data'
+    ok = 'ok'
+    improvement = 'improvement'
+    warning = 'warning'
+    regression = 'regression'
+
+    def __str__(self):
+        return self.value
+
+
+class Comparison:
+    """
+        Result of comparing current samples of single (measurement, field) against history.
+
+        `change` is relative change of medians signed by field direction, so positive value
+        always means worse result. `ci` is confidence interval of that change and `effect_size`
+        is Cliff's delta (also signed so positive means worse). Changes below yellow threshold
+        are not tested for significance, so they have no `ci`. `reason` explains no data verdict
+    """
+
+    def __init__(self, name, field, verdict, current, history, change=None, ci=None, effect_size=None, p_value=None,
+                 reason=None):
+        self.name = name
+        self.field = field
+        self.verdict = verdict
+        self.current = current
+        self.history = history
+        self.change = change
+        self.ci = ci
+        self.effect_size = effect_size
+        self.p_value = p_value
+        self.reason = reason
+
+    def __str__(self):
+        if self.verdict == Verdict.no_data:
+            reason = self.reason or f"not enough historical data ({len(self.history)} samples)"
+            return f"{self.name} [{self.field}]: {reason}"
+        ci = "" if self.ci is None else f", ci [{self.ci[0]:+.2%},{self.ci[1]:+.2%}]"
+        p_value = "" if self.p_value is None else f", p={self.p_value:.4f}"
+        return (
+            f"{self.name} [{self.field}]: {self.verdict} "
+            f"median {median(self.current)} against {median(self.history)} "
+            f"(change {self.change:+.2%}{ci}, "
+            f"effect size {self.effect_size:+.2f}{p_value})")
+
+
+class RegressionDetector:
+    """
+        Noise aware comparison of current samples against last N historical samples.
+
+        Change is considered significant when confidence interval (bootstrap) or Mann-Whitney test
+        (when there is more than one current sample) excludes no change.
+        Significant change which exceeds red threshold is a regression, exceeding yellow threshold gives warning.
+        Change of medians below yellow threshold is ok whatever its significance, so only changes above it
+        are tested. Zero historical median gives no data verdict, as relative change is undefined
+    """
+
+    def __init__(self, yellow_threshold, red_threshold, method=Method.bootstrap, confidence=0.95, min_samples=5):
+        self.yellow_threshold = yellow_threshold
+        self.red_threshold = red_threshold
+        self.method = method
+        self.confidence = confidence
+        self.min_samples = min_samples
+
+    def compare(self, name, field, current, history):
+        if len(history) < self.min_samples or not current:
+            return Comparison(name, field, Verdict.no_data, current, history)
+
+        sign = 1 if field.lower_is_better else -1
+
+        change = relative_change(median(history), median(current))
+        if change is None:
+            return Comparison(name, field, Verdict.no_data, current, history,
+                              reason=f"historical median is zero, current median is {median(current)}")
+        change = sign * change
+        effect_size = sign * cliffs_delta(current, history)
+
+        if abs(change) < self.yellow_threshold:
+            return Comparison(name, field, Verdict.ok, current, history, change, None, effect_size)
+
+        ci = bootstrap_ci(history, current, confidence=self.confidence)
+        ci = None if ci is None else tuple(sorted(sign * x for x in ci))
+
+        p_value = None
+        if self.method == Method.mann_whitney and len(current) > 1:
+            _, p_value = mann_whitney_u(current, history)
+            significant = p_value < 1 - self.confidence
+        else:
+            significant = ci is not None and (ci[0] > 0 or ci[1] < 0)
+
+        if not significant:
+            verdict = Verdict.ok
+        elif change >= self.red_threshold:
+            verdict = Verdict.regression
+        elif change >= self.yellow_threshold:
+            verdict = Verdict.warning
+        else:
+            verdict = Verdict.improvement
+
+        return Comparison(name, field, verdict, current, history, change, ci, effect_size, p_value)
@@ -0,0 +1,235 @@
+import datetime
+import html
+import json
+import logging
+
+from lib.regression import Verdict
+from lib.stats import median, percentile, least_squares, change_points, relative_change
+
+logger = logging.getLogger(__name__)
+
+
+class ChangePoint:
+    """
+        Shift of measurement distribution. `change` is relative change of medians of segments around change point,
+        signed by field direction so positive value means worse (None for shift from zero)
+    """
+
+    def __init__(self, index, time_ns, before, after, change, verdict):
+        self.index = index
+        self.time_ns = time_ns
+        self.before = before
+        self.after = after
+        self.change = change
+        self.verdict = verdict
+
+    def to_dict(self):
+        return {
+            "index": self.index,
+            "time": format_time(self.time_ns),
+            "before": self.before,
+            "after": self.after,
+            "change": self.change,
+            "verdict": str(self.verdict),
+        }
+
+
+class SeriesReport:
+    """
+        History of single (measurement, field) with its trend, noise band and change points.
+
+        Noise band is 5th-95th percentile of values since last change point. Trend is slope of least squares
+        line fitted over last segment, relative to its median (change per run).
+        Status is verdict of most recent change point if it happened within last `recent` runs, otherwise ok
+    """
+
+    def __init__(self, measurement, field, points, yellow_threshold, red_threshold, alpha, recent):
+        self.measurement = measurement
+        self.field = field
+        self.times = [time_ns for time_ns, _ in points]
+        self.values = [value for _, value in points]
+        sign = 1 if field.lower_is_better else -1
+
+        self.change_points = []
+        indices = change_points(self.values, alpha=alpha)
+        bounds = [0] + indices + [len(self.values)]
+        for i, index in enumerate(indices):
+            before = median(self.values[bounds[i]:index])
+            after = median(self.values[index:bounds[i + 2]])
+            change = relative_change(before, after)
+            # shift from zero can't be expressed relatively, it is shown but not judged
+            change = None if change is None else sign * change
+            if change is None:
+                verdict = Verdict.ok
+            elif change >= red_threshold:
+                verdict = Verdict.regression
+            elif change >= yellow_threshold:
+                verdict = Verdict.warning
+            elif change <= -yellow_threshold:
+                verdict = Verdict.improvement
+            else:
+                verdict = Verdict.ok
+            self.change_points.append(
+                ChangePoint(index, self.times[index], before, after, change, verdict))
+
+        segment = self.values[bounds[-2]:]
+        self.band = (percentile(segment, 5), percentile(segment, 95))
+        fit = least_squares([(i, ) for i in range(len(segment))], segment)
+        base = median(segment)
+        self.trend = 0.0 if fit is None or base == 0 else sign * fit[0][1] / abs(base)
+
+        recent_changes = [
+            point for point in self.change_points
+            if point.index >= len(self.values) - recent and point.verdict != Verdict.ok
+        ]
+        self.status = recent_changes[-1].verdict if recent_changes else Verdict.ok
+
+    @property
+    def name(self):
+        return f"{self.measurement} [{self.field}]"
+
+    def to_dict(self):
+        return {
+            "measurement": self.measurement,
+            "field": str(self.field),
+            "status": str(self.status),
+            "runs": len(self.values),
+            "latest": self.values[-1],
+            "latest_time": format_time(self.times[-1]),
+            "noise_band": list(self.band),
+            "trend": self.trend,
+            "change_points": [point.to_dict() for point in self.change_points],
+        }
+
+
+def format_time(time_ns):
+    return datetime.datetime.fromtimestamp(
+        time_ns / 1_000_000_000, datetime.timezone.utc).isoformat(timespec="seconds")
+
+
+def format_change(point):
+    if point.change is None:
+        return f"{point.before:g} -> {point.after:g}"
+    return f"{point.change:+.1%}"
+
+
+class Report:
+    """
+        Builds dashboard of benchmark history read from store (see Store.query_series).
+        Produces self-contained html (inline svg charts, no external assets) and json summary
+    """
+
+    colors = {
+        Verdict.regression: "#d73a49",
+        Verdict.warning: "#e36209",
+        Verdict.improvement: "#28a745",
+        Verdict.ok: "#6a737d",
+    }
+
+    def __init__(self, store, branch, history_size=100, yellow_threshold=0.1, red_threshold=0.2, alpha=0.01,
+                 recent=10):
+        self.store = store
+        self.branch = branch
+        self.history_size = history_size
+        self.yellow_threshold = yellow_threshold
+        self.red_threshold = red_threshold
+        self.alpha = alpha
+        self.recent = recent
+        self.kinds = {}
+
+    def add(self, bench):
+        """
+            Reads history of all measurements of benchmark fields
+        """
+        fields = {str(field): field for field in bench.fields()}
+        series = self.store.query_series(self.branch, list(fields.values()),
+                                         bench.branch_header(), self.history_size)
+        reports = [
+            SeriesReport(measurement, fields[field], points, self.yellow_threshold, self.red_threshold,
+                         self.alpha, self.recent)
+            for (measurement, field), points in sorted(series.items()) if points
+        ]
+        logger.info(f"{bench.kind}: {len(reports)} series")
+        self.kinds[str(bench.kind)] = reports
+
+    def summary(self):
+        return {
+            "branch": self.branch,
+            "generated": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "benchmarks": {
+                kind: {
+                    "counts": {
+                        str(verdict): sum(1 for report in reports if report.status == verdict)
+                        for verdict in Report.colors
+                    },
+                    "series": [report.to_dict() for report in reports],
+                }
+                for kind, reports in self.kinds.items()
+            },
+        }
+
+    def write_json(self, filename):
+        with open(filename, 'w') as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def chart(self, report, width=320, height=60):
+        values = report.values
+        low = min(values + [report.band[0]])
+        high = max(values + [report.band[1]])
+        span = (high - low) or 1.0
+        step = width / max(len(values) - 1, 1)
+
+        def y(value):
+            return height - 4 - (value - low) / span * (height - 8)
+
+        band_top, band_bottom = y(report.band[1]), y(report.band[0])
+        start = report.change_points[-1].index * step if report.change_points else 0
+        line = " ".join(f"{i * step:.1f},{y(value):.1f}" for i, value in enumerate(values))
+        markers = "".join(
+            f'<line x1="{point.index * step:.1f}" y1="0" x2="{point.index * step:.1f}" y2="{height}" '
+            f'stroke="{Report.colors[point.verdict]}" stroke-dasharray="3,2"/>'
+            for point in report.change_points)
+        return (
+            f'<svg width="{width}" height="{height}" xmlns="http://www.w3.org/2000/svg">'
+            f'<rect x="{start:.1f}" y="{band_top:.1f}" width="{width - start:.1f}" '
+            f'height="{max(band_bottom - band_top, 1):.1f}" fill="#dbedff"/>'
+            f'{markers}<polyline points="{line}" fill="none" stroke="{Report.colors[report.status]}" '
+            f'stroke-width="1.5"/></svg>')
+
+    def write_html(self, filename):
+        sections = []
+        for kind, reports in self.kinds.items():
+            rows = []
+            # most interesting series first
+            order = [Verdict.regression, Verdict.warning, Verdict.improvement, Verdict.ok]
+            for report in sorted(reports, key=lambda report: order.index(report.status)):
+                last_change = report.change_points[-1] if report.change_points else None
+                change = "" if last_change is None else f"{format_change(last_change)} at {format_time(last_change.time_ns)}"
+                rows.append(
+                    f'<tr><td>{html.escape(report.name)}</td>'
+                    f'<td style="color:{Report.colors[report.status]};font-weight:bold">{report.status}</td>'
+                    f'<td>{report.values[-1]:.6g}</td>'
+                    f'<td>{report.band[0]:.6g} &ndash; {report.band[1]:.6g}</td>'
+                    f'<td>{report.trend:+.2%}/run</td>'
+                    f'<td>{html.escape(change)}</td>'
+                    f'<td>{self.chart(report)}</td></tr>')
+            counts = ", ".join(
+                f'<span style="color:{color}">{sum(1 for r in reports if r.status == verdict)} {verdict}</span>'
+                for verdict, color in Report.colors.items())
+            sections.append(
+                f'<h2>{html.escape(kind)}</h2><p>{counts}</p>'
+                '<table><tr><th>measurement</th><th>status</th><th>latest</th><th>noise band</th>'
+                '<th>trend</th><th>last change</th><th>history</th></tr>'
+                f'{"".join(rows)}</table>')
+
+        with open(filename, 'w') as file:
+            file.write(
+                '<!DOCTYPE html><html><head><meta charset="utf-8">'
+                f'<title>Benchmarks report: {html.escape(self.branch)}</title>'
+                '<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse}'
+                'td,th{border-bottom:1px solid #e1e4e8;padding:4px 8px;text-align:left;vertical-align:middle}'
+                '</style></head><body>'
+                f'<h1>Benchmarks report: {html.escape(self.branch)}</h1>'
+                f'<p>Last {self.history_size} runs. Shaded area is noise band (5th-95th percentile since last change '
+                'point), dashed lines are change points.</p>'
+                f'{"".join(sections)}</body></html>')
@@ -0,0 +1,120 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from lib.utils import ResourceUsage
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus():
+    """
+        Returns sorted list of cpus current process is allowed to run on
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def run_pinned(bench, path, cpus, repetitions=1, warmup=0, min_time=0):
+    """
+        Worker entry point. Pins worker process to given cpus (benchmark subprocess inherits affinity)
+        and samples benchmark. Returns tuple of samples, median resource usage and duration in seconds
+    """
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    start = time.time()
+    samples = bench.sample(path=path,
+                           repetitions=repetitions,
+                           warmup=warmup,
+                           min_time=min_time)
+    return samples, ResourceUsage.median(bench.usages), time.time() - start
+
+
+class Job:
+    """
+        Single benchmark scheduled by Scheduler.
+        Number of cpus and isolation are taken from benchmark class (see Benchmark.cpus and Benchmark.isolated)
+    """
+
+    def __init__(self, bench, path=None, repetitions=1, warmup=0, min_time=0):
+        self.bench = bench
+        self.path = path
+        self.repetitions = repetitions
+        self.warmup = warmup
+        self.min_time = min_time
+
+    @property
+    def name(self):
+        return str(self.bench.kind)
+
+    def cpus_needed(self, budget):
+        if self.bench.isolated:
+            return budget
+        return min(self.bench.cpus, budget)
+
+
+class JobResult:
+
+    def __init__(self, job, samples=None, usage=None, duration=None, error=None):
+        self.job = job
+        self.samples = samples
+        self.usage = usage
+        self.duration = duration
+        self.error = error
+
+    def succeeded(self):
+        return self.error is None
+
+
+class Scheduler:
+    """
+        Runs multiple benchmarks on process pool.
+
+        Each running benchmark gets its own disjoint set of cpus out of concurrency budget.
+        Isolated benchmarks (like snark proving) get entire budget, so they never run
+        alongside other benchmarks. Jobs are started in order (FIFO) so isolated benchmark
+        cannot be starved by smaller ones.
+    """
+
+    def __init__(self, budget=None, cpus=None):
+        self.cpus = available_cpus() if cpus is None else sorted(cpus)
+        budget = len(self.cpus) if budget is None else budget
+        self.budget = max(1, min(budget, len(self.cpus)))
+
+    def run(self, jobs):
+        pending = list(jobs)
+        free = self.cpus[:self.budget]
+        running = {}
+        results = []
+
+        with ProcessPoolExecutor(max_workers=self.budget) as executor:
+            while pending or running:
+                while pending:
+                    job = pending[0]
+                    needed = job.cpus_needed(self.budget)
+                    if needed > len(free):
+                        break
+                    pending.pop(0)
+                    cpus, free = free[:needed], free[needed:]
+                    logger.info(f"starting {job.name} on cpus {cpus}")
+                    future = executor.submit(run_pinned, job.bench, job.path,
+                                             cpus, job.repetitions,
+                                             job.warmup, job.min_time)
+                    running[future] = (job, cpus)
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, cpus = running.pop(future)
+                    free = sorted(free + cpus)
+                    try:
+                        samples, usage, duration = future.result()
+                        logger.info(f"{job.name} finished in {duration:.1f}s")
+                        results.append(
+                            JobResult(job, samples, usage, duration))
+                    except Exception as e:
+                        logger.error(f"{job.name} failed: {e}")
+                        results.append(JobResult(job, error=e))
+
+        return results
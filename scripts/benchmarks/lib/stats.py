@@ -0,0 +1,178 @@
+"""
+    Small statistics toolbox used by benchmark comparison.
+
+    Implemented in plain python on purpose, so benchmark scripts do not need scipy/numpy on CI agents.
+"""
+
+import math
+import random
+
+
+def median(values):
+    return percentile(values, 50)
+
+
+def percentile(values, q):
+    """
+        Percentile with linear interpolation between closest ranks (same as numpy default)
+    """
+    if not values:
+        raise ValueError("percentile of empty sequence")
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def mean(values):
+    return sum(values) / len(values)
+
+
+def stdev(values):
+    """
+        Sample standard deviation. Zero for less than two values
+    """
+    if len(values) < 2:
+        return 0.0
+    avg = mean(values)
+    return math.sqrt(sum((x - avg)**2 for x in values) / (len(values) - 1))
+
+
+def coefficient_of_variation(values):
+    avg = mean(values)
+    return stdev(values) / abs(avg) if avg != 0 else 0.0
+
+
+def relative_change(baseline, value):
+    """
+        Relative change of value against baseline. Returns 0 if both are zero and None if only baseline
+        is zero, as such change can't be expressed relatively
+    """
+    if baseline == 0:
+        return 0.0 if value == 0 else None
+    return (value - baseline) / abs(baseline)
+
+
+def bootstrap_ci(baseline,
+                 current,
+                 statistic=median,
+                 confidence=0.95,
+                 iterations=1000,
+                 seed=0):
+    """
+        Bootstrap confidence interval of relative change of statistic between baseline and current samples.
+        Both samples are resampled with replacement (single current sample is taken as is). Resamples whose
+        baseline statistic is zero are left out. Returns (low, high) tuple or None if there is no other resample
+    """
+    rng = random.Random(seed)
+    changes = []
+    single = current[0] if len(current) == 1 else None
+    for _ in range(iterations):
+        b = statistic(rng.choices(baseline, k=len(baseline)))
+        c = single if single is not None else statistic(rng.choices(current, k=len(current)))
+        change = relative_change(b, c)
+        if change is not None:
+            changes.append(change)
+    if not changes:
+        return None
+    alpha = (1 - confidence) / 2
+    return percentile(changes, alpha * 100), percentile(changes, (1 - alpha) * 100)
+
+
+def mann_whitney_u(a, b):
+    """
+        Two sided Mann-Whitney U test using normal approximation with tie correction.
+        Returns (u statistic of a, p value)
+    """
+    n1, n2 = len(a), len(b)
+    combined = sorted([(x, 0) for x in a] + [(x, 1) for x in b])
+
+    ranks = [0.0] * len(combined)
+    ties = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        rank = (i + j) / 2 + 1
+        for k in range(i, j + 1):
+            ranks[k] = rank
+        count = j - i + 1
+        ties += count**3 - count
+        i = j + 1
+
+    rank_sum = sum(r for r, (_, group) in zip(ranks, combined) if group == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2
+
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variance)
+    p = math.erfc(max(z, 0) / math.sqrt(2))
+    return u, min(p, 1.0)
+
+
+def cliffs_delta(a, b):
+    """
+        Cliff's delta effect size: probability that value from a is greater than value from b
+        minus probability of the opposite. In range [-1,1]
+    """
+    greater = sum(1 for x in a for y in b if x > y)
+    lower = sum(1 for x in a for y in b if x < y)
+    return (greater - lower) / (len(a) * len(b))
+
+
+def least_squares(xs, ys):
+    """
+        Ordinary least squares fit of y = b0 + b1*x1 + ... + bn*xn, where xs is list of predictor tuples.
+        Returns ([b0, b1, ..., bn], r squared) or None if predictors are collinear or there are too few points
+    """
+    rows = [[1.0] + [float(x) for x in row] for row in xs]
+    n = len(rows[0]) if rows else 0
+    if len(rows) <= n - 1 or n == 0:
+        return None
+
+    # normal equations (X^T X) b = X^T y solved with gaussian elimination and partial pivoting
+    matrix = [[sum(row[i] * row[j] for row in rows) for j in range(n)] +
+              [sum(row[i] * y for row, y in zip(rows, ys))] for i in range(n)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(matrix[r][col]))
+        if abs(matrix[pivot][col]) < 1e-12:
+            return None
+        matrix[col], matrix[pivot] = matrix[pivot], matrix[col]
+        for r in range(n):
+            if r != col:
+                factor = matrix[r][col] / matrix[col][col]
+                for c in range(col, n + 1):
+                    matrix[r][c] -= factor * matrix[col][c]
+    coefficients = [matrix[i][n] / matrix[i][i] for i in range(n)]
+
+    avg = mean(ys)
+    total = sum((y - avg)**2 for y in ys)
+    residual = sum((y - sum(b * x for b, x in zip(coefficients, row)))**2
+                   for row, y in zip(rows, ys))
+    r2 = 1.0 if total == 0 else 1 - residual / total
+    return coefficients, r2
+
+
+def change_points(values, min_size=3, alpha=0.01):
+    """
+        Finds positions where distribution of values shifts using binary segmentation: segment is split at position
+        with lowest Mann-Whitney p value between left and right part, as long as it is below alpha.
+        Returns sorted list of indices of first value after each change
+    """
+    points = []
+    segments = [(0, len(values))]
+    while segments:
+        start, end = segments.pop()
+        best = None
+        for split in range(start + min_size, end - min_size + 1):
+            _, p = mann_whitney_u(values[start:split], values[split:end])
+            if best is None or p < best[1]:
+                best = (split, p)
+        if best is not None and best[1] < alpha:
+            points.append(best[0])
+            segments.extend([(start, best[0]), (best[0], end)])
+    return sorted(points)
@@ -0,0 +1,253 @@
+import abc
+import csv
+import json
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class Point:
+    """
+        Single measurement point: measurement name, tags, fields and time in nanoseconds
+    """
+
+    def __init__(self, measurement, tags, fields, time_ns):
+        self.measurement = measurement
+        self.tags = tags
+        self.fields = fields
+        self.time_ns = time_ns
+
+
+def read_annotated_csv(file, timestamp=None):
+    """
+        Yields Point for each row of influx annotated csv (as produced by benchmarks parse).
+        All rows share the same timestamp (current time unless given) as benchmark csv does not carry time column
+    """
+    timestamp = time.time_ns() if timestamp is None else timestamp
+
+    with open(file, newline='') as csvfile:
+        kinds = csvfile.readline().rstrip().split(" ", 1)[1].split(",")
+        reader = csv.reader(csvfile)
+        names = next(reader)
+
+        for row in reader:
+            measurement = None
+            tags = {}
+            fields = {}
+            for kind, name, value in zip(kinds, names, row):
+                if kind == "measurement":
+                    measurement = value
+                elif kind == "tag":
+                    if value != "":
+                        tags[name] = value
+                elif value == "":
+                    continue
+                elif kind == "double":
+                    fields[name] = float(value)
+                elif kind == "long":
+                    fields[name] = int(value)
+                elif kind == "boolean":
+                    fields[name] = value.lower() in ["true", "t", "1"]
+                else:
+                    fields[name] = value
+
+            if measurement is None or not fields:
+                logger.warning(f"skipping row without measurement or fields: {row}")
+                continue
+
+            yield Point(measurement, tags, fields, timestamp)
+
+
+class UploadResult:
+    """
+        Acknowledgement of single file upload
+    """
+
+    def __init__(self, file, points, batches):
+        self.file = file
+        self.points = points
+        self.batches = batches
+        self.failed_batches = {}
+
+    def succeeded(self):
+        return not self.failed_batches
+
+
+class Store(abc.ABC):
+    """
+        Time series storage of benchmark results. Implemented by Influx and SqliteStore
+    """
+
+    @abc.abstractmethod
+    def write_points(self, points, source=None):
+        """
+            Writes points. Returns UploadResult
+        """
+        pass
+
+    @abc.abstractmethod
+    def query_history(self, name, branch, field, branch_header, limit):
+        """
+            Returns last `limit` values (oldest first) of field of measurement on branch
+        """
+        pass
+
+    @abc.abstractmethod
+    def query_history_snapshot(self, branch, fields, branch_header, limit):
+        """
+            Returns dictionary (measurement, field) -> last `limit` values (oldest first) for all measurements on branch
+        """
+        pass
+
+    @abc.abstractmethod
+    def query_series(self, branch, fields, branch_header, limit):
+        """
+            Returns dictionary (measurement, field) -> last `limit` (time in nanoseconds, value) pairs (oldest first)
+            for all measurements on branch
+        """
+        pass
+
+    @abc.abstractmethod
+    def query_times(self, branch, start_ns, end_ns):
+        """
+            Returns set of (measurement, time in nanoseconds) of points stored on branch between start and end (inclusive).
+            Used to skip already stored points
+        """
+        pass
+
+    @abc.abstractmethod
+    def query_moving_average(self, name, branch, field, branch_header):
+        """
+            Returns latest moving average of field of measurement on branch or None if there is no data
+        """
+        pass
+
+    def upload_csv(self, file):
+        """
+            Uploads influx annotated csv file:
+            https://docs.influxdata.com/influxdb/cloud/reference/syntax/annotated-csv/
+        """
+
+        if not Path(file).is_file():
+            raise RuntimeError(f"cannot find {file}")
+
+        if not open(file).readline().rstrip().startswith("#datatype"):
+            raise RuntimeError(
+                f"{file} is badly formatted and not eligible for uploading to influx db. "
+                f"see more at https://docs.influxdata.com/influxdb/cloud/reference/syntax/annotated-csv/"
+            )
+
+        return self.write_points(read_annotated_csv(file), file)
+
+
+class SqliteStore(Store):
+    """
+        File backed store which does not require influx db, so compare can be run locally.
+        Points are kept one row per (measurement, branch, field, time) with index on those columns.
+        Branch is taken from `branch_tag` tag (all benchmarks use gitbranch)
+    """
+
+    branch_tag = "gitbranch"
+
+    schema = [
+        "CREATE TABLE IF NOT EXISTS points (measurement TEXT NOT NULL, branch TEXT, field TEXT NOT NULL, "
+        "time INTEGER NOT NULL, value REAL, tags TEXT)",
+        "CREATE INDEX IF NOT EXISTS points_by_measurement ON points (measurement, branch, field, time)",
+        "CREATE INDEX IF NOT EXISTS points_by_branch ON points (branch, field, time)",
+    ]
+
+    def __init__(self, path, moving_average_size=10):
+        self.path = path
+        self.moving_average_size = moving_average_size
+        self._connection = None
+
+    def __getstate__(self):
+        # sqlite connection cannot be moved to other process
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        return state
+
+    def connection(self):
+        if self._connection is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.path)
+            for statement in SqliteStore.schema:
+                self._connection.execute(statement)
+        return self._connection
+
+    def write_points(self, points, source=None):
+        rows = []
+        for point in points:
+            branch = point.tags.get(SqliteStore.branch_tag)
+            tags = json.dumps(point.tags, sort_keys=True)
+            for field, value in point.fields.items():
+                if isinstance(value, (int, float)):
+                    rows.append((point.measurement, branch, field,
+                                 point.time_ns, float(value), tags))
+
+        with self.connection() as connection:
+            connection.executemany(
+                "INSERT INTO points (measurement, branch, field, time, value, tags) VALUES (?, ?, ?, ?, ?, ?)",
+                rows)
+
+        logger.info(f"{source or 'points'} stored in {self.path} ({len(rows)} values)")
+        return UploadResult(source, len(rows), 1)
+
+    def query_history(self, name, branch, field, branch_header, limit):
+        cursor = self.connection().execute(
+            "SELECT value FROM points WHERE measurement = ? AND branch = ? AND field = ? "
+            "ORDER BY time DESC LIMIT ?", (name, branch, str(field), limit))
+        return [value for (value, ) in cursor][::-1]
+
+    def query_history_snapshot(self, branch, fields, branch_header, limit):
+        series = self.query_series(branch, fields, branch_header, limit)
+        return {
+            key: [value for (_, value) in points]
+            for key, points in series.items()
+        }
+
+    def query_series(self, branch, fields, branch_header, limit):
+        fields = [str(field) for field in fields]
+        placeholders = ",".join("?" * len(fields))
+        cursor = self.connection().execute(
+            f"SELECT measurement, field, time, value FROM ("
+            f"  SELECT measurement, field, value, time, ROW_NUMBER() OVER "
+            f"    (PARTITION BY measurement, field ORDER BY time DESC) AS recent "
+            f"  FROM points WHERE branch = ? AND field IN ({placeholders})"
+            f") WHERE recent <= ? ORDER BY time", [branch] + fields + [limit])
+
+        series = {}
+        for measurement, field, time_ns, value in cursor:
+            series.setdefault((measurement, field), []).append((time_ns, value))
+        return series
+
+    def query_times(self, branch, start_ns, end_ns):
+        cursor = self.connection().execute(
+            "SELECT DISTINCT measurement, time FROM points WHERE branch = ? AND time BETWEEN ? AND ?",
+            (branch, start_ns, end_ns))
+        return set(cursor)
+
+    def query_moving_average(self, name, branch, field, branch_header):
+        values = self.query_history(name, branch, field, branch_header,
+                                    self.moving_average_size)
+        return sum(values) / len(values) if values else None
+
+
+def open_store(spec=None):
+    """
+        Opens store described by spec (or BENCHMARK_STORE env var):
+        - `influx` (default) - influx db configured by INFLUX_* env vars
+        - `sqlite:<path>` - local sqlite file
+    """
+    from lib.influx import Influx
+
+    spec = os.environ.get("BENCHMARK_STORE", "influx") if spec is None else spec
+    if spec == "influx":
+        return Influx()
+    if spec.startswith("sqlite:"):
+        return SqliteStore(spec[len("sqlite:"):])
+    raise RuntimeError(f"unknown benchmark store: {spec}")
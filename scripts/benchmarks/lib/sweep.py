@@ -0,0 +1,232 @@
+import abc
+import csv
+import logging
+import tempfile
+from pathlib import Path
+
+from lib.bench import SnarkBenchmark, ZkappLimitsBenchmark
+from lib.influx import MeasurementColumn, FieldColumn, TagColumn
+from lib.regression import RegressionDetector, Verdict, Method
+from lib.scheduler import Job, Scheduler
+from lib.stats import least_squares
+
+logger = logging.getLogger(__name__)
+
+
+class Curve:
+    """
+        Linear fit of single response (like proving time) against predictors (like number of proof updates)
+        for one group of sweep points
+    """
+
+    def __init__(self, name, predictors, coefficients, r2, points):
+        self.name = name
+        self.predictors = predictors
+        self.intercept = coefficients[0]
+        self.slopes = coefficients[1:]
+        self.r2 = r2
+        self.points = points
+
+    def __str__(self):
+        slopes = ", ".join(f"{slope:+.6f}/{predictor.name}"
+                           for predictor, slope in zip(self.predictors, self.slopes))
+        return f"{self.name}: intercept {self.intercept:.6f}, slopes {slopes} (r2 {self.r2:.3f}, {self.points} points)"
+
+
+class ScalingSweep(abc.ABC):
+    """
+        Runs benchmark over grid of parameters and fits linear model of responses (label -> column of benchmark csv)
+        against predictors (columns of benchmark csv). Points are run in parallel on Scheduler, each on its own cpus,
+        even for benchmarks which are isolated in run-all (like snark). With `isolate` such points run one at a time.
+
+        Result csv has one row per fitted curve with intercept, slope per predictor and r2.
+        Only slopes are compared against history, as absolute values at single point are expected to drift
+        with hardware while slope tells how cost grows with size of transaction
+    """
+
+    name = MeasurementColumn("name", 0)
+    intercept = FieldColumn("intercept", 1)
+
+    category = "scaling"
+
+    def __init__(self, predictors, responses, path=None, repetitions=1, isolate=False):
+        self.predictors = predictors
+        self.responses = responses
+        self.path = path
+        self.repetitions = repetitions
+        self.isolate = isolate
+        self.store = None
+        self.cache = None
+        self.groups = {}
+
+    def slope_fields(self):
+        return [
+            FieldColumn(f"slope {predictor.name}", 2 + i)
+            for i, predictor in enumerate(self.predictors)
+        ]
+
+    def headers(self):
+        n = 2 + len(self.predictors)
+        return [ScalingSweep.name, ScalingSweep.intercept] + self.slope_fields() + [
+            FieldColumn("r2", n, lower_is_better=False),
+            FieldColumn("points", n + 1, lower_is_better=False),
+            TagColumn("category", n + 2),
+            TagColumn("gitbranch", n + 3)
+        ]
+
+    def branch_header(self):
+        return self.headers()[-1]
+
+    @abc.abstractmethod
+    def benchmarks(self):
+        """
+            Returns list of (group, benchmark) for every grid point. Rows of points with the same group
+            are fitted together
+        """
+        pass
+
+    def jobs(self):
+        jobs = []
+        for group, bench in self.benchmarks():
+            bench.cache = self.cache
+            if not self.isolate:
+                bench.isolated = False
+            job = Job(bench, self.path, self.repetitions)
+            self.groups[job] = group
+            jobs.append(job)
+        return jobs
+
+    def collect(self, results):
+        """
+            Parses samples of all points and returns dictionary group -> list of csv rows
+        """
+        rows = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            for index, result in enumerate(results):
+                group = self.groups[result.job]
+                if not result.succeeded():
+                    raise RuntimeError(f"sweep point {group} of {result.job.name} failed: {result.error}")
+                for i, sample in enumerate(result.samples):
+                    file = str(Path(tmp) / f"{index}_{i}.csv")
+                    for parsed in result.job.bench.parse(sample, file, False, "sweep"):
+                        with open(parsed, newline='') as csvfile:
+                            reader = csv.reader(csvfile)
+                            next(reader)
+                            rows.setdefault(group, []).extend(reader)
+        return rows
+
+    def fit(self, rows):
+        """
+            Fits curve of every response for every group. Fails when no curve could be fitted at all
+        """
+        curves = []
+        for group, group_rows in rows.items():
+            xs = [[float(row[predictor.pos]) for predictor in self.predictors]
+                  for row in group_rows]
+            for label, response in self.responses.items():
+                ys = [float(row[response.pos]) for row in group_rows]
+                name = " ".join(filter(None, [label, group]))
+                fit = least_squares(xs, ys)
+                if fit is None:
+                    logger.warning(f"cannot fit {name}: not enough distinct points in sweep")
+                    continue
+                curve = Curve(name, self.predictors, fit[0], fit[1], len(ys))
+                logger.info(f"fitted {curve}")
+                curves.append(curve)
+        if not curves:
+            raise RuntimeError("no scaling curve could be fitted: sweep needs more distinct points than predictors")
+        return curves
+
+    def run(self, jobs_budget=None):
+        results = Scheduler(budget=jobs_budget).run(self.jobs())
+        return self.fit(self.collect(results))
+
+    def export_to_csv(self, curves, output_filename, influxdb, branch):
+        with open(output_filename, 'w') as csvfile:
+            if influxdb:
+                csvfile.write("#datatype " + ",".join(header.influx_kind for header in self.headers()) + "\n")
+            csvwriter = csv.writer(csvfile)
+            csvwriter.writerow([header.name for header in self.headers()])
+            for curve in curves:
+                csvwriter.writerow([curve.name, curve.intercept] + curve.slopes +
+                                   [curve.r2, curve.points, ScalingSweep.category, branch])
+        return [output_filename]
+
+    def compare(self, result_file, yellow_threshold, red_threshold, history_size=20,
+                method=Method.bootstrap, confidence=0.95):
+        """
+            Compares slopes of fitted curves against last `history_size` historical slopes.
+            Returns list of comparisons which are regressions
+        """
+        detector = RegressionDetector(yellow_threshold, red_threshold, method, confidence)
+        fields = self.slope_fields()
+
+        with open(result_file, newline='') as csvfile:
+            rows = list(csv.reader(csvfile))
+        # influx annotation is only written with --influx
+        if rows and rows[0] and rows[0][0].startswith("#datatype"):
+            rows = rows[1:]
+        rows = rows[1:]
+
+        branch_pos = self.branch_header().pos
+        snapshots = {
+            branch: self.store.query_history_snapshot(branch, fields, self.branch_header(), history_size)
+            for branch in set(row[branch_pos] for row in rows)
+        }
+
+        regressions = []
+        for row in rows:
+            name = row[ScalingSweep.name.pos]
+            for field in fields:
+                history = snapshots[row[branch_pos]].get((name, str(field)), [])
+                result = detector.compare(name, field, [float(row[field.pos])], history)
+                if result.verdict == Verdict.no_data:
+                    logger.warning(f"Skipping comparison for {result}")
+                elif result.verdict == Verdict.regression:
+                    logger.error(f"slope changed: {result}")
+                    regressions.append(result)
+                elif result.verdict == Verdict.warning:
+                    logger.warning(f"slope changed: {result}")
+                else:
+                    logger.info(f"{result}")
+        return regressions
+
+
+class SnarkSweep(ScalingSweep):
+    """
+        Runs transaction snark profiler for every k and every number of account updates (min = max = updates),
+        then fits proving and verification time against proof updates, non-proof pairs and non-proof singles
+        separately for every k
+    """
+
+    def __init__(self, ks, updates, **kwargs):
+        ScalingSweep.__init__(self,
+                              predictors=[SnarkBenchmark.proofs_updates,
+                                          SnarkBenchmark.nonproofs_pairs,
+                                          SnarkBenchmark.nonproofs_singles],
+                              responses={"proving time": SnarkBenchmark.proving_time,
+                                         "verification time": SnarkBenchmark.verification_time},
+                              **kwargs)
+        self.ks = ks
+        self.updates = updates
+
+    def benchmarks(self):
+        return [(f"k={k}", SnarkBenchmark(k, n, n)) for k in self.ks for n in self.updates]
+
+
+class ZkappLimitsSweep(ScalingSweep):
+    """
+        Zkapp limits already iterates over all combinations of updates, so sweep is single run
+        which fits cost against proof updates, signed updates and pairs of signed updates
+    """
+
+    def __init__(self, **kwargs):
+        ScalingSweep.__init__(self,
+                              predictors=[ZkappLimitsBenchmark.proofs_updates,
+                                          ZkappLimitsBenchmark.signed_updates,
+                                          ZkappLimitsBenchmark.pairs_of_signed],
+                              responses={"cost": ZkappLimitsBenchmark.cost},
+                              **kwargs)
+
+    def benchmarks(self):
+        return [("", ZkappLimitsBenchmark())]
@@ -1,5 +1,11 @@
+import glob
+import json
 import subprocess
 import logging
+import os
+import shutil
+import tempfile
+import time
 from enum import Enum
 
 logger = logging.getLogger(__name__)
@@ -9,23 +15,371 @@ def isclose(a, b, rel_tol=1e-09, abs_tol=0.0):
     return abs(a - b) <= max(rel_tol * max(abs(a), abs(b)), abs_tol)
 
 
-def assert_cmd(cmd, envs=None):
+def assert_cmd(cmd, envs=None, usage=None, perf=False, merge_stderr=False):
+    """
+        Runs command and returns its entire stdout. Raises RuntimeError if command fails.
+        See stream_cmd for usage, perf and merge_stderr arguments
+    """
+    return "".join(stream_cmd(cmd, envs, usage, perf, merge_stderr))
+
+
+class ResourceUsage:
+    """
+        Resources consumed by benchmark process and all its children.
+        Values are keyed by field name, units are kept separately
+        (so they can be turned into FieldColumns)
+    """
+
+    perf_events = "task-clock,cycles,instructions,cache-misses,branch-misses,page-faults"
+
+    def __init__(self, values=None, units=None):
+        self.values = {} if values is None else values
+        self.units = {} if units is None else units
+
+    def add(self, name, value, unit=""):
+        self.values[name] = value
+        self.units[name] = unit
+
+    def record_rusage(self, rusage, wall_time):
+        # ru_maxrss is reported in kilobytes on linux
+        self.add("peak rss", rusage.ru_maxrss, "kB")
+        self.add("user cpu", rusage.ru_utime, "s")
+        self.add("sys cpu", rusage.ru_stime, "s")
+        self.add("voluntary context switches", rusage.ru_nvcsw)
+        self.add("involuntary context switches", rusage.ru_nivcsw)
+        self.add("minor page faults", rusage.ru_minflt)
+        self.add("major page faults", rusage.ru_majflt)
+        self.add("wall time", wall_time, "s")
+
+    def record_perf(self, perf_output):
+        """
+            Reads `perf stat -x,` output. Unsupported or not counted events are skipped
+        """
+        for line in perf_output.splitlines():
+            if not line or line.startswith("#"):
+                continue
+            cols = line.split(",")
+            if len(cols) < 3:
+                continue
+            try:
+                value = float(cols[0])
+            except ValueError:
+                continue
+            self.add(f"perf {cols[2]}", value, cols[1])
+
+    def to_dict(self):
+        return {"values": self.values, "units": self.units}
+
+    @staticmethod
+    def from_dict(data):
+        return ResourceUsage(data["values"], data["units"])
+
+    @staticmethod
+    def median(usages):
+        """
+            Median of each value over multiple runs (only values present in all runs are kept)
+        """
+        usages = [usage for usage in usages if usage is not None]
+        if not usages:
+            return None
+        names = [
+            name for name in usages[0].values
+            if all(name in usage.values for usage in usages)
+        ]
+        result = ResourceUsage()
+        for name in names:
+            values = sorted(usage.values[name] for usage in usages)
+            middle = len(values) // 2
+            value = values[middle] if len(values) % 2 else (
+                values[middle - 1] + values[middle]) / 2
+            result.add(name, value, usages[0].units[name])
+        return result
+
+
+def stream_cmd(cmd, envs=None, usage=None, perf=False, merge_stderr=False):
+    """
+        Runs command and yields its stdout line by line as soon as it arrives,
+        so caller never holds entire output in memory.
+        Stderr is spooled to temporary file (to avoid pipe deadlock) and raised
+        as part of RuntimeError if command fails
+
+        If usage (ResourceUsage) is given it is filled, once command finishes, with rusage
+        of command process tree (peak rss, cpu time, context switches, page faults).
+        With perf=True command is wrapped with `perf stat` (when available) and hardware counters are recorded as well.
+        With merge_stderr=True stderr is yielded together with stdout (for programs which report on stderr)
+    """
+    perf_file = None
+    if perf and shutil.which("perf") is not None:
+        perf_file = tempfile.NamedTemporaryFile(suffix=".perf", delete=False)
+        perf_file.close()
+        cmd = [
+            "perf", "stat", "-x,", "-o", perf_file.name, "-e",
+            ResourceUsage.perf_events, "--"
+        ] + list(cmd)
+    elif perf:
+        logger.warning("perf not found. hardware counters won't be recorded")
+
     logger.debug(f"running command {cmd}")
-    result = subprocess.run(cmd,
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE,
-                            env=envs)
-
-    if result.returncode != 0:
-        err = result.stderr.decode("UTF-8")
-        logger.error(
-            f"{cmd} resulted in errorcode {result.returncode} with message {err}"
-        )
-        raise RuntimeError(f"cmd failed: {cmd} with stderr: {err}")
-
-    output = result.stdout.decode("UTF-8")
-    logger.debug(f"command output: {output}")
-    return output
+    try:
+        with tempfile.TemporaryFile() as stderr:
+            start = time.time()
+            process = subprocess.Popen(cmd,
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT if merge_stderr else stderr,
+                                       env=envs,
+                                       encoding="UTF-8")
+            with process.stdout:
+                for line in process.stdout:
+                    logger.debug(f"command output: {line.rstrip()}")
+                    yield line
+
+            # wait4 (instead of Popen.wait) gives us rusage of finished process
+            _, status, rusage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+
+            if process.returncode != 0:
+                stderr.seek(0)
+                err = stderr.read().decode("UTF-8")
+                logger.error(
+                    f"{cmd} resulted in errorcode {process.returncode} with message {err}"
+                )
+                raise RuntimeError(f"cmd failed: {cmd} with stderr: {err}")
+
+            if usage is not None:
+                usage.record_rusage(rusage, time.time() - start)
+                if perf_file is not None:
+                    with open(perf_file.name) as perf_output:
+                        usage.record_perf(perf_output.read())
+    finally:
+        if perf_file is not None:
+            os.remove(perf_file.name)
+
+
+def parse_cpu_list(text):
+    """
+        Parses kernel cpu list format (like "2-5,8") to sorted list of cpus
+    """
+    cpus = set()
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        cpus.update(range(int(start), int(end or start) + 1))
+    return sorted(cpus)
+
+
+def calibration_loop(iterations=500_000):
+    """
+        Fixed amount of pure cpu work. Returns its duration in seconds
+    """
+    start = time.perf_counter()
+    acc = 0
+    for i in range(iterations):
+        acc = (acc * 31 + i) % 1_000_003
+    return time.perf_counter() - start
+
+
+class NoiseReport:
+    """
+        Calibration loop durations measured right before and right after benchmark run together with
+        environment settings at that time. Run is trusted when neither calibration is noisy (coefficient of variation)
+        and machine speed did not drift (relative change of median durations) by more than threshold
+    """
+
+    def __init__(self, before, after, settings, threshold):
+        self.before = before
+        self.after = after
+        self.settings = settings
+        self.threshold = threshold
+
+    @staticmethod
+    def variation(durations):
+        mean = sum(durations) / len(durations)
+        if mean == 0 or len(durations) < 2:
+            return 0.0
+        return (sum((d - mean) ** 2 for d in durations) / (len(durations) - 1)) ** 0.5 / mean
+
+    @staticmethod
+    def middle(durations):
+        values = sorted(durations)
+        return values[len(values) // 2]
+
+    @property
+    def drift(self):
+        before = NoiseReport.middle(self.before)
+        return 0.0 if before == 0 else (NoiseReport.middle(self.after) - before) / before
+
+    @property
+    def noise(self):
+        return max(NoiseReport.variation(self.before), NoiseReport.variation(self.after), abs(self.drift))
+
+    def trusted(self):
+        return self.noise <= self.threshold
+
+    def to_dict(self):
+        return {
+            "trusted": self.trusted(),
+            "noise": self.noise,
+            "drift": self.drift,
+            "threshold": self.threshold,
+            "before": self.before,
+            "after": self.after,
+            "settings": self.settings,
+        }
+
+    def __str__(self):
+        verdict = "trusted" if self.trusted() else "untrusted"
+        return f"{verdict} run: noise {self.noise:.1%} (threshold {self.threshold:.1%}), drift {self.drift:+.1%}"
+
+    @staticmethod
+    def save(reports, file):
+        """
+            Stores reports of all runs which produced csv file in <file>.env.json sidecar
+        """
+        with open(f"{file}.env.json", 'w') as env_file:
+            json.dump({
+                "trusted": all(report.trusted() for report in reports),
+                "runs": [report.to_dict() for report in reports]
+            }, env_file, indent=2)
+
+    @staticmethod
+    def trusted_file(file):
+        """
+            False only if csv file was produced by run marked as untrusted. Files without sidecar are trusted
+        """
+        if not os.path.exists(f"{file}.env.json"):
+            return True
+        with open(f"{file}.env.json") as env_file:
+            return json.load(env_file)["trusted"]
+
+
+class RunEnvironment:
+    """
+        Optional control of machine state for benchmark runs.
+
+        Records cpu frequency governor, turbo boost and ASLR settings and, with control=True, sets performance governor,
+        disables turbo and ASLR for the time of the session (restoring original values on exit). Needs root,
+        settings which cannot be changed are only logged.
+        Process is pinned to given cpus (by default to cores isolated with isolcpus, if any), benchmark subprocess
+        inherits affinity. Short calibration loop (see calibrate) is measured before and after each run
+        to detect noisy machine (see NoiseReport)
+    """
+
+    governor_files = "/sys/devices/system/cpu/cpu[0-9]*/cpufreq/scaling_governor"
+    # intel_pstate exposes inverted flag, acpi-cpufreq (and amd) exposes boost
+    no_turbo_file = "/sys/devices/system/cpu/intel_pstate/no_turbo"
+    boost_file = "/sys/devices/system/cpu/cpufreq/boost"
+    aslr_file = "/proc/sys/kernel/randomize_va_space"
+    isolated_file = "/sys/devices/system/cpu/isolated"
+
+    def __init__(self, control=False, cpus=None, noise_threshold=0.1, rounds=5, iterations=500_000):
+        self.control = control
+        self.cpus = RunEnvironment.isolated_cpus() if cpus is None else sorted(cpus)
+        self.noise_threshold = noise_threshold
+        self.rounds = rounds
+        self.iterations = iterations
+        self.original = {}
+        self.affinity = None
+
+    @staticmethod
+    def read(file):
+        try:
+            with open(file) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    @staticmethod
+    def write(file, value):
+        try:
+            with open(file, 'w') as f:
+                f.write(value)
+            return True
+        except OSError as e:
+            logger.warning(f"cannot set {file} to {value}: {e}")
+            return False
+
+    @staticmethod
+    def isolated_cpus():
+        isolated = parse_cpu_list(RunEnvironment.read(RunEnvironment.isolated_file) or "")
+        if isolated and hasattr(os, "sched_getaffinity"):
+            allowed = os.sched_getaffinity(0)
+            isolated = [cpu for cpu in isolated if cpu in allowed]
+        return isolated or None
+
+    def controlled_files(self):
+        files = sorted(glob.glob(RunEnvironment.governor_files))
+        files += [file for file in [RunEnvironment.no_turbo_file, RunEnvironment.boost_file, RunEnvironment.aslr_file]
+                  if os.path.exists(file)]
+        return files
+
+    def settings(self):
+        governors = sorted(set(filter(None, (RunEnvironment.read(file)
+                                             for file in glob.glob(RunEnvironment.governor_files)))))
+        no_turbo = RunEnvironment.read(RunEnvironment.no_turbo_file)
+        boost = RunEnvironment.read(RunEnvironment.boost_file)
+        if no_turbo is not None:
+            turbo = no_turbo == "0"
+        elif boost is not None:
+            turbo = boost == "1"
+        else:
+            turbo = None
+        aslr = RunEnvironment.read(RunEnvironment.aslr_file)
+        return {
+            "governor": ",".join(governors) or None,
+            "turbo": turbo,
+            "aslr": None if aslr is None else int(aslr),
+            "cpus": self.cpus,
+        }
+
+    def apply(self):
+        desired = {file: "performance" for file in glob.glob(RunEnvironment.governor_files)}
+        desired[RunEnvironment.no_turbo_file] = "1"
+        desired[RunEnvironment.boost_file] = "0"
+        desired[RunEnvironment.aslr_file] = "0"
+        for file in self.controlled_files():
+            value = RunEnvironment.read(file)
+            if value is not None and value != desired[file] and RunEnvironment.write(file, desired[file]):
+                self.original[file] = value
+
+    def restore(self):
+        for file, value in self.original.items():
+            RunEnvironment.write(file, value)
+        self.original = {}
+
+    def start(self):
+        if self.control:
+            self.apply()
+        if self.cpus and hasattr(os, "sched_setaffinity"):
+            self.affinity = os.sched_getaffinity(0)
+            os.sched_setaffinity(0, self.cpus)
+        logger.info(f"benchmark environment: {self.settings()}")
+
+    def stop(self):
+        if self.affinity is not None:
+            os.sched_setaffinity(0, self.affinity)
+            self.affinity = None
+        self.restore()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def calibrate(self):
+        return [calibration_loop(self.iterations) for _ in range(self.rounds)]
+
+    def report(self, before, after):
+        report = NoiseReport(before, after, self.settings(), self.noise_threshold)
+        if report.trusted():
+            logger.info(f"{report}")
+        else:
+            logger.warning(f"{report}")
+        return report
+
 
 class Range(object):
 
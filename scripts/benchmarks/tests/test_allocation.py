@@ -0,0 +1,75 @@
+import os
+import csv
+import tempfile
+import unittest
+
+from lib.bench import AllocationBenchmark
+from lib.registry import BenchmarkRegistry, registry
+
+GC_OUTPUT = """\
+some output of target
+allocated_words: 3503329
+minor_words: 3402151
+promoted_words: 239212
+major_words: 340390
+minor_collections: 13
+major_collections: 2
+heap_words: 507904
+heap_chunks: 1
+top_heap_words: 507904
+compactions: 0
+forced_major_collections: 0
+"""
+
+
+class TestAllocationBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        os.environ["BENCHMARK_STORE"] = f"sqlite:{self.tmp.name}/store.sqlite"
+        self.bench = AllocationBenchmark("mina ledger", ["ledger"])
+
+    def tearDown(self):
+        del os.environ["BENCHMARK_STORE"]
+        self.tmp.cleanup()
+
+    def test_gc_statistics_row(self):
+        output = os.path.join(self.tmp.name, "allocation.csv")
+        self.bench.parse(GC_OUTPUT, output, False, "develop")
+        with open(output, newline='') as csvfile:
+            rows = list(csv.reader(csvfile))
+        self.assertEqual(2, len(rows))
+        row = rows[1]
+        self.assertEqual(["mina ledger", "13", "2", "0", "3402151", "239212", "340390"], row[:7])
+        self.assertAlmostEqual(239212 / 3402151, float(row[7]))
+        self.assertEqual(["507904", "allocation", "develop"], row[8:])
+
+    def test_gc_statistics_are_requested(self):
+        os.environ["OCAMLRUNPARAM"] = "b"
+        try:
+            cmd, envs = self.bench.command("/bin/true")
+        finally:
+            del os.environ["OCAMLRUNPARAM"]
+        self.assertEqual(["/bin/true", "ledger"], cmd)
+        self.assertEqual("b,v=0x400", envs["OCAMLRUNPARAM"])
+
+
+class TestAllocationRegistration(unittest.TestCase):
+
+    def test_not_run_by_default(self):
+        self.assertIn("allocation", registry.names())
+        self.assertNotIn("allocation", registry.defaults())
+        self.assertIn("mina-base", registry.defaults())
+
+    def test_default_flag_follows_latest_registration(self):
+        benchmarks = BenchmarkRegistry()
+        benchmarks.discovered = True
+        benchmarks.register("target", lambda options: None, default=False)
+        self.assertEqual([], benchmarks.defaults())
+        with self.assertLogs("lib.registry", level="WARNING"):
+            benchmarks.register("target", lambda options: None)
+        self.assertEqual(["target"], benchmarks.defaults())
+
+
+if __name__ == '__main__':
+    unittest.main()
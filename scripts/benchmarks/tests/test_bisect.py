@@ -0,0 +1,87 @@
+import os
+import subprocess
+import tempfile
+import unittest
+
+from lib.bench import ZkappLimitsBenchmark
+from lib.bisect import Bisector, git
+
+
+class FileBisector(Bisector):
+    """
+        Measures value stored in `cost` file of checked out commit instead of running benchmark
+    """
+
+    def measure(self):
+        with open(os.path.join(self.repo, "cost")) as f:
+            value = float(f.read())
+        return [value * factor for factor in [1.0, 1.01, 0.99, 1.02, 0.98]]
+
+
+class TestBisect(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo = self.tmp.name
+        git(self.repo, "init", "-q", "-b", "main")
+        git(self.repo, "config", "user.email", "bench@example.com")
+        git(self.repo, "config", "user.name", "bench")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def commit(self, cost, broken=False):
+        with open(os.path.join(self.repo, "cost"), "w") as f:
+            f.write(str(cost))
+        if broken:
+            open(os.path.join(self.repo, "broken"), "w").close()
+        elif os.path.exists(os.path.join(self.repo, "broken")):
+            os.remove(os.path.join(self.repo, "broken"))
+        git(self.repo, "add", "-A")
+        git(self.repo, "commit", "-q", "--allow-empty", "-m", f"cost {cost}")
+        return git(self.repo, "rev-parse", "HEAD").strip()
+
+    def bisector(self):
+        return FileBisector(ZkappLimitsBenchmark(), "test ! -e broken", "cost", "cost", repo=self.repo)
+
+    def assert_restored(self):
+        self.assertEqual("main", git(self.repo, "rev-parse", "--abbrev-ref", "HEAD").strip())
+        self.assertFalse(os.path.exists(os.path.join(self.repo, ".git", "BISECT_START")))
+
+    def test_finds_first_bad_commit(self):
+        good = self.commit(10)
+        self.commit(10, broken=True)
+        self.commit(10)
+        first_bad = self.commit(20)
+        bad = self.commit(20)
+
+        bisector = self.bisector()
+        step = bisector.run(good, bad)
+        self.assertEqual(first_bad, step.commit)
+        self.assertTrue(step.is_bad())
+        self.assertEqual([], bisector.candidates)
+        self.assert_restored()
+
+    def test_only_skipped_commits_left(self):
+        good = self.commit(10)
+        broken = [self.commit(20, broken=True) for _ in range(3)]
+        bad = self.commit(20)
+
+        bisector = self.bisector()
+        with self.assertLogs("lib.bisect", level="ERROR") as logs:
+            self.assertIsNone(bisector.run(good, bad))
+        self.assertIn("could not be narrowed down", "\n".join(logs.output))
+        self.assertEqual(set(broken + [bad]), set(bisector.candidates))
+        self.assertEqual(3, len([step for step in bisector.steps if step.comparison is None]))
+        self.assert_restored()
+
+    def test_regression_not_reproducible(self):
+        good = self.commit(10)
+        bad = self.commit(10)
+        with self.assertLogs("lib.bisect", level="ERROR"):
+            self.assertIsNone(self.bisector().run(good, bad))
+        self.assert_restored()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import stat
+import tempfile
+import unittest
+
+from lib.bench import ZkappLimitsBenchmark
+from lib.cache import ResultCache
+
+ZKAPP_LINE = "Proofs updates=0  Signed/None updates=1  Pairs of Signed/None updates=0: Total account updates: 1 Cost: 9.140000"
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.binary = os.path.join(self.tmp.name, "bench.sh")
+        with open(self.binary, "w") as file:
+            file.write(f"#!/bin/sh\necho '{ZKAPP_LINE}'\n")
+        os.chmod(self.binary, os.stat(self.binary).st_mode | stat.S_IEXEC)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def cache(self, max_size=2 * 1024**3):
+        return ResultCache(os.path.join(self.tmp.name, "cache"), max_size)
+
+    def test_key_depends_on_binary_and_inputs(self):
+        cache = self.cache()
+        key = cache.key(self.binary, "zkapp", {"args": []})
+        self.assertEqual(key, cache.key(self.binary, "zkapp", {"args": []}))
+        self.assertNotEqual(key, cache.key(self.binary, "zkapp", {"args": ["-v"]}))
+        self.assertNotEqual(key, cache.key(self.binary, "zkapp", {"args": []}, sample=1))
+        self.assertIsNone(cache.key(os.path.join(self.tmp.name, "missing"), "zkapp", {}))
+
+    def test_put_get_and_meta(self):
+        cache = self.cache()
+        cache.put("a", "line 1\nline 2\n", {"peak rss": 10})
+        self.assertTrue(cache.contains("a"))
+        self.assertEqual("line 1\nline 2\n", cache.get("a"))
+        self.assertEqual(["line 1\n", "line 2\n"], list(cache.lines("a")))
+        self.assertEqual({"peak rss": 10}, cache.get_meta("a"))
+        self.assertIsNone(cache.get("b"))
+
+    def test_failed_stream_is_not_cached(self):
+        cache = self.cache()
+
+        def failing():
+            yield "partial\n"
+            raise RuntimeError("benchmark crashed")
+
+        with self.assertRaises(RuntimeError):
+            list(cache.tee("a", failing()))
+        self.assertFalse(cache.contains("a"))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = self.cache(max_size=30)
+        for i, key in enumerate(["a", "b", "c"]):
+            cache.put(key, "x" * 10)
+            os.utime(cache.entry(key), (1000 + i, 1000 + i))
+        # hit moves a to the end of LRU order
+        cache.get("a")
+        cache.put("d", "x" * 10)
+        self.assertEqual([True, False, True, True], [cache.contains(key) for key in ["a", "b", "c", "d"]])
+
+    def test_cache_hits_are_counted(self):
+        os.environ["BENCHMARK_STORE"] = f"sqlite:{self.tmp.name}/store.sqlite"
+        try:
+            bench = ZkappLimitsBenchmark()
+        finally:
+            del os.environ["BENCHMARK_STORE"]
+        bench.cache = self.cache()
+        output = os.path.join(self.tmp.name, "zkapp.csv")
+
+        bench.run_and_parse(self.binary, output, True, "develop")
+        self.assertEqual(0, bench.cache_hits)
+        bench.run_and_parse(self.binary, output, True, "develop")
+        self.assertEqual(1, bench.cache_hits)
+        bench.run_and_parse(self.binary, output, True, "develop", repetitions=2)
+        self.assertEqual(1, bench.cache_hits)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+
+from lib.bench import ZkappLimitsBenchmark
+from lib.store import Point
+from lib.utils import ResourceUsage
+
+ZKAPP_OUTPUT = "Proofs updates=0  Signed/None updates=1  Pairs of Signed/None updates=0: Total account updates: 1 Cost: {cost}\n"
+
+
+class TestCompare(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        os.environ["BENCHMARK_STORE"] = f"sqlite:{self.tmp.name}/store.sqlite"
+        self.bench = ZkappLimitsBenchmark()
+        for i, (cost, faults) in enumerate([(10.0, 123), (10.1, 121), (9.9, 125), (10.0, 122), (10.05, 124),
+                                            (9.95, 123)]):
+            fields = {"cost": cost, "minor page faults": faults, "peak rss [kB]": 1000 + i}
+            self.bench.store.write_points([Point("P0S1PS0TA1", {"gitbranch": "develop"}, fields, i)])
+
+    def tearDown(self):
+        del os.environ["BENCHMARK_STORE"]
+        self.tmp.cleanup()
+
+    def result_file(self, cost, faults, rss):
+        file = os.path.join(self.tmp.name, "zkapp.csv")
+        files = self.bench.parse(ZKAPP_OUTPUT.format(cost=cost), file, True, "develop")
+        usage = ResourceUsage()
+        usage.add("minor page faults", faults)
+        usage.add("peak rss", rss, "kB")
+        self.bench.annotate_usage(files, usage)
+        return file
+
+    def test_unchanged_passes(self):
+        self.bench.compare(self.result_file(10.0, 123, 1003), 0.1, 0.2)
+
+    def test_usage_change_is_only_reported(self):
+        with self.assertLogs("lib.bench", level="WARNING") as logs:
+            self.bench.compare(self.result_file(10.0, 190, 2000), 0.1, 0.2)
+        self.assertTrue(any("RESOURCE USAGE" in line and "minor page faults" in line for line in logs.output))
+        self.assertTrue(any("RESOURCE USAGE" in line and "peak rss" in line for line in logs.output))
+
+    def test_field_regression_fails(self):
+        with self.assertRaises(SystemExit):
+            self.bench.compare(self.result_file(15.0, 123, 1003), 0.1, 0.2)
+
+
+if __name__ == '__main__':
+    unittest.main()
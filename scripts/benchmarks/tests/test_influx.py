@@ -0,0 +1,115 @@
+import gzip
+import os
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lib.influx import Influx
+from lib.store import Point
+
+
+class InfluxStandIn(BaseHTTPRequestHandler):
+    """
+        Local stand-in of influx db write endpoint. Answers writes with scripted statuses
+        (204 when script is exhausted) and records decompressed bodies
+    """
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests.append({
+            "path": self.path,
+            "encoding": self.headers.get("Content-Encoding"),
+            "body": gzip.decompress(body).decode() if self.headers.get("Content-Encoding") == "gzip" else body.decode(),
+        })
+        status = self.server.statuses.pop(0) if self.server.statuses else 204
+        self.send_response(status)
+        if status == 204:
+            self.end_headers()
+            return
+        message = b'{"code":"error","message":"scripted failure"}'
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(message)))
+        self.end_headers()
+        self.wfile.write(message)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestInfluxWrite(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), InfluxStandIn)
+        self.server.requests = []
+        self.server.statuses = []
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.env = {
+            Influx.host: f"http://127.0.0.1:{self.server.server_address[1]}",
+            Influx.token: "token",
+            Influx.org: "org",
+            Influx.bucket: "bucket"
+        }
+        self.saved = {name: os.environ.get(name) for name in self.env}
+        os.environ.update(self.env)
+        Influx._client = None
+
+    def tearDown(self):
+        if Influx._client is not None:
+            Influx._client.close()
+            Influx._client = None
+        for name, value in self.saved.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+        self.server.shutdown()
+        self.server.server_close()
+
+    def points(self, count):
+        return [
+            Point(f"bench {i}", {"gitbranch": "develop"}, {"Time/Run [us]": float(i)}, 1_000 + i)
+            for i in range(count)
+        ]
+
+    def test_points_are_batched_and_gzipped(self):
+        result = Influx().write_points(self.points(5), "test", batch_size=2, backoff=0)
+        self.assertTrue(result.succeeded())
+        self.assertEqual(3, result.batches)
+        self.assertEqual(3, len(self.server.requests))
+        for request in self.server.requests:
+            self.assertTrue(request["path"].startswith("/api/v2/write"))
+            self.assertIn("bucket=bucket", request["path"])
+            self.assertIn("precision=ns", request["path"])
+            self.assertEqual("gzip", request["encoding"])
+        self.assertEqual([2, 2, 1], [len(request["body"].splitlines()) for request in self.server.requests])
+        self.assertEqual("bench\\ 0,gitbranch=develop Time/Run\\ [us]=0.0 1000",
+                         self.server.requests[0]["body"].splitlines()[0])
+
+    def test_throttled_and_server_errors_are_retried(self):
+        self.server.statuses = [429, 503, 500]
+        with self.assertLogs("lib.influx", level="WARNING"):
+            result = Influx().write_points(self.points(3), "test", batch_size=2, backoff=0)
+        self.assertTrue(result.succeeded())
+        # first batch was sent four times, second once
+        self.assertEqual(5, len(self.server.requests))
+        self.assertEqual(1, len(set(request["body"] for request in self.server.requests[:4])))
+
+    def test_client_error_is_not_retried(self):
+        self.server.statuses = [400]
+        with self.assertLogs("lib.influx", level="ERROR"):
+            result = Influx().write_points(self.points(3), "test", batch_size=2, backoff=0)
+        self.assertFalse(result.succeeded())
+        self.assertEqual([0], list(result.failed_batches))
+        self.assertEqual(2, len(self.server.requests))
+
+    def test_retries_are_limited(self):
+        self.server.statuses = [503] * 3
+        with self.assertLogs("lib.influx", level="ERROR"):
+            result = Influx().write_points(self.points(1), "test", max_retries=2, backoff=0)
+        self.assertFalse(result.succeeded())
+        self.assertEqual(3, len(self.server.requests))
+
+
+if __name__ == '__main__':
+    unittest.main()
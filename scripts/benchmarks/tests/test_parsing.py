@@ -0,0 +1,133 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from lib.bench import MinaBaseBenchmark, ZkappLimitsBenchmark
+from lib.parsing import JaneStreet, ZKAPP_LIMITS, SNARK_PROFILER, HEAP_USAGE, GC_STATS
+
+MINA_BASE_OUTPUT = """\
+Running inline tests in library "mina_base"
+┌───────────────────────────┬──────────┬───────────┬──────────┬──────────┬──────────┐
+│ Name                      │ Time/Run │ Cycls/Run │  mWd/Run │ mjWd/Run │ Prom/Run │
+├───────────────────────────┼──────────┼───────────┼──────────┼──────────┼──────────┤
+│ [vrf_lib_tests.ml] vrf    │ 12.52us  │ 25.01kc   │ 12.00w   │ 0.01w    │ 0.01w    │
+│ [ledger.ml] hash          │ 843.10ns │ 1_686.20c │          │          │          │
+│ [ledger.ml] apply         │ 3.19ms   │ 6.37Mc    │ 212.33kw │ 1.50Mw   │ 2.00kw   │
+│ [ledger.ml] prove         │ 1.25s    │ 2.50Gc    │ 1.00Gw   │ 3.00w    │ 4.00w    │
+└───────────────────────────┴──────────┴───────────┴──────────┴──────────┴──────────┘
+Running inline tests in library "mina_ledger"
+│ Name                      │ Time/Run │ Cycls/Run │  mWd/Run │ mjWd/Run │ Prom/Run │
+│ [ledger.ml] merkle        │ 1.00us   │ 2.00kc    │ 3.00w    │ 4.00w    │ 5.00w    │
+"""
+
+
+def normalized_rows(content):
+    return {
+        library: list(JaneStreet.normalize(table).rows("name", "time", "cycles", "minor_words", "major_words",
+                                                        "promoted_words"))
+        for library, table in JaneStreet.sections(content)
+    }
+
+
+class TestJaneStreet(unittest.TestCase):
+
+    def test_scaled_units_are_normalized(self):
+        rows = normalized_rows(MINA_BASE_OUTPUT)["mina_base"]
+        expected = [
+            ("vrf", 12.52, 25.01, 12.0, 0.01, 0.01),
+            ("hash", 0.8431, 1.6862, 0.0, 0.0, 0.0),
+            ("apply", 3_190.0, 6_370.0, 212_330.0, 1_500_000.0, 2_000.0),
+            ("prove", 1_250_000.0, 2_500_000.0, 1_000_000_000.0, 3.0, 4.0),
+        ]
+        self.assertEqual([row[0] for row in expected], [row[0] for row in rows])
+        for actual, wanted in zip(rows, expected):
+            for a, w in zip(actual[1:], wanted[1:]):
+                self.assertAlmostEqual(w, a, places=6)
+
+    def test_libraries_split_sections(self):
+        rows = normalized_rows(MINA_BASE_OUTPUT)
+        self.assertEqual(["mina_base", "mina_ledger"], list(rows))
+        self.assertEqual([("merkle", 1.0, 2.0, 3.0, 4.0, 5.0)], rows["mina_ledger"])
+
+    def test_streamed_lines_give_same_rows(self):
+        lines = MINA_BASE_OUTPUT.splitlines(keepends=True)
+        self.assertEqual(normalized_rows(MINA_BASE_OUTPUT), normalized_rows(iter(lines)))
+
+    def test_unknown_row_fails(self):
+        content = MINA_BASE_OUTPUT + "│ [ledger.ml] odd          │ 3.19 parsec │ 1kc │ 1w │ 1w │ 1w │\n"
+        with self.assertRaises(RuntimeError):
+            normalized_rows(content)
+
+    def test_extra_column_fails(self):
+        content = "│ [ledger.ml] odd │ 1.00us │ 2.00kc │ 3.00w │ 4.00w │ 5.00w │ 12.5% │\n"
+        with self.assertRaises(RuntimeError):
+            normalized_rows(content)
+
+
+class TestBenchmarkCsv(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        os.environ["BENCHMARK_STORE"] = f"sqlite:{self.tmp.name}/store.sqlite"
+
+    def tearDown(self):
+        del os.environ["BENCHMARK_STORE"]
+        self.tmp.cleanup()
+
+    def read(self, file):
+        with open(file, newline='') as csvfile:
+            return list(csv.reader(csvfile))
+
+    def test_mina_base_keeps_scaled_rows(self):
+        output = os.path.join(self.tmp.name, "out.csv")
+        files = MinaBaseBenchmark().parse(MINA_BASE_OUTPUT, output, False, "develop")
+        self.assertEqual([
+            os.path.join(self.tmp.name, "mina_base_out.csv"),
+            os.path.join(self.tmp.name, "mina_ledger_out.csv")
+        ], files)
+        rows = self.read(files[0])
+        self.assertEqual("Name", rows[0][0])
+        self.assertEqual(["vrf", "hash", "apply", "prove"], [row[0] for row in rows[1:]])
+        self.assertEqual(["apply", "3190.0", "6370.0", "212330.0", "1500000.0", "2000.0", "develop"], rows[3])
+
+    def test_zkapp(self):
+        content = "Proofs updates=1  Signed/None updates=2  Pairs of Signed/None updates=3: Total account updates: 9 Cost: 10.080000\n"
+        output = os.path.join(self.tmp.name, "zkapp.csv")
+        ZkappLimitsBenchmark().parse(content, output, True, "develop")
+        rows = self.read(output)
+        self.assertTrue(rows[0][0].startswith("#datatype measurement"))
+        self.assertEqual(["P1S2PS3TA9", "1", "2", "3", "9", "10.08", "zkapp", "develop"], rows[2])
+
+
+class TestGrammars(unittest.TestCase):
+
+    def test_zkapp_limits(self):
+        table = ZKAPP_LIMITS.table(
+            "Proofs updates=0  Signed/None updates=1  Pairs of Signed/None updates=0: Total account updates: 1 Cost: 9.140000\n"
+            "unrelated line\n")
+        self.assertEqual([(0, 1, 0, 1, 9.14)],
+                         list(table.rows("proofs_updates", "signed_updates", "pairs_of_signed_updates",
+                                         "total_account_updates", "cost")))
+
+    def test_snark_profiler_skips_header(self):
+        table = SNARK_PROFILER.table(
+            "| No.| Proof updates| Non-proof pairs| Non-proof singles| Mempool verification time (sec)| Transaction proving time (sec)|Permutation|\n"
+            "|--|--|--|--|--|--|--|\n"
+            "| 1| 0| 1| 1| 0.002070| 12.125372| SSS|\n")
+        self.assertEqual([(0, 1, 1, 0.00207, 12.125372, "SSS")],
+                         list(table.rows("proofs_updates", "nonproofs_pairs", "nonproofs_singles",
+                                         "verification_time", "proving_time", "permutation")))
+
+    def test_heap_usage_name_without_spaces(self):
+        table = HEAP_USAGE.table("Data of type Zkapp_command.t (w/ proofs)   uses   52058 heap words = 416464 bytes\n")
+        self.assertEqual([("Zkapp_command.t(w/proofs)", 52058, 416464)],
+                         list(table.rows("name", "heap_words", "bytes")))
+
+    def test_gc_stats(self):
+        table = GC_STATS.table("minor_collections: 12\nmajor_collections: 3\nnot a stat\n")
+        self.assertEqual([("minor_collections", 12), ("major_collections", 3)], list(table.rows("stat", "value")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+
+from lib.influx import FieldColumn
+from lib.regression import RegressionDetector, Verdict, Method
+from lib.stats import percentile, relative_change, bootstrap_ci, mann_whitney_u, cliffs_delta
+
+TIME = FieldColumn("Time/Run", 1, "us")
+THROUGHPUT = FieldColumn("tps", 2, "", lower_is_better=False)
+
+# history with ~1% noise around 100
+HISTORY = [99.0, 100.5, 101.0, 99.5, 100.0, 100.8, 99.2, 100.3, 99.7, 100.1]
+
+
+class TestStats(unittest.TestCase):
+
+    def test_percentile_interpolates(self):
+        self.assertEqual(2.5, percentile([4, 1, 3, 2], 50))
+        self.assertEqual(1, percentile([4, 1, 3, 2], 0))
+        self.assertAlmostEqual(3.7, percentile([4, 1, 3, 2], 90))
+
+    def test_relative_change(self):
+        self.assertEqual(0.5, relative_change(2, 3))
+        self.assertEqual(-0.5, relative_change(-2, -3))
+        self.assertEqual(0.0, relative_change(0, 0))
+        self.assertIsNone(relative_change(0, 1))
+
+    def test_bootstrap_ci_skips_zero_baseline(self):
+        low, high = bootstrap_ci([0, 0, 10, 10, 10], [12])
+        self.assertTrue(low <= high)
+        self.assertTrue(all(x == x and abs(x) != float("inf") for x in (low, high)))
+        self.assertIsNone(bootstrap_ci([0, 0, 0], [1]))
+
+    def test_bootstrap_ci_is_deterministic(self):
+        self.assertEqual(bootstrap_ci(HISTORY, [110.0, 111.0]), bootstrap_ci(HISTORY, [110.0, 111.0]))
+
+    def test_mann_whitney_separated_samples(self):
+        u, p = mann_whitney_u([1, 2, 3, 4, 5], [6, 7, 8, 9, 10])
+        self.assertEqual(0, u)
+        self.assertLess(p, 0.05)
+        _, p = mann_whitney_u([1, 2, 3], [1, 2, 3])
+        self.assertEqual(1.0, p)
+
+    def test_cliffs_delta(self):
+        self.assertEqual(1.0, cliffs_delta([3, 4], [1, 2]))
+        self.assertEqual(-1.0, cliffs_delta([1, 2], [3, 4]))
+        self.assertEqual(0.0, cliffs_delta([1, 2], [1, 2]))
+
+
+class TestRegressionDetector(unittest.TestCase):
+
+    def setUp(self):
+        self.detector = RegressionDetector(yellow_threshold=0.1, red_threshold=0.2)
+
+    def test_not_enough_history(self):
+        result = self.detector.compare("bench", TIME, [100.0], HISTORY[:4])
+        self.assertEqual(Verdict.no_data, result.verdict)
+        self.assertIn("not enough historical data", str(result))
+
+    def test_small_change_is_ok_without_ci(self):
+        result = self.detector.compare("bench", TIME, [104.0], HISTORY)
+        self.assertEqual(Verdict.ok, result.verdict)
+        self.assertIsNone(result.ci)
+        self.assertIn("ok", str(result))
+
+    def test_regression(self):
+        result = self.detector.compare("bench", TIME, [130.0], HISTORY)
+        self.assertEqual(Verdict.regression, result.verdict)
+        self.assertGreater(result.ci[0], 0)
+        self.assertAlmostEqual(0.2997, result.change, places=3)
+
+    def test_warning(self):
+        result = self.detector.compare("bench", TIME, [115.0], HISTORY)
+        self.assertEqual(Verdict.warning, result.verdict)
+
+    def test_improvement(self):
+        result = self.detector.compare("bench", TIME, [80.0], HISTORY)
+        self.assertEqual(Verdict.improvement, result.verdict)
+
+    def test_direction_of_field(self):
+        self.assertEqual(Verdict.improvement, self.detector.compare("bench", THROUGHPUT, [130.0], HISTORY).verdict)
+        self.assertEqual(Verdict.regression, self.detector.compare("bench", THROUGHPUT, [70.0], HISTORY).verdict)
+
+    def test_noisy_history_is_not_significant(self):
+        noisy = [60.0, 140.0, 70.0, 130.0, 100.0, 65.0, 135.0, 100.0]
+        result = self.detector.compare("bench", TIME, [125.0], noisy)
+        self.assertEqual(Verdict.ok, result.verdict)
+
+    def test_zero_baseline(self):
+        result = self.detector.compare("bench", TIME, [3.0], [0.0] * 10)
+        self.assertEqual(Verdict.no_data, result.verdict)
+        self.assertIn("historical median is zero", str(result))
+        result = self.detector.compare("bench", TIME, [0.0], [0.0] * 10)
+        self.assertEqual(Verdict.ok, result.verdict)
+        self.assertEqual(0.0, result.change)
+
+    def test_mann_whitney(self):
+        detector = RegressionDetector(0.1, 0.2, method=Method.mann_whitney)
+        result = detector.compare("bench", TIME, [130.0, 131.0, 129.0, 130.5, 129.5], HISTORY)
+        self.assertEqual(Verdict.regression, result.verdict)
+        self.assertLess(result.p_value, 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from lib.bench import ZkappLimitsBenchmark
+from lib.store import open_store
+from lib.sweep import ScalingSweep, SnarkSweep, ZkappLimitsSweep
+
+
+def zkapp_row(proofs, signed, pairs, cost):
+    return [f"P{proofs}S{signed}PS{pairs}", str(proofs), str(signed), str(pairs), "0", str(cost), "zkapp", "sweep"]
+
+
+class TestSweep(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        os.environ["BENCHMARK_STORE"] = f"sqlite:{self.tmp.name}/store.sqlite"
+
+    def tearDown(self):
+        del os.environ["BENCHMARK_STORE"]
+        self.tmp.cleanup()
+
+    def test_sweep_is_abstract(self):
+        with self.assertRaises(TypeError):
+            ScalingSweep([ZkappLimitsBenchmark.proofs_updates], {"cost": ZkappLimitsBenchmark.cost})
+
+    def test_fit_recovers_slopes(self):
+        rows = [
+            zkapp_row(p, s, ps, 5 + 10 * p + 2 * s + 3 * ps)
+            for p in range(3) for s in range(3) for ps in range(2)
+        ]
+        [curve] = ZkappLimitsSweep().fit({"": rows})
+        self.assertEqual("cost", curve.name)
+        self.assertAlmostEqual(5, curve.intercept)
+        for actual, expected in zip(curve.slopes, [10, 2, 3]):
+            self.assertAlmostEqual(expected, actual)
+        self.assertAlmostEqual(1.0, curve.r2)
+        self.assertEqual(len(rows), curve.points)
+
+    def test_degenerate_grid_fails(self):
+        rows = [zkapp_row(1, 1, 1, 10), zkapp_row(1, 1, 1, 11)]
+        with self.assertRaises(RuntimeError):
+            ZkappLimitsSweep().fit({"": rows})
+
+    def test_snark_points_run_in_parallel_unless_isolated(self):
+        jobs = SnarkSweep([1, 2], [1, 2, 3]).jobs()
+        self.assertEqual(6, len(jobs))
+        self.assertFalse(any(job.bench.isolated for job in jobs))
+        jobs = SnarkSweep([1], [1, 2], isolate=True).jobs()
+        self.assertTrue(all(job.bench.isolated for job in jobs))
+
+    def test_compare_reads_csv_with_and_without_influx_annotation(self):
+        sweep = ZkappLimitsSweep()
+        sweep.store = open_store()
+        rows = [
+            zkapp_row(p, s, ps, 5 + 10 * p + 2 * s + 3 * ps)
+            for p in range(3) for s in range(3) for ps in range(2)
+        ]
+        curves = sweep.fit({"": rows})
+        for influx in [True, False]:
+            output = os.path.join(self.tmp.name, f"sweep-{influx}.csv")
+            sweep.export_to_csv(curves, output, influx, "develop")
+            # no history, so every slope of the single curve is reported as skipped
+            with self.assertLogs("lib.sweep", level="WARNING") as logs:
+                self.assertEqual([], sweep.compare(output, 0.1, 0.2))
+            self.assertEqual(len(sweep.slope_fields()), len([line for line in logs.output if "cost" in line]))
+
+
+if __name__ == '__main__':
+    unittest.main()